@@ -0,0 +1,308 @@
+# Build the CSS and JavaScript of the site into fingerprinted bundles served
+# from static/, so that pages need nothing from third party CDNs.
+#
+# First download the third party files, Bootstrap and jQuery, into
+# static/vendor/, once, then build the bundles whenever any of their files
+# change:
+#
+#   python assets.py vendor
+#   python assets.py build
+#
+# Each bundle in BUNDLES is concatenated and minified into
+# static/build/<name>.<content hash>.<ext>, next to a gzipped copy, plus a
+# brotli or zstd copy if the brotli or zstandard module is installed.
+# static/build/manifest.json maps each bundle to its latest file, and is read
+# when finalproject.py starts, so restart it after building. Its pages then
+# link to the bundles with {{ assetUrls('site.css') }}; a bundle's file name
+# changes with its content, so it is served with a year long, immutable
+# Cache-Control. Until the bundles are built, pages link to the separate
+# files, from the CDNs if they haven't been vendored.
+
+import argparse
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+import urllib2
+
+from flask import url_for, send_from_directory, abort, request
+
+from compression import compress, chooseEncoding, ENCODINGS
+
+
+# The directory of the static files, the bundles built in it, and the list
+# of the latest bundles.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'static')
+BUILD_DIR = os.path.join(STATIC_DIR, 'build')
+MANIFEST = os.path.join(BUILD_DIR, 'manifest.json')
+
+# The third party files copied into static/ by the vendor command, and the
+# URLs they are copied from. Bootstrap's CSS finds its fonts at ../fonts/,
+# so its files keep the layout they have on the CDN.
+VENDORED = [
+    ('vendor/bootstrap/css/bootstrap.min.css',
+        'https://maxcdn.bootstrapcdn.com/bootstrap/3.3.5/css/bootstrap.min.css'),
+    ('vendor/bootstrap/css/bootstrap-theme.min.css',
+        'https://maxcdn.bootstrapcdn.com/bootstrap/3.3.5/css/'
+        'bootstrap-theme.min.css'),
+    ('vendor/bootstrap/js/bootstrap.min.js',
+        'https://maxcdn.bootstrapcdn.com/bootstrap/3.3.5/js/bootstrap.min.js'),
+    ('vendor/jquery/jquery.min.js',
+        'https://ajax.googleapis.com/ajax/libs/jquery/1.11.3/jquery.min.js'),
+] + [('vendor/bootstrap/fonts/glyphicons-halflings-regular.' + extension,
+        'https://maxcdn.bootstrapcdn.com/bootstrap/3.3.5/fonts/'
+        'glyphicons-halflings-regular.' + extension)
+    for extension in ('eot', 'svg', 'ttf', 'woff', 'woff2')]
+
+# The bundles, each with the files in static/ it is made of, in order.
+BUNDLES = [
+    ('site.css', ['vendor/bootstrap/css/bootstrap.min.css',
+        'vendor/bootstrap/css/bootstrap-theme.min.css',
+        'site-specific.css']),
+    ('site.js', ['vendor/jquery/jquery.min.js',
+        'vendor/bootstrap/js/bootstrap.min.js', 'tooltips.js']),
+    ('styles.css', ['styles.css']),
+]
+
+# The file name suffix of the copy of a bundle in each encoding.
+ENCODING_SUFFIXES = [('br', '.br'), ('zstd', '.zst'), ('gzip', '.gz')]
+
+# How long, in seconds, and with what Cache-Control a bundle, whose content
+# never changes, is cached.
+BUNDLE_MAX_AGE = 31536000
+BUNDLE_CACHE_CONTROL = 'public, max-age=%d, immutable' % BUNDLE_MAX_AGE
+
+# A url() in CSS, and a comment in CSS other than a /*! license */ one.
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+CSS_COMMENT = re.compile(r'/\*(?!!).*?\*/', re.DOTALL)
+
+
+def minifyCSS(text):
+    '''
+    Return CSS without its comments, except license comments, and with as
+    little whitespace as is safe.
+
+    Args:
+        str text
+    '''
+    text = CSS_COMMENT.sub('', text)
+    text = re.sub(r'\s+', ' ', text)
+    # Not around ':', which separates a selector from a pseudo-class.
+    text = re.sub(r' ?([{};,>]) ?', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minifyJS(text):
+    '''
+    Return JavaScript without its blank lines, indentation and whole line
+    // comments. Leaves the rest alone, which is always safe.
+
+    Args:
+        str text
+    '''
+    lines = [line.strip() for line in text.splitlines()]
+    return '\n'.join(line for line in lines
+        if line and not line.startswith('//'))
+
+
+def rebaseCSSURLs(text, source):
+    '''
+    Return the CSS of a file in static/ with its relative url()s changed to
+    point to the same files from static/build/.
+
+    Args:
+        str text
+        str source
+    '''
+    def rebase(match):
+        url = match.group(2)
+        if re.match(r'^(?:[a-z]+:|/|#)', url):
+            return match.group(0)
+        path, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+        path = os.path.relpath(os.path.join(STATIC_DIR,
+            os.path.dirname(source), path), BUILD_DIR).replace(os.sep, '/')
+        return 'url(%s%s%s%s)' % (match.group(1), path, suffix,
+            match.group(1))
+    return CSS_URL.sub(rebase, text)
+
+
+def buildBundle(name, sources):
+    '''
+    Return the minified content of a bundle made of a list of files in
+    static/.
+
+    Args:
+        str name
+        list sources
+    '''
+    parts = []
+    for source in sources:
+        with open(os.path.join(STATIC_DIR, source), 'rb') as f:
+            text = f.read()
+        if name.endswith('.css'):
+            text = rebaseCSSURLs(text, source)
+            if not source.endswith('.min.css'):
+                text = minifyCSS(text)
+        elif not source.endswith('.min.js'):
+            text = minifyJS(text)
+        parts.append(text.strip())
+    # End each script with a semicolon in case the next starts with a '('.
+    return ('\n' if name.endswith('.css') else ';\n').join(parts) + '\n'
+
+
+def writeFile(path, data):
+    # Write a file whole, so that it is never served half written.
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.rename(path + '.tmp', path)
+
+
+def build(bundles=BUNDLES):
+    '''
+    Build every bundle, and its compressed copies, into static/build/, and
+    write the manifest of their file names. Bundles built before are kept,
+    for pages already sent that still link to them. Returns the manifest.
+
+    Args:
+        list bundles
+    '''
+    missing = [source for name, sources in bundles for source in sources
+        if not os.path.exists(os.path.join(STATIC_DIR, source))]
+    if missing:
+        raise IOError('Missing %s; run "python assets.py vendor" first.' %
+            ', '.join(missing))
+    if not os.path.isdir(BUILD_DIR):
+        os.makedirs(BUILD_DIR)
+
+    manifest = {}
+    for name, sources in bundles:
+        data = buildBundle(name, sources)
+        base, extension = os.path.splitext(name)
+        filename = '%s.%s%s' % (base, hashlib.sha1(data).hexdigest()[:12],
+            extension)
+        path = os.path.join(BUILD_DIR, filename)
+        writeFile(path, data)
+        for encoding, suffix in ENCODING_SUFFIXES:
+            if encoding in [available[0] for available in ENCODINGS]:
+                writeFile(path + suffix, compress(data, encoding,
+                    cached = True))
+        manifest[name] = filename
+    writeFile(MANIFEST, json.dumps(manifest, indent = 2, sort_keys = True))
+    return manifest
+
+
+def vendor(files=VENDORED):
+    '''
+    Download the third party files into static/, replacing any already
+    there.
+
+    Args:
+        list files
+    '''
+    for path, url in files:
+        print 'Downloading %s' % url
+        data = urllib2.urlopen(url, timeout = 30).read()
+        path = os.path.join(STATIC_DIR, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        writeFile(path, data)
+
+
+class Assets(object):
+    '''
+    The bundles listed in the manifest of static/build/ when created, for
+    the pages of a Flask application. See the top of this file.
+    '''
+
+    def __init__(self, manifest=MANIFEST, directory=BUILD_DIR):
+        self.directory = directory
+        self.manifest = {}
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                self.manifest = json.load(f)
+        self.vendored = dict(VENDORED)
+        self.bundles = dict(BUNDLES)
+
+    def urls(self, name):
+        '''
+        Return the list of URLs a page links to for a bundle: the URL of
+        the built bundle, or until it is built, those of the files it is
+        made of. Registered with Flask as the assetUrls() template global.
+
+        Args:
+            str name
+        '''
+        filename = self.manifest.get(name)
+        if filename is not None:
+            return [url_for('static', filename = 'build/' + filename)]
+        urls = []
+        for source in self.bundles[name]:
+            if source in self.vendored and not os.path.exists(
+                    os.path.join(STATIC_DIR, source)):
+                urls.append(self.vendored[source])
+            else:
+                urls.append(url_for('static', filename = source))
+        return urls
+
+    def send(self, filename, accept):
+        '''
+        Return the response to a request for a built bundle, from the copy
+        in the best of the encodings the client accepts in its
+        Accept-Encoding header. Aborts with a 404 if there is no such
+        bundle.
+
+        The bundle's ETag is its file name, which holds the hash of its
+        content, whichever copy is sent, so a conditional GET is answered
+        with a 304 however the bundle was encoded. It is weak for the
+        compressed copies, which aren't byte for byte the bundle.
+
+        Args:
+            str filename
+            Accept accept
+        '''
+        path = os.path.join(self.directory, filename)
+        if filename == 'manifest.json' or not os.path.isfile(path):
+            abort(404)
+        suffixes = dict(ENCODING_SUFFIXES)
+        encoding = chooseEncoding(accept, [name for name, suffix in
+            ENCODING_SUFFIXES if os.path.isfile(path + suffix)])
+
+        # Give a compressed copy the media type of the bundle.
+        mimetype = mimetypes.guess_type(filename)[0]
+        response = send_from_directory(self.directory,
+            filename + suffixes.get(encoding, ''), mimetype = mimetype,
+            add_etags = False, conditional = False,
+            cache_timeout = BUNDLE_MAX_AGE)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = BUNDLE_CACHE_CONTROL
+        response.set_etag(filename, weak = encoding is not None)
+        return response.make_conditional(request)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description = 'Vendor and build the static CSS and JavaScript.')
+    commands = parser.add_subparsers(dest = 'command')
+    commands.add_parser('vendor',
+        help = 'download the third party files into static/vendor/')
+    commands.add_parser('build',
+        help = 'build the bundles into static/build/')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'vendor':
+            vendor()
+        else:
+            for name, filename in sorted(build().items()):
+                print '%-12s static/build/%s' % (name, filename)
+    except (IOError, urllib2.URLError) as e:
+        sys.exit(str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,513 @@
+# Benchmark every route of finalproject.py through Flask's test client.
+#
+# Each route in the application's URL map (the routes listed in
+# doc/restaurant-url-method-routing.csv, plus any added since) is requested
+# many times, and its latency percentiles, requests per second and SQL
+# statements per request are reported. Results can be saved as a baseline
+# and later runs compared against it to flag regressions, e.g.:
+#
+#   python generatecatalog.py --restaurants 10000 --database sqlite:///bench.db
+#   python benchmark.py --database sqlite:///bench.db --save baseline.json
+#   ... change finalproject.py ...
+#   python benchmark.py --database sqlite:///bench.db --compare baseline.json
+#
+# The write routes add, edit and then delete their own rows, so a run leaves
+# the catalog as it found it.
+#
+# With --concurrent, it instead measures how fast menus can be read while
+# menu items are being edited, with SQLite's default rollback journal and
+# then with the PRAGMAs of database_setup.SQLITE_PRAGMAS:
+#
+#   python benchmark.py --database sqlite:///bench.db --concurrent
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from flask import url_for
+
+
+# The query strings added to the URLs of the routes that need one.
+QUERY_STRINGS = {
+    'searchJSON': 'q=burger',
+}
+
+# The statistics compared against a baseline. A larger value is worse for
+# each of them.
+COMPARED = ['p50_ms', 'p95_ms', 'p99_ms', 'sql_per_request']
+
+
+def percentile(samples, fraction):
+    '''
+    Return the value below which the given fraction of the sorted samples
+    fall, using the nearest rank method.
+
+    Args:
+        list samples
+        float fraction
+    '''
+    if not samples:
+        return 0.0
+    rank = int(round(fraction * len(samples) + 0.5)) - 1
+    return samples[max(0, min(rank, len(samples) - 1))]
+
+
+class Benchmark(object):
+    '''
+    Drives the routes of a Flask application with its test client, counting
+    the SQL statements each request executes on the given list of engines.
+    '''
+
+    def __init__(self, app, engines, requests):
+        from sqlalchemy import event
+
+        self.app = app
+        self.requests = requests
+        self.client = app.test_client(use_cookies = False)
+        self.statements = 0
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute',
+                self._countStatement)
+
+    def _countStatement(self, *args):
+        self.statements += 1
+
+    def run(self, method, makeRequest):
+        '''
+        Make self.requests requests and return a dictionary of their
+        statistics. makeRequest is called with the iteration number and must
+        return a tuple of (url, form data or None).
+
+        Args:
+            str method
+            function makeRequest
+        '''
+        timings = []
+        statements = 0
+        failures = 0
+        started = time.time()
+        for i in range(self.requests):
+            url, data = makeRequest(i)
+            self.statements = 0
+            start = time.time()
+            response = self.client.open(url, method = method, data = data)
+            timings.append(time.time() - start)
+            statements += self.statements
+            if response.status_code >= 400:
+                failures += 1
+        elapsed = time.time() - started
+
+        timings.sort()
+        return {
+            'requests': self.requests,
+            'failures': failures,
+            'p50_ms': percentile(timings, 0.50) * 1000,
+            'p95_ms': percentile(timings, 0.95) * 1000,
+            'p99_ms': percentile(timings, 0.99) * 1000,
+            'requests_per_second': self.requests / elapsed if elapsed else 0,
+            'sql_per_request': float(statements) / self.requests,
+        }
+
+
+def sampleIds(session, restaurant_id=None):
+    '''
+    Return the (restaurant_id, menu_id) used to fill in the URLs of the
+    benchmarked routes: the given restaurant, or else the first restaurant
+    with a menu, and its first menu item.
+
+    Args:
+        session session
+        int restaurant_id
+    '''
+    from database_setup import MenuItem
+
+    query = session.query(MenuItem.restaurant_id, MenuItem.id)
+    if restaurant_id is not None:
+        query = query.filter(MenuItem.restaurant_id == restaurant_id)
+    row = query.order_by(MenuItem.id).first()
+    if row is None:
+        sys.exit('No restaurant with a menu; generate a catalog first.')
+    return row
+
+
+def scenarios(app, session, restaurant_id, menu_id):
+    '''
+    Return a list of (name, method, makeRequest) tuples, one per method of
+    every route of the application, and a function to call once they have
+    all run. See Benchmark.run() for makeRequest.
+
+    The write routes act on rows made for the purpose: a scratch
+    restaurant's menu items are created, edited and deleted in turn, then
+    its menu is replaced by bulk imports, and scratch restaurants are
+    created, renamed and deleted in turn. The returned function deletes the
+    scratch restaurant and its menu.
+
+    Args:
+        Flask app
+        session session
+        int restaurant_id
+        int menu_id
+    '''
+    from database_setup import Restaurant, MenuItem
+
+    scratch = {}
+
+    def url(endpoint, **values):
+        with app.test_request_context():
+            return url_for(endpoint, **values)
+
+    def scratchRestaurant():
+        # The restaurant whose menu the menu item write routes change.
+        if 'restaurant' not in scratch:
+            restaurant = Restaurant(name = 'Benchmark Scratch Restaurant')
+            session.add(restaurant)
+            session.commit()
+            scratch['restaurant'] = restaurant.id
+        return scratch['restaurant']
+
+    def cleanup():
+        if 'restaurant' in scratch:
+            session.query(MenuItem).filter_by(
+                restaurant_id = scratch['restaurant']).delete()
+            session.query(Restaurant).filter_by(
+                id = scratch['restaurant']).delete()
+            session.commit()
+
+    def scratchIds(model, **filters):
+        # The ids of the rows made by the create routes, oldest first.
+        ids = [row.id for row in session.query(model.id).filter_by(
+            **filters).order_by(model.id)]
+        session.commit()
+        return ids
+
+    def newMenuItem(i):
+        return url('newMenuItem', restaurant_id = scratchRestaurant()), {
+            'name': 'Benchmark Dish %d' % i}
+
+    def editMenuItem(i):
+        if i == 0:
+            scratch['items'] = scratchIds(MenuItem,
+                restaurant_id = scratchRestaurant())
+        return url('editMenuItem', restaurant_id = scratchRestaurant(),
+            menu_id = scratch['items'][i]), {'name': 'Edited Dish %d' % i,
+            'description': 'Edited', 'price': '$1.00', 'course': 'Entree'}
+
+    def deleteMenuItem(i):
+        return url('deleteMenuItem', restaurant_id = scratchRestaurant(),
+            menu_id = scratch['items'][i]), None
+
+    def importMenu(i):
+        # Replace the scratch restaurant's menu with a 300 item menu.
+        items = [{'name': 'Imported Dish %d' % j, 'description': 'Imported',
+            'price': '$%d.99' % (j % 30), 'course': 'Entree'}
+            for j in range(300)]
+        return url('importMenuJSON', restaurant_id = scratchRestaurant()), \
+            json.dumps({'MenuItems': items, 'replace': True})
+
+    def newRestaurant(i):
+        return url('newRestaurant'), {'name': 'Benchmark Restaurant'}
+
+    def editRestaurant(i):
+        if i == 0:
+            scratch['restaurants'] = scratchIds(Restaurant,
+                name = 'Benchmark Restaurant')
+        return url('editRestaurant',
+            restaurant_id = scratch['restaurants'][i]), {
+            'name': 'Benchmark Restaurant'}
+
+    def deleteRestaurant(i):
+        return url('deleteRestaurant',
+            restaurant_id = scratch['restaurants'][i]), None
+
+    # The POST handlers, in the order they must run.
+    writes = [
+        ('newMenuItem', newMenuItem),
+        ('editMenuItem', editMenuItem),
+        ('deleteMenuItem', deleteMenuItem),
+        ('importMenuJSON', importMenu),
+        ('newRestaurant', newRestaurant),
+        ('editRestaurant', editRestaurant),
+        ('deleteRestaurant', deleteRestaurant),
+    ]
+    writers = dict(writes)
+
+    # Every GET, filling in the URL with the sample ids.
+    values = {'restaurant_id': restaurant_id, 'menu_id': menu_id}
+    reads = []
+    posts = []
+    for rule in sorted(app.url_map.iter_rules(), key = lambda r: r.rule):
+        # Skip the routes whose URLs need values other than the sample ids,
+        # e.g., the static files and the bundles built by assets.py.
+        if not rule.arguments.issubset(values):
+            continue
+        arguments = dict((name, values[name]) for name in rule.arguments)
+        path = app.url_map.bind('localhost').build(rule.endpoint, arguments)
+        if rule.endpoint in QUERY_STRINGS:
+            path += '?' + QUERY_STRINGS[rule.endpoint]
+        for method in sorted(rule.methods - set(['HEAD', 'OPTIONS'])):
+            name = '%s %s' % (method, rule.rule)
+            if method == 'GET':
+                reads.append((name, method, lambda i, path=path: (path, None)))
+            elif rule.endpoint in writers:
+                posts.append((rule.endpoint, name, method))
+            else:
+                print >> sys.stderr, 'No benchmark scenario for %s' % name
+
+    # Run the reads before the writes, which change the catalog, and the
+    # writes in the order of the list above.
+    order = [endpoint for endpoint, makeRequest in writes]
+    posts.sort(key = lambda post: order.index(post[0]))
+    return reads + [(name, method, writers[endpoint])
+        for endpoint, name, method in posts], cleanup
+
+
+# The PRAGMAs of an SQLite database left at its defaults, compared against
+# database_setup.SQLITE_PRAGMAS by --concurrent.
+DEFAULT_PRAGMAS = [('journal_mode', 'DELETE'), ('synchronous', 'FULL')]
+
+
+def readMenus(url, pragmas, restaurantIds, start, deadline, seed, results):
+    # Read menus of random restaurants from start until deadline, in a
+    # process of its own, and put the list of their timings and the number
+    # of failures on the results queue.
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.orm import sessionmaker
+    from database_setup import createEngine
+    from queries import loadCourseMenu
+
+    rng = random.Random(seed)
+    session = sessionmaker(bind = createEngine(url, pragmas))()
+    time.sleep(max(0, start - time.time()))
+    timings = []
+    errors = 0
+    while time.time() < deadline:
+        start = time.time()
+        try:
+            loadCourseMenu(session, rng.choice(restaurantIds))
+            timings.append(time.time() - start)
+        except OperationalError:
+            errors += 1
+        # End the read transaction, as the end of a request does.
+        session.rollback()
+        session.expunge_all()
+    session.close()
+    results.put((timings, errors))
+
+
+def editMenuItems(url, pragmas, items, start, deadline, results):
+    # Edit menu items, one transaction each, from start until deadline, in a
+    # process of its own, and put the number of edits and of failures on
+    # the results queue.
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.orm import sessionmaker
+    from database_setup import MenuItem, createEngine
+    from queries import bumpVersions
+
+    rng = random.Random(0)
+    session = sessionmaker(bind = createEngine(url, pragmas))()
+    time.sleep(max(0, start - time.time()))
+    writes = 0
+    errors = 0
+    while time.time() < deadline:
+        item_id, restaurant_id = rng.choice(items)
+        try:
+            session.query(MenuItem).filter_by(id = item_id).update(
+                {MenuItem.price: MenuItem.price}, synchronize_session = False)
+            bumpVersions(session, restaurant_id)
+            session.commit()
+            writes += 1
+        except OperationalError:
+            session.rollback()
+            errors += 1
+    session.close()
+    results.put((writes, errors))
+
+
+def concurrentReadWrite(url, pragmas, readers=4, seconds=5.0):
+    '''
+    Read menus with loadCourseMenu() from readers processes while another
+    process edits menu items as fast as it can, one transaction per edit,
+    for the given number of seconds, and return a dictionary of the read
+    and write rates, the read latency percentiles and the number of failed
+    statements. Each process opens the database at url with its own engine,
+    running the given list of (name, value) PRAGMAs on connect, as the
+    worker processes of a WSGI server would. Each edit rewrites a menu
+    item's price with its own value, so the catalog is left as it was
+    found, apart from its CatalogVersions.
+
+    Args:
+        str url
+        list pragmas
+        int readers
+        float seconds
+    '''
+    from multiprocessing import Process, Queue
+    from sqlalchemy.orm import sessionmaker
+    from database_setup import MenuItem, createEngine
+
+    engine = createEngine(url, pragmas)
+    session = sessionmaker(bind = engine)()
+    restaurantIds = [row[0] for row in session.query(
+        MenuItem.restaurant_id).distinct()]
+    items = [tuple(row) for row in session.query(MenuItem.id,
+        MenuItem.restaurant_id).limit(1000)]
+    session.close()
+    engine.dispose()
+    if not items:
+        sys.exit('No menu items; generate a catalog first.')
+
+    readResults = Queue()
+    writeResults = Queue()
+    # Give the processes a second to start, then run them all together.
+    start = time.time() + 1
+    deadline = start + seconds
+    processes = [Process(target = readMenus, args = (url, pragmas,
+        restaurantIds, start, deadline, i, readResults))
+        for i in range(readers)]
+    processes.append(Process(target = editMenuItems, args = (url, pragmas,
+        items, start, deadline, writeResults)))
+    for process in processes:
+        process.start()
+
+    timings = []
+    errors = 0
+    for i in range(readers):
+        mine, failed = readResults.get()
+        timings.extend(mine)
+        errors += failed
+    writes, failed = writeResults.get()
+    errors += failed
+    for process in processes:
+        process.join()
+
+    timings.sort()
+    return {
+        'reads_per_second': len(timings) / seconds,
+        'read_p50_ms': percentile(timings, 0.50) * 1000,
+        'read_p95_ms': percentile(timings, 0.95) * 1000,
+        'read_p99_ms': percentile(timings, 0.99) * 1000,
+        'writes_per_second': writes / seconds,
+        'errors': errors,
+    }
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Return a list of messages describing each statistic in results that is
+    more than tolerance (a fraction) worse than in baseline.
+
+    Args:
+        dict results
+        dict baseline
+        float tolerance
+    '''
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        for key in COMPARED:
+            old = baseline[name].get(key)
+            new = results[name][key]
+            if old is None:
+                continue
+            # Ignore differences below a tenth of a millisecond or query.
+            if new > old * (1 + tolerance) and new - old > 0.1:
+                regressions.append('%s: %s %.2f -> %.2f (%+.0f%%)' % (
+                    name, key, old, new,
+                    100.0 * (new - old) / old if old else 100.0))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description = 'Benchmark the routes of finalproject.py.')
+    parser.add_argument('--database',
+        help = 'database URL to benchmark against (default: '
+        'CATALOG_DATABASE_URL or restaurantmenu.db)')
+    parser.add_argument('--requests', type = int, default = 200,
+        help = 'requests per route (default %(default)s)')
+    parser.add_argument('--restaurant-id', type = int,
+        help = 'restaurant whose pages are requested (default: the first '
+        'with a menu)')
+    parser.add_argument('--no-page-cache', action = 'store_true',
+        help = 'render every page rather than serve it from the page cache')
+    parser.add_argument('--save', metavar = 'FILE',
+        help = 'save the results as a baseline JSON file')
+    parser.add_argument('--compare', metavar = 'FILE',
+        help = 'compare the results against a saved baseline, and exit '
+        'with status 1 if any route regressed')
+    parser.add_argument('--tolerance', type = float, default = 0.10,
+        help = 'fraction by which a statistic may grow before it is a '
+        'regression (default %(default)s)')
+    parser.add_argument('--concurrent', action = 'store_true',
+        help = 'instead, measure menu reads during concurrent writes with '
+        'the default and the tuned SQLite PRAGMAs')
+    parser.add_argument('--readers', type = int, default = 4,
+        help = 'reading processes for --concurrent (default %(default)s)')
+    parser.add_argument('--seconds', type = float, default = 5.0,
+        help = 'length of each --concurrent run (default %(default)s)')
+    args = parser.parse_args()
+
+    if args.concurrent:
+        from database_setup import DATABASE_URL, SQLITE_PRAGMAS
+        url = args.database or DATABASE_URL
+        print '%-18s %9s %8s %8s %8s %9s %7s' % ('pragmas', 'reads/s',
+            'p50 ms', 'p95 ms', 'p99 ms', 'writes/s', 'errors')
+        for name, pragmas in [('rollback journal', DEFAULT_PRAGMAS),
+                ('SQLITE_PRAGMAS', SQLITE_PRAGMAS)]:
+            result = concurrentReadWrite(url, pragmas, args.readers,
+                args.seconds)
+            print '%-18s %9.1f %8.2f %8.2f %8.2f %9.1f %7d' % (name,
+                result['reads_per_second'], result['read_p50_ms'],
+                result['read_p95_ms'], result['read_p99_ms'],
+                result['writes_per_second'], result['errors'])
+        return
+
+    # The database must be chosen before finalproject.py connects to it.
+    if args.database:
+        os.environ['CATALOG_DATABASE_URL'] = args.database
+    import finalproject
+
+    app = finalproject.app
+    app.secret_key = app.secret_key or 'benchmark'
+    if args.no_page_cache:
+        finalproject.pageCache.max_entries = 0
+
+    benchmark = Benchmark(app, [finalproject.engine, finalproject.readEngine],
+        args.requests)
+    restaurant_id, menu_id = sampleIds(finalproject.session,
+        args.restaurant_id)
+
+    print '%-58s %8s %8s %8s %9s %6s' % ('route', 'p50 ms', 'p95 ms',
+        'p99 ms', 'req/s', 'sql')
+    results = {}
+    routes, cleanup = scenarios(app, finalproject.session, restaurant_id,
+        menu_id)
+    for name, method, makeRequest in routes:
+        result = benchmark.run(method, makeRequest)
+        results[name] = result
+        print '%-58s %8.2f %8.2f %8.2f %9.1f %6.1f%s' % (name,
+            result['p50_ms'], result['p95_ms'], result['p99_ms'],
+            result['requests_per_second'], result['sql_per_request'],
+            '  (%d failed)' % result['failures'] if result['failures'] else '')
+    cleanup()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent = 2, sort_keys = True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print 'REGRESSION %s' % regression
+        if regressions:
+            sys.exit(1)
+        print 'No regressions against %s.' % args.compare
+
+
+if __name__ == '__main__':
+    main()
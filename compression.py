@@ -0,0 +1,200 @@
+# Compress the text responses of finalproject.py, negotiated with the
+# client's Accept-Encoding header.
+#
+# Responses are gzipped, or compressed with brotli or zstd when the brotli
+# or zstandard module is installed and the client accepts them. Bodies
+# shorter than CATALOG_COMPRESS_MIN_SIZE bytes (1024 by default) are sent as
+# they are, since compressing them saves less than it costs. Pages served
+# from the page cache are compressed once per change, at the best level,
+# and the compressed copies are cached next to them; everything else is
+# compressed per request at a faster level.
+
+import os
+import zlib
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# The smallest body, in bytes, worth compressing.
+MIN_SIZE = int(os.environ.get('CATALOG_COMPRESS_MIN_SIZE', 1024))
+
+# The media types of the responses that are compressed.
+COMPRESSIBLE_TYPES = set(['text/html', 'text/plain', 'text/css',
+    'text/javascript', 'application/javascript', 'application/json',
+    'image/svg+xml'])
+
+
+def gzipCompress(data, level):
+    # Return data compressed in the gzip format.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+# The encodings available, most preferred first, each as a tuple of (name,
+# function(data, level) returning the compressed data, level used per
+# request, level used for cached pages).
+ENCODINGS = []
+if brotli is not None:
+    ENCODINGS.append(('br', lambda data, level: brotli.compress(data,
+        quality = level), 5, 11))
+if zstandard is not None:
+    ENCODINGS.append(('zstd', lambda data, level: zstandard.ZstdCompressor(
+        level = level).compress(data), 3, 19))
+ENCODINGS.append(('gzip', gzipCompress, 6, 9))
+
+
+def chooseEncoding(accept, names=None):
+    '''
+    Return the one of a list of encoding names, by default those of
+    ENCODINGS, that the client rates highest in its Accept-Encoding header,
+    preferring the first of equally rated ones, or None if the client
+    accepts none of them.
+
+    Args:
+        Accept accept
+        list names
+    '''
+    if names is None:
+        names = [encoding[0] for encoding in ENCODINGS]
+    best, bestQuality = None, 0
+    for name in names:
+        quality = accept.quality(name)
+        if quality > bestQuality:
+            best, bestQuality = name, quality
+    return best
+
+
+def compress(data, encoding, cached=False, encodings=ENCODINGS):
+    '''
+    Return data compressed with the named encoding, at the level used per
+    request, or with cached, at the slower level used for cached pages.
+
+    Args:
+        str data
+        str encoding
+        bool cached
+        list encodings
+    '''
+    for name, function, level, cachedLevel in encodings:
+        if name == encoding:
+            return function(data, cachedLevel if cached else level)
+    raise ValueError('Unknown encoding: %r' % encoding)
+
+
+def gzipStream(chunks, charset, level=6):
+    '''
+    Generate the gzip compressed form of an iterable of chunks of a body,
+    a compressed chunk for each one, so that a streamed response is still
+    sent as it is produced.
+
+    Args:
+        iterable chunks
+        str charset
+        int level
+    '''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode(charset)
+        data = compressor.compress(chunk)
+        data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def encodedResponse(data, encoding, mimetype='text/html'):
+    '''
+    Return a response whose body is data already compressed with the named
+    encoding, e.g., a compressed page from the page cache.
+
+    Args:
+        str data
+        str encoding
+        str mimetype
+    '''
+    response = Response(data, mimetype = mimetype)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+class Compressor(object):
+    '''
+    Compresses the responses of a Flask application whose media type is in
+    COMPRESSIBLE_TYPES, in the encoding the client prefers, once
+    instrument() has been called. Responses are left alone if they are
+    shorter than min_size, already encoded, or marked no-transform. Streamed
+    responses, whose size isn't known, are gzipped as they are sent.
+
+    Compressed responses can't share a strong ETag with the uncompressed
+    ones, so their ETags are made weak.
+    '''
+
+    def __init__(self, min_size=MIN_SIZE, encodings=ENCODINGS):
+        self.min_size = min_size
+        self.encodings = encodings
+        self.names = [encoding[0] for encoding in encodings]
+
+    def instrument(self, app):
+        '''
+        Compress the responses of app.
+
+        Args:
+            Flask app
+        '''
+        from flask import request
+
+        def compressResponse(response):
+            return self.compressResponse(response, request.accept_encodings)
+        app.after_request(compressResponse)
+
+    def compressResponse(self, response, accept):
+        '''
+        Compress a response for a client sending the Accept-Encoding header
+        accept, if it is worth it, and return it.
+
+        Args:
+            Response response
+            Accept accept
+        '''
+        if response.mimetype not in COMPRESSIBLE_TYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.status_code != 200 or response.direct_passthrough or \
+                'Content-Encoding' in response.headers or \
+                response.cache_control.no_transform:
+            return response
+
+        if response.is_streamed:
+            if accept.quality('gzip') <= 0:
+                return response
+            response.response = gzipStream(response.response,
+                response.charset)
+            response.headers.pop('Content-Length', None)
+            encoding = 'gzip'
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            encoding = chooseEncoding(accept, self.names)
+            if encoding is None:
+                return response
+            response.set_data(compress(data, encoding,
+                encodings = self.encodings))
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak = True)
+        return response
@@ -1,19 +1,233 @@
 # Beginning configuration section
+import os
+import re
+import sqlite3
 import sys
-from sqlalchemy import Column, ForeignKey, Integer, String
+import urllib
+from sqlalchemy import Column, ForeignKey, Integer, String, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
-from sqlalchemy import create_engine
+from sqlalchemy.orm import relationship, backref, validates, Session
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy import create_engine, inspect, event, exc, select, bindparam
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
 # Create a base class for our class code to inherit
 Base = declarative_base()
 
+# The database every module connects to. Set the CATALOG_DATABASE_URL
+# environment variable to use another one, e.g., a generated catalog:
+#   CATALOG_DATABASE_URL=sqlite:///catalog-100k.db python finalproject.py
+DATABASE_URL = os.environ.get('CATALOG_DATABASE_URL',
+    'sqlite:///restaurantmenu.db')
+
+# The connection pool of the engines made by createEngine(), set with
+# environment variables: the connections kept open, the extra connections
+# allowed under load, the seconds to wait for a free connection, and the age
+# in seconds after which a connection is replaced.
+POOL_SIZE = int(os.environ.get('CATALOG_DB_POOL_SIZE', 5))
+POOL_MAX_OVERFLOW = int(os.environ.get('CATALOG_DB_MAX_OVERFLOW', 10))
+POOL_TIMEOUT = int(os.environ.get('CATALOG_DB_POOL_TIMEOUT', 30))
+POOL_RECYCLE = int(os.environ.get('CATALOG_DB_POOL_RECYCLE', 3600))
+# The connections of the pool of an engine made with createEngine(writer =
+# True). SQLite runs one write transaction at a time, so by default writes
+# wait their turn for the one connection rather than for SQLite's lock.
+WRITE_POOL_SIZE = int(os.environ.get('CATALOG_DB_WRITE_POOL_SIZE', 1))
+
+# The PRAGMAs run on every new connection to an SQLite database by the
+# engines made by createEngine(). Write ahead logging lets menus be read
+# while a change is being written, rather than waiting for it; with it,
+# synchronous=NORMAL only risks losing the last transactions on a power
+# failure, never corrupting the database. Reads are served from up to 256MB
+# of memory mapped file and a 64MB page cache, and a writer waits up to 5s
+# for another to finish instead of failing at once. Any of them can be
+# changed, or turned off with an empty value, with the CATALOG_SQLITE_PRAGMAS
+# environment variable, e.g.:
+#   CATALOG_SQLITE_PRAGMAS=synchronous=FULL,mmap_size= python finalproject.py
+SQLITE_PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', '268435456'),
+    ('cache_size', '-65536'),
+    ('busy_timeout', '5000'),
+    ('temp_store', 'MEMORY'),
+]
+
+# A PRAGMA setting of CATALOG_SQLITE_PRAGMAS.
+PRAGMA_PATTERN = re.compile(r'^(\w+)=([\w-]*)$')
+
+
+def parsePragmas(text, pragmas=SQLITE_PRAGMAS):
+    '''
+    Return a copy of a list of (name, value) PRAGMA tuples, changed by a
+    comma separated list of name=value settings, e.g., "synchronous=FULL".
+    A setting with an empty value removes the PRAGMA. Raises ValueError if
+    a setting isn't of the form name=value.
+
+    Args:
+        str text
+        list pragmas
+    '''
+    pragmas = list(pragmas)
+    for setting in filter(None, (text or '').replace(' ', '').split(',')):
+        match = PRAGMA_PATTERN.match(setting)
+        if match is None:
+            raise ValueError('Malformed PRAGMA setting: %r' % setting)
+        name, value = match.groups()
+        pragmas = [pragma for pragma in pragmas if pragma[0] != name.lower()]
+        if value:
+            pragmas.append((name.lower(), value))
+    return pragmas
+
+
+def createEngine(url=DATABASE_URL, pragmas=None, readOnly=False,
+        writer=False):
+    '''
+    Return an engine for the database at url, with a pool of connections
+    that can be shared by threads and is sized by the POOL_ settings above.
+    A connection is never used by a process other than the one that opened
+    it, so the engine can be inherited by forked worker processes.
+
+    Each new connection to an SQLite database runs the given list of (name,
+    value) PRAGMAs, by default SQLITE_PRAGMAS as changed by the
+    CATALOG_SQLITE_PRAGMAS environment variable.
+
+    With readOnly, connections to an SQLite database file are opened
+    read-only, with PRAGMA query_only set, so they never take a write lock.
+    With writer, the pool has only WRITE_POOL_SIZE connections, and no
+    overflow, for an engine that is used only to write. See RoutingSession.
+
+    Args:
+        str url
+        list pragmas
+        bool readOnly
+        bool writer
+    '''
+    options = {}
+    database = make_url(url)
+    if database.drivername.startswith('sqlite'):
+        if pragmas is None:
+            pragmas = parsePragmas(os.environ.get('CATALOG_SQLITE_PRAGMAS'))
+        if database.database in (None, '', ':memory:'):
+            if readOnly:
+                raise ValueError('An in-memory database has no second, '
+                    'read-only engine.')
+            # Every connection to :memory: is a different database, so keep
+            # SQLAlchemy's default single connection pool.
+            engine = create_engine(url)
+            applyPragmas(engine, pragmas)
+            return engine
+        # Let connections opened by one thread be used by another.
+        options['connect_args'] = {'check_same_thread': False}
+        if readOnly:
+            # Open the file with a URI filename, which is how SQLite is told
+            # to open it read-only. The journal mode can't be set read-only.
+            path = 'file:%s?mode=ro' % urllib.quote(os.path.abspath(
+                database.database))
+            options['creator'] = lambda: sqlite3.connect(path,
+                check_same_thread = False)
+            pragmas = [pragma for pragma in pragmas
+                if pragma[0] != 'journal_mode'] + [('query_only', '1')]
+
+    poolSize, maxOverflow = POOL_SIZE, POOL_MAX_OVERFLOW
+    if writer:
+        poolSize, maxOverflow = WRITE_POOL_SIZE, 0
+
+    engine = create_engine(url, poolclass = QueuePool,
+        pool_size = poolSize, max_overflow = maxOverflow,
+        pool_timeout = POOL_TIMEOUT, pool_recycle = POOL_RECYCLE, **options)
+
+    # Record which process opened each connection, and make the pool replace
+    # any connection inherited from a parent process rather than share it.
+    @event.listens_for(engine, 'connect')
+    def recordProcess(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    @event.listens_for(engine, 'checkout')
+    def checkProcess(dbapi_connection, connection_record, connection_proxy):
+        if connection_record.info['pid'] != os.getpid():
+            connection_record.connection = connection_proxy.connection = None
+            raise exc.DisconnectionError(
+                'Connection belongs to process %d, not %d' % (
+                connection_record.info['pid'], os.getpid()))
+
+    if pragmas:
+        applyPragmas(engine, pragmas)
+    return engine
+
+
+class RoutingSession(Session):
+    '''
+    A session that runs its statements on readEngine while isReadOnly()
+    returns True, and on writeEngine otherwise. If readEngine is read-only,
+    an attempt to write while isReadOnly() returns True fails rather than
+    taking a write lock. Made with, e.g.:
+
+        sessionmaker(class_ = RoutingSession, readEngine = readEngine,
+            writeEngine = writeEngine, isReadOnly = readOnlyRequest)
+    '''
+
+    def __init__(self, readEngine, writeEngine, isReadOnly, **kwargs):
+        Session.__init__(self, **kwargs)
+        self.readEngine = readEngine
+        self.writeEngine = writeEngine
+        self.isReadOnly = isReadOnly
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.isReadOnly():
+            return self.readEngine
+        return self.writeEngine
+
+
+def applyPragmas(engine, pragmas):
+    '''
+    Run a list of (name, value) PRAGMAs on every new connection of an
+    SQLite engine.
+
+    Args:
+        Engine engine
+        list pragmas
+    '''
+    @event.listens_for(engine, 'connect')
+    def setPragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+        cursor.close()
+
+
+# A price as it is written on a menu: an optional dollar sign, then dollars,
+# cents or both, e.g., "$7.50", "$25", "15" or "$.99".
+PRICE_PATTERN = re.compile(r'^\s*\$?\s*(\d*)(?:\.(\d{0,2}))?\s*$')
+
+
+def parsePriceCents(price):
+    '''
+    Return a price string, in any of the formats found in the price column,
+    as a whole number of cents, e.g., 750 for "$7.50" and 1500 for "15".
+    Returns None if price is None or isn't a price.
+
+    Args:
+        str price
+    '''
+    if price is None:
+        return None
+    match = PRICE_PATTERN.match(price.replace(',', ''))
+    if match is None:
+        return None
+    dollars, cents = match.groups()
+    if not dollars and not cents:
+        return None
+    return int(dollars or 0) * 100 + int((cents or '0').ljust(2, '0'))
+
+
 # Class section
 class Restaurant(Base):
     # Define the table called 'restaurant'
     __tablename__ = 'restaurant'
 
     # Define the column mappers
-    name = Column(String(80), nullable = False)
+    # The restaurant listing is sorted by name, so index it.
+    name = Column(String(80), nullable = False, index = True)
     id = Column(Integer, primary_key = True)
 
     @property
@@ -28,6 +242,13 @@ class Restaurant(Base):
 class MenuItem(Base):
     # Define the table called 'menu_item'
     __tablename__ = 'menu_item'
+    # Menus are fetched per restaurant, and grouped or sorted by course, or
+    # filtered and sorted by price.
+    __table_args__ = (
+        Index('ix_menu_item_restaurant_id_course', 'restaurant_id', 'course'),
+        Index('ix_menu_item_restaurant_id_price_cents', 'restaurant_id',
+            'price_cents'),
+    )
 
     # Define the column mappers
     name = Column(String(80), nullable = False)
@@ -35,10 +256,22 @@ class MenuItem(Base):
     course = Column(String(250))
     description = Column(String(250))
     price = Column(String(8))
-    restaurant_id = Column(Integer, ForeignKey('restaurant.id'))
+    # The price in cents, so that the database can sort and filter by it.
+    # Set from price whenever price is set; see validatePrice().
+    price_cents = Column(Integer)
+    restaurant_id = Column(Integer, ForeignKey('restaurant.id'), index = True)
     # Create a variable representing a relationship with the Restaurant class
-    # so that our foreign key will work
-    restaurant = relationship(Restaurant)
+    # so that our foreign key will work. The backref gives each Restaurant a
+    # menu_items list, ordered by id. passive_deletes keeps deleting a
+    # restaurant from loading its menu items first.
+    restaurant = relationship(Restaurant, backref = backref('menu_items',
+        order_by = 'MenuItem.id', passive_deletes = True))
+
+    @validates('price')
+    def validatePrice(self, key, price):
+        # Keep price_cents in step with every price written through the ORM.
+        self.price_cents = parsePriceCents(price)
+        return price
 
     @property
     def serialize(self):
@@ -48,11 +281,277 @@ class MenuItem(Base):
             'description' : self.description,
             'id' : self.id,
             'price' : self.price,
+            'price_cents' : self.price_cents,
             'course' : self.course,
         }
 
 
+class CatalogVersion(Base):
+    # Define the table called 'catalog_version'. Each row counts the changes
+    # made to one restaurant and its menu. The row with restaurant_id 0
+    # counts the changes made to the list of restaurants as a whole.
+    __tablename__ = 'catalog_version'
+
+    # Define the column mappers
+    restaurant_id = Column(Integer, primary_key = True, autoincrement = False)
+    version = Column(Integer, nullable = False, default = 0)
+
+
+# The data access calls made by the busiest routes, as (name, function(session,
+# queries module)) tuples, every SELECT of which must be answered with an index
+# rather than a full table scan. They call the functions of queries.py that
+# the routes call, so checkQueryPlans() checks the SQL the routes actually run.
+HOT_QUERIES = [
+    ('showRestaurants',
+        lambda session, queries: queries.restaurantPage(session)),
+    ('showRestaurants after a cursor',
+        lambda session, queries: queries.restaurantPage(session,
+            after = queries.encodeCursor(Restaurant(id = 1, name = 'M')))),
+    ('showRestaurants before a cursor',
+        lambda session, queries: queries.restaurantPage(session,
+            before = queries.encodeCursor(Restaurant(id = 1, name = 'M')))),
+    ('showMenu',
+        lambda session, queries: queries.loadCourseMenu(session, 1)),
+    ('restaurantMenuJSON',
+        lambda session, queries: queries.loadRestaurantMenu(session, 1)),
+    ('restaurantMenuJSON by price',
+        lambda session, queries: queries.loadRestaurantMenu(session, 1,
+            min_cents = 500, max_cents = 1500, sort = 'price')),
+    ('restaurantMenuBulkJSON',
+        lambda session, queries: queries.exportMenu(session, 1)),
+    ('menuItemJSON',
+        lambda session, queries: session.query(MenuItem).filter_by(id = 1,
+            restaurant_id = 1).all()),
+    ('searchJSON',
+        lambda session, queries: queries.searchMenuItems(session, 'burger')),
+    ('catalog version',
+        lambda session, queries: queries.catalogVersion(session, 1)),
+]
+
+
+def backfillPriceCents(engine):
+    '''
+    Set the price_cents column of every menu item from its price string, in
+    one transaction. Prices that can't be parsed are left NULL.
+
+    Args:
+        Engine engine
+    '''
+    table = MenuItem.__table__
+    with engine.begin() as connection:
+        rows = connection.execute(select([table.c.id, table.c.price]).where(
+            table.c.price != None)).fetchall()
+        updates = [{'item_id': item_id, 'cents': parsePriceCents(price)}
+            for item_id, price in rows]
+        updates = [update for update in updates if update['cents'] is not None]
+        if updates:
+            connection.execute(table.update().where(
+                table.c.id == bindparam('item_id')).values(
+                price_cents = bindparam('cents')), updates)
+
+
+# The columns added since the first release whose values are derived from
+# other columns, and the function that fills them in for existing rows.
+BACKFILLS = {
+    ('menu_item', 'price_cents'): backfillPriceCents,
+}
+
+
+# The full text search index of menu items, an SQLite FTS5 table whose rowid
+# is the menu item's id. The triggers keep it up to date as menu items and
+# restaurant names are created, changed and deleted, by any module.
+SEARCH_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS menu_item_fts USING fts5(
+        name, description, restaurant_name, tokenize = 'porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS menu_item_fts_insert
+        AFTER INSERT ON menu_item BEGIN
+        INSERT INTO menu_item_fts (rowid, name, description, restaurant_name)
+        SELECT new.id, new.name, new.description, restaurant.name
+        FROM (SELECT 1) LEFT JOIN restaurant ON restaurant.id =
+        new.restaurant_id;
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS menu_item_fts_update
+        AFTER UPDATE OF name, description, restaurant_id ON menu_item BEGIN
+        DELETE FROM menu_item_fts WHERE rowid = old.id;
+        INSERT INTO menu_item_fts (rowid, name, description, restaurant_name)
+        SELECT new.id, new.name, new.description, restaurant.name
+        FROM (SELECT 1) LEFT JOIN restaurant ON restaurant.id =
+        new.restaurant_id;
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS menu_item_fts_delete
+        AFTER DELETE ON menu_item BEGIN
+        DELETE FROM menu_item_fts WHERE rowid = old.id;
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurant_fts_update
+        AFTER UPDATE OF name ON restaurant BEGIN
+        UPDATE menu_item_fts SET restaurant_name = new.name WHERE rowid IN
+        (SELECT id FROM menu_item WHERE restaurant_id = new.id);
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurant_fts_delete
+        AFTER DELETE ON restaurant BEGIN
+        DELETE FROM menu_item_fts WHERE rowid IN
+        (SELECT id FROM menu_item WHERE restaurant_id = old.id);
+        END""",
+]
+
+
+def hasSearchIndex(engine):
+    '''
+    Return True if the database has the menu_item_fts search index.
+
+    Args:
+        Engine engine
+    '''
+    return 'menu_item_fts' in inspect(engine).get_table_names()
+
+
+def createSearchIndex(engine):
+    '''
+    Create the full text search index of SEARCH_SCHEMA, and fill it with
+    the menu items already in the database, if it doesn't exist yet. Returns
+    False, leaving the database as it was, if the database isn't SQLite or
+    its SQLite was built without FTS5.
+
+    Args:
+        Engine engine
+    '''
+    if engine.dialect.name != 'sqlite':
+        return False
+    if hasSearchIndex(engine):
+        return True
+    try:
+        with engine.begin() as connection:
+            for statement in SEARCH_SCHEMA:
+                connection.execute(statement)
+            connection.execute("""INSERT INTO menu_item_fts
+                (rowid, name, description, restaurant_name)
+                SELECT menu_item.id, menu_item.name, menu_item.description,
+                restaurant.name FROM menu_item LEFT JOIN restaurant
+                ON restaurant.id = menu_item.restaurant_id""")
+    except exc.OperationalError:
+        # No such module: fts5.
+        return False
+    return True
+
+
+def upgradeDatabase(engine):
+    '''
+    Bring an existing database up to date with the classes above, without
+    rebuilding it. create_all() only creates missing tables, so add any
+    column or index declared above that an existing table lacks, fill
+    in the added columns listed in BACKFILLS, and create the search index.
+    Safe to run any number of times.
+
+    Args:
+        Engine engine
+    '''
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = set(column['name'] for column in
+            inspector.get_columns(table.name))
+        for column in table.columns:
+            if column.name not in existing:
+                engine.execute('ALTER TABLE %s ADD COLUMN %s %s' % (
+                    table.name, column.name,
+                    column.type.compile(engine.dialect)))
+                backfill = BACKFILLS.get((table.name, column.name))
+                if backfill is not None:
+                    backfill(engine)
+
+        existing = set(index['name'] for index in
+            inspector.get_indexes(table.name))
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine)
+
+    createSearchIndex(engine)
+
+
+def recordStatements(engine, function):
+    '''
+    Call function(session) with a session of engine and return the list of
+    (statement, parameters) tuples of the SELECTs it ran. A NoResultFound
+    raised by function, e.g., in an empty database, is ignored.
+
+    Args:
+        Engine engine
+        function function
+    '''
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append((statement, parameters))
+
+    session = Session(bind = engine)
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        function(session)
+    except NoResultFound:
+        pass
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+        session.close()
+    return statements
+
+
+def checkQueryPlans(engine, hotQueries=HOT_QUERIES):
+    '''
+    Run each of the hotQueries, by default HOT_QUERIES, and EXPLAIN QUERY
+    PLAN each SELECT it runs, with its parameters. Returns a list of (name,
+    plan) tuples for the statements that scan a table without an index. An
+    empty list means every hot query uses an index. The search is skipped
+    if the database has no search index.
+
+    Args:
+        Engine engine
+        list hotQueries
+    '''
+    # Import here, since queries.py imports this module.
+    import queries
+
+    searchable = hasSearchIndex(engine)
+    failures = []
+    for name, query in hotQueries:
+        if name == 'searchJSON' and not searchable:
+            continue
+        statements = recordStatements(engine,
+            lambda session: query(session, queries))
+        connection = engine.raw_connection()
+        try:
+            for statement, parameters in statements:
+                # The last column of each row of the plan is its
+                # description, e.g., 'SEARCH menu_item USING INDEX
+                # ix_menu_item_restaurant_id (...)'. A SCAN of a subquery,
+                # rather than of a table, reads rows already found.
+                cursor = connection.cursor()
+                cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+                plan = [row[-1] for row in cursor.fetchall()]
+                cursor.close()
+                for step in plan:
+                    scanned = re.match(r'SCAN (?:TABLE )?(\w+)', step)
+                    if scanned and scanned.group(1) in Base.metadata.tables \
+                            and 'INDEX' not in step:
+                        failures.append((name, plan))
+                        break
+        finally:
+            connection.close()
+    return failures
+
+
 # Ending configuration section
 ####### Insert at end of file #######
-engine = create_engine('sqlite:///restaurantmenu.db')
+engine = createEngine(DATABASE_URL)
 Base.metadata.create_all(engine)
+upgradeDatabase(engine)
+
+
+# If this file is called directly with --check-indexes, report any hot query
+# that would scan a whole table.
+if __name__ == '__main__' and '--check-indexes' in sys.argv[1:]:
+    failures = checkQueryPlans(engine)
+    for name, plan in failures:
+        print "%s does not use an index: %s" % (name, '; '.join(plan))
+    if failures:
+        sys.exit(1)
+    print "All %d hot queries use an index." % len(HOT_QUERIES)
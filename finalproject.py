@@ -6,39 +6,297 @@
 # Fullstack Foundations course, Final Project.
 
 import os
+from functools import wraps
 from flask import Flask, render_template, url_for, request, redirect, \
-    flash, jsonify, send_from_directory
+    flash, jsonify, send_from_directory, abort, json, Response, \
+    stream_with_context, make_response, session as flask_session, \
+    has_request_context
+from werkzeug.http import remove_entity_headers
 
 # Create an instance of the Flask class with the name of the running application
 # as the argument.
 app = Flask(__name__)
+# Flask will use this key to create sessions for our users. It is set here,
+# rather than when run directly, so that WSGI servers running many worker
+# processes use it too.
+app.secret_key = os.environ.get('CATALOG_SECRET_KEY', 'tB.IWZ3baukJ_')
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 # Import the classes we created in database_setup.py
-from database_setup import Base, Restaurant, MenuItem
+from database_setup import Base, Restaurant, MenuItem, createEngine, \
+    hasSearchIndex, RoutingSession
+# Import the data access functions shared with project.py.
+from queries import restaurantPage, loadRestaurantMenu, loadCourseMenu, \
+    catalogVersion, versionETag, bumpVersions, parsePriceRange, priceRange, \
+    searchMenuItems, formatPriceCents, validateMenu, importMenu, exportMenu, \
+    DEFAULT_PAGE_SIZE, GLOBAL_VERSION, MENU_SORTS
+# Import the cache of rendered pages.
+from pagecache import PageCache
+# Import the request and SQL metrics served at /metrics.
+from metrics import Metrics
+# Import the detector of requests that run too many SQL statements.
+from querycheck import QueryDetector, queryBudget
+# Import the profiler of single requests.
+from profiling import ProfilingMiddleware, DEFAULT_CLIENTS
+# Import the compression of responses.
+from compression import Compressor, chooseEncoding, compress, encodedResponse
+# Import the bundles of CSS and JavaScript built by assets.py.
+from assets import Assets
 
 # Database connection code needs to run first:
-# Specify which database engine to communicate with and which database file.
-engine = create_engine('sqlite:///restaurantmenu.db')
+# Specify which database engines to communicate with and which database file.
+# GETs are answered with readEngine, whose pool of read-only connections is
+# shared by all requests and never takes a write lock. Everything else goes
+# through engine, whose small pool of read-write connections makes writes
+# wait their turn.
+engine = createEngine(writer = True)
+readEngine = createEngine(readOnly = True)
 
 # Bind the engine to the metadata of the Base class so that the
 # declaratives can be accessed through a DBSession instance
 Base.metadata.bind = engine
 
+
+def readOnlyRequest():
+    # Return True while answering a request that must not change anything.
+    return has_request_context() and request.method in (
+        'GET', 'HEAD', 'OPTIONS')
+
 # Create a sessionmaker object to establish a link of communications between
-# our code executions and the engine object created in the previous statement.
-DBSession = sessionmaker(bind = engine)
+# our code executions and the engines created in the previous statements.
+# Each session reads through readEngine during GETs, and through engine
+# otherwise. Wrap it in scoped_session() so that each thread, and so each
+# request, gets a session of its own.
+DBSession = scoped_session(sessionmaker(class_ = RoutingSession,
+    readEngine = readEngine, writeEngine = engine,
+    isReadOnly = readOnlyRequest))
 
 # A DBSession() instance establishes all conversations with the database
 # and represents a "staging zone" for all the objects loaded into the
 # database session object. Any change made against the objects in the
 # session won't be persisted into the database until you call
-# session.commit().
-session = DBSession()
+# session.commit(). session stands in for the current request's DBSession(),
+# which is created on first use and removed when the request ends.
+session = DBSession
+
+
+@app.teardown_appcontext
+def removeSession(exception=None):
+    # Discard the current request's database session.
+    '''
+    Called by Flask at the end of every request. Roll back whatever the
+    request left uncommitted, e.g., after a failed commit, then close its
+    session and return its connection to the pool, so that the next request
+    on this thread starts with a fresh session.
+
+    Args:
+        Exception exception
+    '''
+    if exception is not None:
+        DBSession.rollback()
+    DBSession.remove()
+
+# Record the latency, response size and SQL statements of every request,
+# except the scrapes of /metrics.
+metrics = Metrics()
+metrics.instrument(app, [engine, readEngine], ignore = ['metricsText'])
+
+# Check the SQL statements of every request for duplicates, N+1 query loops
+# and views going over their @queryBudget when CATALOG_QUERY_CHECK is set to
+# warn or raise, e.g., in development and tests.
+if os.environ.get('CATALOG_QUERY_CHECK'):
+    QueryDetector(os.environ['CATALOG_QUERY_CHECK']).instrument(app,
+        [engine, readEngine])
+
+# Profile the requests that ask for it with an X-Profile header or
+# ?profile=1, from the addresses in CATALOG_PROFILE_CLIENTS, when
+# CATALOG_PROFILE_DIR names the directory to save the profiles to. See
+# profiling.py.
+if os.environ.get('CATALOG_PROFILE_DIR'):
+    app.wsgi_app = ProfilingMiddleware(app, os.environ['CATALOG_PROFILE_DIR'],
+        os.environ.get('CATALOG_PROFILE_CLIENTS', DEFAULT_CLIENTS))
+
+# Compress text responses of CATALOG_COMPRESS_MIN_SIZE bytes or more in the
+# best encoding the client accepts. See compression.py.
+compressor = Compressor()
+compressor.instrument(app)
+
+# Let templates show prices in cents as dollars, e.g., {{ cents|dollars }}.
+app.add_template_filter(formatPriceCents, 'dollars')
+
+# Let templates link to the bundles built by assets.py, e.g.,
+# {% for url in assetUrls('site.css') %}, or to their files until built.
+assets = Assets()
+app.add_template_global(assets.urls, 'assetUrls')
+
+# Whether the database has the full text search index used by searchJSON(),
+# which needs an SQLite built with FTS5.
+searchAvailable = hasSearchIndex(engine)
+
+# Keep up to 1000 rendered pages, and up to 32MB of them, in memory. The handlers
+# that change the database drop the pages they make stale.
+pageCache = PageCache(max_entries = 1000, max_bytes = 32 * 1024 * 1024)
+
+# The number of rows fetched from the database per round trip when a JSON
+# list is streamed to the client, which bounds the memory used per request.
+STREAM_BATCH_SIZE = 100
+
+
+def streamJSONList(key, query):
+    # Encode the rows of a query as a JSON object, one batch at a time.
+    '''
+    Generate the text of the JSON object {key: [row.serialize, ...]} in
+    chunks of STREAM_BATCH_SIZE rows, fetching the rows of the query from the
+    database in batches of the same size. Only one batch of ORM objects is
+    held in memory at a time.
+
+    Args:
+        str key
+        Query query
+    '''
+    yield '{%s: [' % json.dumps(key)
+    batch = []
+    separator = ''
+    for row in query.yield_per(STREAM_BATCH_SIZE):
+        batch.append(json.dumps(row.serialize))
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield separator + ', '.join(batch)
+            separator = ', '
+            batch = []
+    if batch:
+        yield separator + ', '.join(batch)
+    yield ']}'
+
+
+def versioned(view):
+    # Add ETag and conditional GET support to a JSON API endpoint.
+    '''
+    Wrap a view so that its responses carry an ETag made from the
+    CatalogVersion of the restaurant_id in its URL, or of the whole list of
+    restaurants if the URL has none, and from its query string; see
+    queries.versionETag(). A request whose If-None-Match header holds the
+    current ETag is answered with a 304 without calling the view, so only
+    the catalog_version table is read.
+
+    Args:
+        function view
+    '''
+    @wraps(view)
+    def wrapper(**kwargs):
+        restaurant_id = kwargs.get('restaurant_id', GLOBAL_VERSION)
+        etag = versionETag(restaurant_id,
+            catalogVersion(session, restaurant_id), request.args)
+
+        # Compare weakly, since compressed responses have weak ETags.
+        if request.if_none_match.contains_weak(etag):
+            # Like werkzeug's make_conditional(), send the 304 without
+            # entity headers such as Content-Type, but with the Vary the
+            # compressed JSON would have had.
+            response = Response(status = 304)
+            remove_entity_headers(response.headers)
+            response.vary.add('Accept-Encoding')
+        else:
+            response = make_response(view(**kwargs))
+        response.set_etag(etag)
+        return response
+    return wrapper
+
+
+def cached(view):
+    # Serve an HTML page from pageCache when possible.
+    '''
+    Wrap a view that renders an HTML page so that the page is kept in
+    pageCache, keyed by the view's name, the restaurant_id in its URL (if
+    any) and the query string. Pages are neither served from nor stored in
+    the cache while a flashed message is waiting to be shown, since the
+    message is part of the page.
+
+    Each page is cached with the CatalogVersion of its restaurant, or of the
+    list of restaurants, and only served while that is still the version in
+    the database, so a change made by another process, which can't
+    invalidate this process's cache, is never served stale. Checking costs
+    one read of the catalog_version table per request.
+
+    Pages worth compressing are also cached compressed in each encoding
+    asked for, under the page's key plus the encoding, so a page is
+    compressed once per change rather than once per request. The
+    compressed copies are invalidated along with the page.
+
+    Args:
+        function view
+    '''
+    @wraps(view)
+    def wrapper(**kwargs):
+        if '_flashes' in flask_session:
+            return view(**kwargs)
+
+        restaurant_id = kwargs.get('restaurant_id')
+        key = (view.__name__, restaurant_id, request.query_string)
+        token = pageCache.token()
+        version = catalogVersion(session, GLOBAL_VERSION
+            if restaurant_id is None else restaurant_id)
+        encoding = chooseEncoding(request.accept_encodings, compressor.names)
+        if encoding is not None:
+            compressed = pageCache.get(key + (encoding,), version)
+            if compressed is not None:
+                return encodedResponse(compressed, encoding)
+
+        page = pageCache.get(key, version)
+        if page is None:
+            page = view(**kwargs)
+            if not isinstance(page, basestring):
+                return page
+            page = page.encode('utf-8')
+            pageCache.set(key, page, token, version)
+
+        if encoding is None or len(page) < compressor.min_size:
+            return page
+        compressed = compress(page, encoding, cached = True,
+            encodings = compressor.encodings)
+        pageCache.set(key + (encoding,), compressed, token, version)
+        return encodedResponse(compressed, encoding)
+    return wrapper
+
+
+def restaurantPageFromRequest():
+    # Fetch the page of restaurants asked for by the current request.
+    '''
+    Read the optional limit, after and before query string parameters of the
+    current request and return the matching page of restaurants as the tuple
+    returned by queries.restaurantPage(). Aborts with a 400 if a cursor is
+    malformed.
+    '''
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    try:
+        return restaurantPage(session, limit=limit,
+            after=request.args.get('after'),
+            before=request.args.get('before'))
+    except ValueError:
+        abort(400)
+
+
+def menuFiltersFromRequest():
+    # Read the menu filters and order asked for by the current request.
+    '''
+    Read the optional min_price, max_price and sort query string parameters
+    of the current request and return them as a dictionary of the min_cents,
+    max_cents and sort arguments of queries.loadRestaurantMenu(). Aborts
+    with a 400 if a price is malformed or the sort is unknown.
+    '''
+    sort = request.args.get('sort', 'id')
+    if sort not in MENU_SORTS:
+        abort(400)
+    try:
+        min_cents, max_cents = parsePriceRange(request.args.get('min_price'),
+            request.args.get('max_price'))
+    except ValueError:
+        abort(400)
+    return {'min_cents': min_cents, 'max_cents': max_cents, 'sort': sort}
 
 
 @app.route('/restaurant/JSON')
+@queryBudget(2)
+@versioned
 def allRestaurantsJSON():
     # An API endpoint for JSON GET requests for a list of all restaurants.
     '''
@@ -46,21 +304,25 @@ def allRestaurantsJSON():
 
         /restaurant/JSON
 
-    return a JSON formatted structure containing the name and id of all
-    restaurants, sorted by name.
+    return a JSON formatted structure containing the name and id of one page
+    of restaurants, sorted by name, along with the cursors of the next and
+    previous pages. The page size is set with ?limit=<n> and the page with
+    ?after=<next cursor> or ?before=<prev cursor>.
     '''
 
-    # Call SQLalchemy to create an object containing a list of all rows in the
-    # Restaurant table, sorted by name.
-    listOfRestaurants = session.query(
-        Restaurant).order_by(Restaurant.name).all()
+    # Call SQLalchemy to fetch one page of rows from the Restaurant table,
+    # sorted by name.
+    listOfRestaurants, nextCursor, prevCursor = restaurantPageFromRequest()
 
     # Iterate over the list, calling Restaurant.serialize(),
     # wrap in flask.jsonify() for JSON output.
-    return jsonify(MenuItem=[i.serialize for i in listOfRestaurants])
+    return jsonify(MenuItem=[i.serialize for i in listOfRestaurants],
+        next=nextCursor, prev=prevCursor)
 
 
 @app.route('/restaurant/<int:restaurant_id>/menu/JSON')
+@queryBudget(3)
+@versioned
 def restaurantMenuJSON(restaurant_id):
     # An API endpoint for JSON GET requests per restaurant.
     '''
@@ -69,22 +331,133 @@ def restaurantMenuJSON(restaurant_id):
         /restaurant/<int:restaurant_id>/menu/JSON
 
     return a JSON formatted structure containing that specific restaurant's
-    menu.
+    menu. With ?stream=1 the menu is encoded and sent in batches as it is
+    read from the database, rather than built in memory first. The menu is
+    listed cheapest first with ?sort=price, and narrowed to a price range,
+    e.g., "7.50", with ?min_price=<price> and ?max_price=<price>; the
+    database does the sorting and filtering.
     Args:
         int restaurant_id
     '''
-    # Call SQLalchemy to query the Restaurant table by the restaurant_id arg.
-    restaurant = session.query(Restaurant).filter_by(id=
-        restaurant_id).one()
+    filters = menuFiltersFromRequest()
+
+    if request.args.get('stream', type=int):
+        # Call SQLalchemy to query the Restaurant table by the restaurant_id
+        # arg.
+        restaurant = session.query(Restaurant).filter_by(id=
+            restaurant_id).one()
+
+        # Call SQLalchemy to query for that restaurant's menu items.
+        items = session.query(MenuItem).filter_by(restaurant_id=
+            restaurant.id).filter(*priceRange(filters['min_cents'],
+            filters['max_cents'])).order_by(*MENU_SORTS[filters['sort']])
+
+        # Send the same {"MenuItems": [...]} structure, a batch at a time.
+        return Response(stream_with_context(
+            streamJSONList('MenuItems', items)), mimetype='application/json')
+
+    # Call SQLalchemy to load the restaurant and its menu items in one query.
+    restaurant = loadRestaurantMenu(session, restaurant_id, **filters)
 
-    # Call SQLalchemy to query for that restaurant's menu items.
-    items = session.query(MenuItem).filter_by(restaurant_id=
-        restaurant.id).all()
+    return jsonify(MenuItems=[i.serialize for i in restaurant.menu_items])
 
-    return jsonify(MenuItems=[i.serialize for i in items])
+
+@app.route('/restaurant/<int:restaurant_id>/menu/courses/JSON')
+@queryBudget(2)
+@versioned
+def restaurantCoursesJSON(restaurant_id):
+    # An API endpoint for JSON GET requests per restaurant, by course.
+    '''
+    For the URL:
+
+        /restaurant/<int:restaurant_id>/menu/courses/JSON
+
+    return a JSON formatted structure containing that specific restaurant's
+    menu grouped by course, in menu order, along with each course's count of
+    items and lowest, highest and average price in cents. The statistics
+    are computed by the database in the same query that reads the menu.
+    Args:
+        int restaurant_id
+    '''
+    # Call SQLalchemy to load the restaurant and its courses in one query.
+    restaurant, courses = loadCourseMenu(session, restaurant_id)
+
+    for course in courses:
+        course['items'] = [i.serialize for i in course['items']]
+    return jsonify(Restaurant=restaurant.serialize, Courses=courses)
+
+
+@app.route('/restaurant/<int:restaurant_id>/menu/bulk/JSON')
+@queryBudget(3)
+@versioned
+def exportMenuJSON(restaurant_id):
+    # An API endpoint for JSON GET requests exporting a whole menu.
+    '''
+    For the URL:
+
+        /restaurant/<int:restaurant_id>/menu/bulk/JSON
+
+    return a JSON formatted structure containing the name, description,
+    price and course of every item on that specific restaurant's menu, in
+    the form accepted by a POST to the same URL, so that a menu can be
+    copied from one restaurant to another.
+    Args:
+        int restaurant_id
+    '''
+    if session.query(Restaurant.id).filter_by(id = restaurant_id).scalar() \
+            is None:
+        abort(404)
+
+    return jsonify(MenuItems=exportMenu(session, restaurant_id))
+
+
+@app.route('/restaurant/<int:restaurant_id>/menu/bulk/JSON', methods=['POST'])
+@queryBudget(5)
+def importMenuJSON(restaurant_id):
+    # An API endpoint for JSON POST requests importing a whole menu.
+    '''
+    Handles POSTs to the URL:
+
+        /restaurant/<int:restaurant_id>/menu/bulk/JSON
+
+    with a JSON body of the form:
+
+        {"MenuItems": [{"name": ..., "description": ..., "price": ...,
+            "course": ...}, ...], "replace": false}
+
+    and adds every item to that specific restaurant's menu in one
+    transaction, with one bulk INSERT, replacing the existing menu if
+    replace is true. Either every item is written or none is: a body with
+    any invalid item is answered with a 400 and a JSON list of the errors.
+    Answers 201 with the number of items imported and deleted.
+    Args:
+        int restaurant_id
+    '''
+    if session.query(Restaurant.id).filter_by(id = restaurant_id).scalar() \
+            is None:
+        abort(404)
+
+    body = request.get_json(force = True, silent = True)
+    if not isinstance(body, dict):
+        return jsonify(errors=['The body must be a JSON object.']), 400
+    rows, errors = validateMenu(body.get('MenuItems'))
+    if errors:
+        return jsonify(errors=errors), 400
+
+    # Write the items and invalidate the ETags of this restaurant's menu...
+    deleted = importMenu(session, restaurant_id, rows,
+        replace = bool(body.get('replace')))
+    # ... in a single transaction.
+    session.commit()
+    # Drop the cached copy of this restaurant's menu page.
+    pageCache.invalidate('showMenu', restaurant_id)
+
+    return jsonify(imported=len(rows), deleted=deleted), 201
 
 
 @app.route('/restaurant/<int:restaurant_id>/menu/<int:menu_id>/JSON')
+@queryBudget(2)
+@versioned
 def menuItemJSON(restaurant_id, menu_id):
     # An API endpoint for JSON GET requests per menu item.
     '''
@@ -98,13 +471,49 @@ def menuItemJSON(restaurant_id, menu_id):
         int restaurant_id
         int menu_id
     '''
-    # Call SQLalchemy to query the MenuItem table by the menu_id arg.
-    theMenuItem = session.query(MenuItem).filter_by(id = menu_id).all()
+    # Call SQLalchemy to query the MenuItem table by the menu_id arg. Match
+    # the restaurant_id arg too, since it determines the ETag.
+    theMenuItem = session.query(MenuItem).filter_by(id = menu_id,
+        restaurant_id = restaurant_id).all()
 
     return jsonify(MenuItem=[i.serialize for i in theMenuItem])
 
 
+@app.route('/search/JSON')
+@queryBudget(1)
+def searchJSON():
+    # An API endpoint for JSON GET requests searching every menu.
+    '''
+    For the URL:
+
+        /search/JSON?q=<words>
+
+    return a JSON formatted structure containing one page of the menu items
+    of all restaurants whose name, description or restaurant name contain
+    every word searched for, best match first, each with its restaurant_id
+    and restaurant_name. The page size is set with ?limit=<n> and the page
+    with ?page=<n>, counting from 1; next_page is null on the last page.
+    Answers 400 to a search without words, and 501 if the database has no
+    search index.
+    '''
+    if not searchAvailable:
+        abort(501)
+
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    page = request.args.get('page', 1, type=int)
+    try:
+        items, more = searchMenuItems(session, request.args.get('q', ''),
+            limit=limit, page=page)
+    except ValueError:
+        abort(400)
+
+    return jsonify(MenuItems=items, page=max(1, page),
+        next_page=max(1, page) + 1 if more else None)
+
+
 @app.route('/restaurant/<int:restaurant_id>/')
+@queryBudget(2)
+@cached
 def showMenu(restaurant_id):
     # Display a specific restaurant's menu populating an HTML template.
     # Or return nomenu.html if the menu is empty.
@@ -114,22 +523,22 @@ def showMenu(restaurant_id):
         /restaurant/<int:restaurant_id>/
 
     return an HTML template populated with the menu for that specific
-    restaurant. Or return nomenu.html if the menu is empty.
+    restaurant, grouped by course. Or return nomenu.html if the menu is
+    empty.
     Args:
         int restaurant_id
     '''
-    # Call SQLalchemy to query the Restaurant table by the restaurant_id arg.
-    restaurant = session.query(Restaurant).filter_by(id=restaurant_id).one()
-
-    # Call SQLalchemy to query for that restaurant's menu items.
-    items = session.query(MenuItem).filter_by(restaurant_id=restaurant.id)
+    # Call SQLalchemy to load the restaurant and its menu items, grouped by
+    # course, in one query.
+    restaurant, courses = loadCourseMenu(session, restaurant_id)
 
     # If this restaurant's menu is not empty
-    if (len(items.all()) > 0):
+    if courses:
         # Return a template (located in a dir called templates) and pass the
-        # queries so that the escape code in the template has access to the
-        # variables that will populate the template.
-        return render_template('menu.html', restaurant=restaurant, items=items)
+        # courses already loaded so that the escape code in the template
+        # has access to the variables that will populate the template.
+        return render_template('menu.html', restaurant=restaurant,
+            courses=courses)
     else:
         # Return our "there is no menu" page.
         return render_template('nomenu.html', restaurant=restaurant)
@@ -138,6 +547,7 @@ def showMenu(restaurant_id):
 # Create a decorator from Flask.app.route() to bind newMenuItem with the URL
 # /restaurant/<restaurant_id>/new/, allow GET or POST methods.
 @app.route('/restaurant/<int:restaurant_id>/new/', methods=['GET','POST'])
+@queryBudget(3)
 def newMenuItem(restaurant_id):
     # Handle creation of new menu items in the database.
     # Answer POSTs by writing user input to the database.
@@ -162,8 +572,12 @@ def newMenuItem(restaurant_id):
             restaurant_id)
         # Call SQLalchemy to stage the data to be written...
         session.add(newItem)
+        # Invalidate the ETags of this restaurant's menu.
+        bumpVersions(session, restaurant_id)
         # ... and now write the data to the DB.
         session.commit()
+        # Drop the cached copy of this restaurant's menu page.
+        pageCache.invalidate('showMenu', restaurant_id)
         # Alert the user.
         flash("New menu item created.")
         # Redirect the client to the menu page for this restaurant.
@@ -180,6 +594,7 @@ def newMenuItem(restaurant_id):
 # /restaurant/<restaurant_id>/<menu_id>/edit/, , allow GET or POST methods.
 @app.route('/restaurant/<int:restaurant_id>/<int:menu_id>/edit/', methods=[
     'GET','POST'])
+@queryBudget(4)
 def editMenuItem(restaurant_id, menu_id):
     # Handle updates to existing menu items in the database.
     # Answer POSTs by writing user input to the database.
@@ -214,8 +629,15 @@ def editMenuItem(restaurant_id, menu_id):
 
         # Stage for writing to the DB.
         session.add(editedItem)
+        # Invalidate the ETags of the item's restaurant's menu. Keep its id,
+        # since reading it from editedItem after the commit would reload
+        # the whole row.
+        itemRestaurantId = editedItem.restaurant_id
+        bumpVersions(session, itemRestaurantId)
         # Write to the DB.
         session.commit()
+        # Drop the cached copy of the item's restaurant's menu page.
+        pageCache.invalidate('showMenu', itemRestaurantId)
         # Alert the user.
         flash("Menu item edited.")
         # Redirect the client to the menu page for this restaurant, building
@@ -229,6 +651,7 @@ def editMenuItem(restaurant_id, menu_id):
 
 @app.route('/restaurant/<int:restaurant_id>/<int:menu_id>/delete', methods=[
     'GET','POST'])
+@queryBudget(4)
 def deleteMenuItem(restaurant_id, menu_id):
     # Handle deletions of existing menu items in the database.
     # Answer POSTs by deleting the row in the MenuItem table of the database
@@ -253,8 +676,12 @@ def deleteMenuItem(restaurant_id, menu_id):
     if request.method == 'POST':
         # Stage for persisting to the DB.
         session.delete(deletedItem)
+        # Invalidate the ETags of the item's restaurant's menu.
+        bumpVersions(session, deletedItem.restaurant_id)
         # Delete the record from the DB.
         session.commit()
+        # Drop the cached copy of the item's restaurant's menu page.
+        pageCache.invalidate('showMenu', deletedItem.restaurant_id)
         # Alert the user.
         flash("Menu item deleted.")
         # Redirect the client to the menu page for this restaurant, building
@@ -269,20 +696,27 @@ def deleteMenuItem(restaurant_id, menu_id):
 
 @app.route('/restaurant/')
 @app.route('/')
+@queryBudget(2)
+@cached
 def showRestaurants():
     """
-    Query the Restaurant table and return an object containing the restaurant
-    names sorted alphabetically.
+    Query the Restaurant table and return an object containing one page of
+    restaurant names sorted alphabetically, with links to the next and
+    previous pages. Accepts the same limit, after and before query string
+    parameters as allRestaurantsJSON().
     """
-    # Create an object containing a list of all rows in the Restaurant table,
-    # and sort by name.
-    restaurant_names = session.query(Restaurant).order_by(Restaurant.name).all()
+    # Create an object containing one page of rows in the Restaurant table,
+    # sorted by name.
+    restaurant_names, nextCursor, prevCursor = restaurantPageFromRequest()
 
-    return render_template('restaurants.html', restaurant_names = restaurant_names)
+    return render_template('restaurants.html',
+        restaurant_names = restaurant_names, next_cursor = nextCursor,
+        prev_cursor = prevCursor, limit = request.args.get('limit'))
 
 # Create a decorator from Flask.app.route() to bind newRestaurant with the URL
 # /restaurant/new/, allow GET or POST methods.
 @app.route('/restaurant/new/', methods=['GET','POST'])
+@queryBudget(5)
 def newRestaurant():
     # Handle creation of new restaurants in the database.
     # Answer POSTs by writing user input to the database.
@@ -305,8 +739,14 @@ def newRestaurant():
         newRestaurant = Restaurant(name = request.form['name'])
         # Call SQLalchemy to stage the data to be written...
         session.add(newRestaurant)
+        # Assign the new restaurant its id, then invalidate its ETags and
+        # those of the list of restaurants.
+        session.flush()
+        bumpVersions(session, newRestaurant.id, GLOBAL_VERSION)
         # ... and now write the data to the DB.
         session.commit()
+        # Drop the cached pages listing the restaurants.
+        pageCache.invalidate('showRestaurants')
         # Alert the user.
         flash("New restaurant created.")
         # Redirect the client to the menu page for this restaurant.
@@ -319,6 +759,7 @@ def newRestaurant():
 # Create a decorator from Flask.app.route() to bind editRestaurant with the URL
 # /restaurant/<restaurant_id>/edit/, , allow GET or POST methods.
 @app.route('/restaurant/<int:restaurant_id>/edit/', methods=['GET','POST'])
+@queryBudget(6)
 def editRestaurant(restaurant_id):
     # Handle updates to existing restaurants in the database.
     # Answer POSTs by writing user input to the database.
@@ -351,8 +792,13 @@ def editRestaurant(restaurant_id):
             editedRestaurant.name = request.form['name']
         # Stage for writing to the DB.
         session.add(editedRestaurant)
+        # Invalidate the ETags of this restaurant and the list of restaurants.
+        bumpVersions(session, restaurant_id, GLOBAL_VERSION)
         # Write to the DB.
         session.commit()
+        # Drop the cached pages showing the restaurant's name.
+        pageCache.invalidate('showRestaurants')
+        pageCache.invalidate('showMenu', restaurant_id)
         # Alert the user.
         flash("Restaurant name edited.")
         # Redirect the client to the page showing all restaurants.
@@ -365,6 +811,7 @@ def editRestaurant(restaurant_id):
 
 
 @app.route('/restaurant/<int:restaurant_id>/delete/', methods=['GET','POST'])
+@queryBudget(6)
 def deleteRestaurant(restaurant_id):
     # Handle deletions of existing restaurants in the database.
     # Answer POSTs by deleting the row in the Restaurant table of the database
@@ -388,8 +835,13 @@ def deleteRestaurant(restaurant_id):
     if request.method == 'POST':
         # Stage for persisting to the DB.
         session.delete(deletedRestaurant)
+        # Invalidate the ETags of this restaurant and the list of restaurants.
+        bumpVersions(session, restaurant_id, GLOBAL_VERSION)
         # Delete the record from the DB.
         session.commit()
+        # Drop the cached pages showing the restaurant.
+        pageCache.invalidate('showRestaurants')
+        pageCache.invalidate('showMenu', restaurant_id)
         # Alert the user.
         flash("Restaurant deleted.")
         # Redirect the client to the restaurants.html page listing all
@@ -402,6 +854,55 @@ def deleteRestaurant(restaurant_id):
             restaurant_id, i = deletedRestaurant)
 
 
+@app.route('/cache/JSON')
+def pageCacheJSON():
+    # An API endpoint for JSON GET requests for the page cache's counters.
+    '''
+    For the URL:
+
+        /cache/JSON
+
+    return a JSON formatted structure containing the hit, miss and eviction
+    counters and the current size of the rendered page cache.
+    '''
+    return jsonify(PageCache=pageCache.stats())
+
+
+@app.route('/static/build/<filename>')
+def staticBundle(filename):
+    # Serve a CSS or JavaScript bundle built by assets.py.
+    '''
+    For the URL:
+
+        /static/build/<filename>
+
+    return a bundle built by assets.py, from its copy in the best encoding
+    the client accepts. A bundle's file name changes with its content, so
+    it is sent with a Cache-Control letting clients keep it for a year
+    without checking for changes.
+
+    Args:
+        str filename
+    '''
+    return assets.send(filename, request.accept_encodings)
+
+
+@app.route('/metrics')
+def metricsText():
+    # An endpoint for Prometheus to scrape request and SQL metrics from.
+    '''
+    For the URL:
+
+        /metrics
+
+    return the latency, response size and SQL statement histograms of every
+    endpoint, recorded by this process, in the Prometheus text exposition
+    format. Only reads counters kept in memory.
+    '''
+    return Response(metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.route('/README.txt')
 def showAboutPage():
     # Display the local README.txt file as an about page.
@@ -431,13 +932,15 @@ def showAboutPage():
 # If this file is called directly, i.e., not called as an import, run the code
 # through the Python interpreter.
 if __name__ == '__main__':
-    # Flask will use this key to create sessions for our users.
-    app.secret_key = 'tB.IWZ3baukJ_'
 
     # With debug running, the Flask web server will reload itself each time
     # it notices a code change. It also provides a debugger in the browser.
     app.debug = True
 
-    # Run the local web server with our application.
+    # Run the local web server with our application, answering each request
+    # in a thread of its own. For more than one process, run the app under a
+    # WSGI server instead, e.g., gunicorn --workers 4 finalproject:app; each
+    # worker then has its own pageCache, kept coherent with the others' by
+    # checking every cached page against the catalog version.
     # Listen on all public IPs - required because we're running vagrant.
-    app.run(host='0.0.0.0', port=5000)
+    app.run(host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,202 @@
+# Generate a synthetic catalog of restaurants and menus at any scale, for
+# benchmarks and load tests.
+#
+# The same --seed always produces the same catalog. For example, to build a
+# catalog of 100,000 restaurants in its own database file:
+#
+#   python generatecatalog.py --restaurants 100000 --seed 1 \
+#       --database sqlite:///catalog-100k.db
+#
+# and to run the web application against it:
+#
+#   CATALOG_DATABASE_URL=sqlite:///catalog-100k.db python finalproject.py
+
+import argparse
+import random
+
+from database_setup import Base, DATABASE_URL, upgradeDatabase, \
+    createEngine
+from lotsofmenus import timedLoad, DEFAULT_BATCH_SIZE
+
+
+# The share of menu items in each course, by weight.
+COURSES = [('Entree', 40), ('Appetizer', 25), ('Beverage', 20),
+    ('Dessert', 15)]
+
+# The range of prices, in cents, of the items of each course.
+PRICE_RANGES = {
+    'Appetizer': (299, 1599),
+    'Entree': (599, 4599),
+    'Beverage': (99, 899),
+    'Dessert': (299, 1299),
+}
+
+# Words used to make up restaurant names, dish names and descriptions.
+RESTAURANT_ADJECTIVES = ['Golden', 'Urban', 'Rustic', 'Little', 'Blue',
+    'Spicy', 'Happy', 'Old Town', 'Green', 'Royal', 'Lucky', 'Super',
+    'Sunny', 'Hidden', 'Twin', 'Silver', 'Crimson', 'Wild']
+RESTAURANT_NOUNS = ['Dragon', 'Garden', 'Bistro', 'Kitchen', 'Table',
+    'Spoon', 'Harbor', 'Oven', 'Grill', 'Lantern', 'Orchard', 'Pepper',
+    'Wok', 'Barrel', 'Olive', 'Fork', 'Anchor', 'Noodle']
+RESTAURANT_KINDS = ['Cafe', 'Diner', 'Grill', 'Cantina', 'Trattoria',
+    'Brasserie', 'Noodle House', 'Taqueria', 'Steakhouse', 'Provisions', '']
+DISH_ADJECTIVES = ['Grilled', 'Crispy', 'Spicy', 'Roasted', 'Smoked',
+    'Braised', 'Fresh', 'Steamed', 'Pan Seared', 'Classic', 'House',
+    'Sweet', 'Tangy', 'Stuffed', 'Glazed']
+DISH_NOUNS = {
+    'Appetizer': ['Wings', 'Calamari', 'Dumplings', 'Spring Rolls',
+        'Bruschetta', 'Nachos', 'Sliders', 'Soup', 'Salad', 'Fries'],
+    'Entree': ['Burger', 'Chicken', 'Salmon', 'Steak', 'Tacos', 'Pasta',
+        'Stir Fry', 'Curry', 'Pork Chop', 'Noodle Soup', 'Risotto', 'Tofu'],
+    'Beverage': ['Lemonade', 'Iced Tea', 'Root Beer', 'Smoothie', 'Latte',
+        'Milkshake', 'Sparkling Water', 'Horchata'],
+    'Dessert': ['Cake', 'Pie', 'Ice Cream', 'Cheesecake', 'Brownie',
+        'Sorbet', 'Flan', 'Tiramisu'],
+}
+DESCRIPTION_WORDS = ['with', 'and', 'served', 'over', 'fresh', 'house made',
+    'garlic', 'lemon', 'butter', 'sauce', 'rice', 'noodles', 'greens',
+    'tomato', 'basil', 'cheese', 'chili', 'ginger', 'honey', 'crispy',
+    'slow cooked', 'local', 'seasonal', 'vegetables', 'herbs', 'spices',
+    'toasted', 'sesame', 'cream', 'chocolate', 'on the side', 'topped']
+
+
+def weightedChoice(rng, choices):
+    '''
+    Return one value from a list of (value, weight) tuples, chosen with
+    probability proportional to its weight.
+
+    Args:
+        Random rng
+        list choices
+    '''
+    total = sum(weight for value, weight in choices)
+    pick = rng.uniform(0, total)
+    for value, weight in choices:
+        pick -= weight
+        if pick <= 0:
+            return value
+    return choices[-1][0]
+
+
+def menuSize(rng, median):
+    '''
+    Return the number of items on one menu. Menu sizes follow a log-normal
+    distribution around median, so most menus are modest and a few are very
+    long, and about 3% of restaurants have no menu at all.
+
+    Args:
+        Random rng
+        int median
+    '''
+    if rng.random() < 0.03:
+        return 0
+    return max(1, min(400, int(rng.lognormvariate(0, 0.8) * median)))
+
+
+def formatPrice(rng, cents):
+    '''
+    Return a price string in one of the formats found in the sample menus,
+    e.g., "$7.50", "$25", "15" or "$.99".
+
+    Args:
+        Random rng
+        int cents
+    '''
+    dollars, cents = divmod(cents, 100)
+    if rng.random() < 0.1:
+        # Whole dollars, with or without the dollar sign.
+        return ('$%d' if rng.random() < 0.5 else '%d') % max(dollars, 1)
+    if dollars == 0:
+        return '$.%02d' % cents
+    return '$%d.%02d' % (dollars, cents)
+
+
+def makeDescription(rng):
+    '''
+    Return a description of a dish, mostly a dozen or so words long but with
+    a long tail, never longer than the 250 characters of the column. About
+    5% of dishes have no description.
+
+    Args:
+        Random rng
+    '''
+    if rng.random() < 0.05:
+        return None
+    words = max(2, int(rng.lognormvariate(0, 0.6) * 12))
+    description = ' '.join(rng.choice(DESCRIPTION_WORDS)
+        for i in range(words))
+    return description[:250].capitalize()
+
+
+def makeMenuItem(rng):
+    '''
+    Return a dictionary of the columns of one made up menu item.
+
+    Args:
+        Random rng
+    '''
+    course = weightedChoice(rng, COURSES)
+    low, high = PRICE_RANGES[course]
+    # Round prices to the nearest 25 cents, less one cent, as menus do.
+    cents = max(99, rng.randint(low, high) // 25 * 25 - 1)
+    return {
+        'name': '%s %s' % (rng.choice(DISH_ADJECTIVES),
+            rng.choice(DISH_NOUNS[course])),
+        'description': makeDescription(rng),
+        'price': formatPrice(rng, cents),
+        'course': course,
+    }
+
+
+def makeRestaurantName(rng):
+    # Return a made up restaurant name, e.g., "Golden Lantern Noodle House".
+    name = '%s %s %s' % (rng.choice(RESTAURANT_ADJECTIVES),
+        rng.choice(RESTAURANT_NOUNS), rng.choice(RESTAURANT_KINDS))
+    return name.strip()
+
+
+def generateCatalog(restaurants, seed=0, median_menu_size=20):
+    '''
+    Generate (restaurant name, list of menu item dictionaries) tuples for the
+    given number of restaurants, in the form taken by lotsofmenus.bulkLoad().
+    The same seed always generates the same catalog.
+
+    Args:
+        int restaurants
+        int seed
+        int median_menu_size
+    '''
+    rng = random.Random(seed)
+    for i in xrange(restaurants):
+        menu = [makeMenuItem(rng)
+            for j in range(menuSize(rng, median_menu_size))]
+        yield makeRestaurantName(rng), menu
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description = 'Generate a synthetic catalog of restaurant menus.')
+    parser.add_argument('--restaurants', type = int, default = 10000,
+        help = 'number of restaurants to generate (default %(default)s)')
+    parser.add_argument('--seed', type = int, default = 0,
+        help = 'random seed; the same seed gives the same catalog')
+    parser.add_argument('--median-menu-size', type = int, default = 20,
+        help = 'median number of items per menu (default %(default)s)')
+    parser.add_argument('--batch-size', type = int,
+        default = DEFAULT_BATCH_SIZE,
+        help = 'rows written per transaction (default %(default)s)')
+    parser.add_argument('--database', default = DATABASE_URL,
+        help = 'database URL to write to (default %(default)s)')
+    args = parser.parse_args()
+
+    engine = createEngine(args.database)
+    # Create the tables and indexes if this is a new database.
+    Base.metadata.create_all(engine)
+    upgradeDatabase(engine)
+
+    timedLoad(engine, generateCatalog(args.restaurants, args.seed,
+        args.median_menu_size), args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,536 @@
+# Serve the read-only JSON API of finalproject.py from one event loop.
+#
+# The JSON endpoints spend most of their time waiting: on the database, and
+# on slow clients holding keep-alive connections open between requests. This
+# server answers the same URLs with the same payloads as
+# allRestaurantsJSON(), restaurantMenuJSON() and menuItemJSON():
+#
+#   /restaurant/JSON
+#   /restaurant/<id>/menu/JSON
+#   /restaurant/<id>/menu/<menu id>/JSON
+#
+# All connections are read, parsed and written by one thread running an
+# asyncore event loop, which costs a few kilobytes per idle connection
+# rather than a thread. Only the database work is handed to a small, bounded
+# pool of worker threads, each with its own session on a read-only engine,
+# and the results are passed back to the event loop through a pipe. When the
+# pool's queue is full, requests are answered at once with a 503 rather than
+# left to pile up. To run it next to finalproject.py:
+#
+#   python jsonserver.py --port 8081 --workers 5 --queue 100
+
+import argparse
+import asynchat
+import asyncore
+import errno
+import json
+import os
+import Queue
+import socket
+import threading
+import time
+import traceback
+import urllib
+from BaseHTTPServer import BaseHTTPRequestHandler
+from email.utils import formatdate
+
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.orm.exc import NoResultFound
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_etags
+from werkzeug.routing import Map, Rule
+from werkzeug.urls import url_decode
+
+from database_setup import MenuItem, createEngine, POOL_SIZE
+from queries import restaurantPage, loadRestaurantMenu, catalogVersion, \
+    versionETag, parsePriceRange, DEFAULT_PAGE_SIZE, GLOBAL_VERSION, \
+    MENU_SORTS
+
+
+# The seconds a keep-alive connection may sit idle between requests before
+# it is closed.
+IDLE_TIMEOUT = 60
+
+# The seconds between looks for idle connections, each of which goes over
+# every open connection.
+SWEEP_INTERVAL = 1.0
+
+# The longest request line and headers accepted, in bytes.
+MAX_HEADER_SIZE = 65536
+
+# The longest request body read and thrown away, in bytes. A request with a
+# longer one is answered with a 413 and its connection closed.
+MAX_BODY_SIZE = 65536
+
+# The requests waiting for a worker thread before new ones get a 503.
+DEFAULT_QUEUE_SIZE = 100
+
+# The most connections accepted each time the listening socket is ready.
+ACCEPT_BATCH_SIZE = 64
+
+
+class HTTPError(Exception):
+    # Raised by the views to answer with an error status and no payload.
+    def __init__(self, code):
+        Exception.__init__(self, code)
+        self.code = code
+
+
+def allRestaurantsJSON(session, args):
+    '''
+    For the URL:
+
+        /restaurant/JSON
+
+    return the payload of finalproject.allRestaurantsJSON(): one page of
+    restaurants, sorted by name, with the cursors of the next and previous
+    pages.
+
+    Args:
+        session session
+        MultiDict args
+    '''
+    limit = args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    try:
+        listOfRestaurants, nextCursor, prevCursor = restaurantPage(session,
+            limit=limit, after=args.get('after'), before=args.get('before'))
+    except ValueError:
+        raise HTTPError(400)
+    return {'MenuItem': [i.serialize for i in listOfRestaurants],
+        'next': nextCursor, 'prev': prevCursor}
+
+
+def restaurantMenuJSON(session, args, restaurant_id):
+    '''
+    For the URL:
+
+        /restaurant/<int:restaurant_id>/menu/JSON
+
+    return the payload of finalproject.restaurantMenuJSON(): the restaurant's
+    menu, filtered and sorted by the min_price, max_price and sort query
+    string parameters. ?stream=1 is accepted but makes no difference, since
+    the event loop never waits on the client while the menu is read.
+
+    Args:
+        session session
+        MultiDict args
+        int restaurant_id
+    '''
+    sort = args.get('sort', 'id')
+    if sort not in MENU_SORTS:
+        raise HTTPError(400)
+    try:
+        min_cents, max_cents = parsePriceRange(args.get('min_price'),
+            args.get('max_price'))
+    except ValueError:
+        raise HTTPError(400)
+    try:
+        restaurant = loadRestaurantMenu(session, restaurant_id,
+            min_cents = min_cents, max_cents = max_cents, sort = sort)
+    except NoResultFound:
+        raise HTTPError(404)
+    return {'MenuItems': [i.serialize for i in restaurant.menu_items]}
+
+
+def menuItemJSON(session, args, restaurant_id, menu_id):
+    '''
+    For the URL:
+
+        /restaurant/<int:restaurant_id>/menu/<int:menu_id>/JSON
+
+    return the payload of finalproject.menuItemJSON(): a list holding the
+    menu item, or nothing if the restaurant has no such item.
+
+    Args:
+        session session
+        MultiDict args
+        int restaurant_id
+        int menu_id
+    '''
+    theMenuItem = session.query(MenuItem).filter_by(id = menu_id,
+        restaurant_id = restaurant_id).all()
+    return {'MenuItem': [i.serialize for i in theMenuItem]}
+
+
+# The URLs answered, routed as Flask routes them in finalproject.py.
+URLS = Map([
+    Rule('/restaurant/JSON', endpoint = allRestaurantsJSON),
+    Rule('/restaurant/<int:restaurant_id>/menu/JSON',
+        endpoint = restaurantMenuJSON),
+    Rule('/restaurant/<int:restaurant_id>/menu/<int:menu_id>/JSON',
+        endpoint = menuItemJSON),
+]).bind('localhost')
+
+
+def answer(sessions, path, queryString, ifNoneMatch):
+    '''
+    Answer a GET of path in a worker thread, and return the (status code,
+    list of extra headers, JSON body) of the response. Like the @versioned
+    views of finalproject.py, responses carry an ETag made from the
+    CatalogVersion of the restaurant in the URL and the query string, and a
+    request whose If-None-Match header holds it is answered with a 304
+    without reading the menu.
+
+    Args:
+        scoped_session sessions
+        str path
+        str queryString
+        str ifNoneMatch
+    '''
+    try:
+        view, arguments = URLS.match(urllib.unquote(path))
+    except HTTPException as e:
+        return e.code, [], ''
+
+    session = sessions()
+    try:
+        restaurant_id = arguments.get('restaurant_id', GLOBAL_VERSION)
+        args = url_decode(queryString)
+        etag = versionETag(restaurant_id,
+            catalogVersion(session, restaurant_id), args)
+        headers = [('ETag', '"%s"' % etag)]
+        if parse_etags(ifNoneMatch).contains_weak(etag):
+            return 304, headers, ''
+        try:
+            payload = view(session, args, **arguments)
+        except HTTPError as e:
+            return e.code, [], ''
+        return 200, headers, json.dumps(payload, sort_keys = True)
+    finally:
+        sessions.remove()
+
+
+class Trigger(asyncore.file_dispatcher):
+    '''
+    The read end of a pipe watched by the event loop, through which other
+    threads ask for a function to be called by the event loop's thread, the
+    only thread that may touch the connections.
+    '''
+
+    def __init__(self, map):
+        readFd, self.writeFd = os.pipe()
+        # file_dispatcher watches a copy of readFd.
+        asyncore.file_dispatcher.__init__(self, readFd, map)
+        os.close(readFd)
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def call(self, function, *args):
+        # Called by any thread: run function(*args) in the event loop soon.
+        with self.lock:
+            self.calls.append((function, args))
+        os.write(self.writeFd, 'x')
+
+    def handle_read(self):
+        self.recv(8192)
+        with self.lock:
+            calls, self.calls = self.calls, []
+        for function, args in calls:
+            function(*args)
+
+    def close(self):
+        asyncore.file_dispatcher.close(self)
+        os.close(self.writeFd)
+
+
+class BoundedExecutor(object):
+    '''
+    A fixed number of worker threads running functions taken from a queue
+    of at most queueSize waiting calls, passing each result to a callback
+    run by the event loop through trigger.
+    '''
+
+    def __init__(self, trigger, workers=POOL_SIZE,
+            queueSize=DEFAULT_QUEUE_SIZE):
+        self.trigger = trigger
+        self.calls = Queue.Queue(queueSize)
+        self.workers = []
+        for i in range(workers):
+            worker = threading.Thread(target = self.work)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, callback, function, *args):
+        # Queue function(*args), and return False if the queue is full.
+        try:
+            self.calls.put_nowait((callback, function, args))
+        except Queue.Full:
+            return False
+        return True
+
+    def work(self):
+        # Run queued calls until shutdown() queues a None.
+        while True:
+            call = self.calls.get()
+            if call is None:
+                return
+            callback, function, args = call
+            try:
+                result = function(*args)
+            except Exception:
+                traceback.print_exc()
+                result = 500, [], ''
+            self.trigger.call(callback, result)
+
+    def shutdown(self):
+        for worker in self.workers:
+            self.calls.put(None)
+
+
+class JSONConnection(asynchat.async_chat):
+    '''
+    One client connection, answering its requests one at a time, in order,
+    for as long as the client keeps it alive. While a request is with the
+    workers, nothing more is read from the client.
+    '''
+
+    def __init__(self, sock, server):
+        asynchat.async_chat.__init__(self, sock, server.map)
+        self.server = server
+        self.set_terminator('\r\n\r\n')
+        self.incoming = []
+        self.incomingSize = 0
+        # The parsed requests not yet answered, and whether the first of
+        # them is with the workers.
+        self.pending = []
+        self.busy = False
+        # The request whose body is being read and thrown away, if any.
+        self.reading = None
+        # Whether the connection closes once the last response is sent.
+        self.closing = False
+        self.lastActive = time.time()
+
+    def readable(self):
+        return not self.busy and not self.pending and not self.closing
+
+    def collect_incoming_data(self, data):
+        # Keep only request lines and headers: GETs have no use for a body.
+        if self.closing or self.reading is not None:
+            return
+        self.incoming.append(data)
+        self.incomingSize += len(data)
+        if self.incomingSize > MAX_HEADER_SIZE:
+            self.pending.append(None)
+            self.nextRequest()
+
+    def found_terminator(self):
+        if self.closing:
+            return
+        self.lastActive = time.time()
+        head = ''.join(self.incoming)
+        self.incoming = []
+        self.incomingSize = 0
+        if self.reading is not None:
+            # The end of a request body, which GETs have no use for.
+            request, self.reading = self.reading, None
+            self.set_terminator('\r\n\r\n')
+        else:
+            request = self.parseRequest(head)
+            length = request and request['headers'].get('content-length')
+            if length and length.isdigit() and int(length) > MAX_BODY_SIZE:
+                request['keepAlive'] = False
+                request['tooLarge'] = True
+            elif length and length.isdigit() and int(length) > 0:
+                self.reading = request
+                self.set_terminator(int(length))
+                return
+        self.pending.append(request)
+        if not self.busy:
+            self.nextRequest()
+
+    def parseRequest(self, head):
+        # Return a dictionary of the parts of a request, or None if the
+        # request is malformed.
+        lines = head.lstrip('\r\n').split('\r\n')
+        words = lines[0].split()
+        if len(words) != 3 or not words[2].startswith('HTTP/'):
+            return None
+        headers = {}
+        for line in lines[1:]:
+            name, colon, value = line.partition(':')
+            if not colon:
+                return None
+            headers[name.strip().lower()] = value.strip()
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            return None
+        method, target, version = words
+        path, question, queryString = target.partition('?')
+        connection = headers.get('connection', '').lower()
+        keepAlive = connection != 'close' if version == 'HTTP/1.1' else \
+            connection == 'keep-alive'
+        return {'method': method, 'path': path, 'query': queryString,
+            'version': version, 'keepAlive': keepAlive, 'headers': headers}
+
+    def nextRequest(self):
+        # Start answering the first pending request.
+        if not self.pending or self.busy:
+            return
+        request = self.pending[0]
+        if request is None:
+            self.respond(None, (400, [], ''))
+        elif request.get('tooLarge'):
+            self.respond(request, (413, [], ''))
+        elif request['method'] not in ('GET', 'HEAD'):
+            self.respond(request, (405, [('Allow', 'GET, HEAD')], ''))
+        else:
+            self.busy = True
+            if not self.server.executor.submit(
+                    lambda result: self.respond(request, result), answer,
+                    self.server.sessions, request['path'], request['query'],
+                    request['headers'].get('if-none-match')):
+                self.respond(request, (503, [('Retry-After', '1')], ''))
+
+    def respond(self, request, result):
+        # Called by the event loop: send the response to the first pending
+        # request, then start on the next one.
+        self.busy = False
+        self.lastActive = time.time()
+        if not self.connected:
+            return
+        self.pending.pop(0)
+        code, headers, body = result
+        keepAlive = request is not None and request['keepAlive']
+        version = request['version'] if request else 'HTTP/1.0'
+        lines = ['%s %d %s' % ('HTTP/1.1' if version == 'HTTP/1.1' else
+            'HTTP/1.0', code, BaseHTTPRequestHandler.responses[code][0]),
+            'Date: %s' % formatdate(usegmt = True)]
+        if code != 304:
+            lines.append('Content-Type: application/json')
+            lines.append('Content-Length: %d' % len(body))
+        if version == 'HTTP/1.0' and keepAlive:
+            lines.append('Connection: keep-alive')
+        elif not keepAlive:
+            lines.append('Connection: close')
+        lines.extend('%s: %s' % header for header in headers)
+        if request is None or request['method'] == 'HEAD':
+            body = ''
+        self.push('\r\n'.join(lines) + '\r\n\r\n' + body)
+
+        if keepAlive:
+            self.nextRequest()
+        else:
+            self.closing = True
+            self.pending = []
+            self.close_when_done()
+
+    def idle(self, now):
+        # Return True if the connection has waited too long for a request.
+        return not self.busy and not self.pending and \
+            now - self.lastActive > self.server.idleTimeout
+
+
+class JSONServer(asyncore.dispatcher):
+    '''
+    Accepts connections on address and answers their requests with an
+    event loop, see the top of this file, using workers threads that read
+    the database at url.
+    '''
+
+    def __init__(self, address, url=None, workers=POOL_SIZE,
+            queueSize=DEFAULT_QUEUE_SIZE, backlog=1024,
+            idleTimeout=IDLE_TIMEOUT):
+        self.map = {}
+        asyncore.dispatcher.__init__(self, map = self.map)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind(address)
+        self.listen(backlog)
+        self.idleTimeout = idleTimeout
+
+        # Every worker reads with its own session, through a read-only
+        # engine with a connection for each of them.
+        readEngine = createEngine(readOnly = True) if url is None else \
+            createEngine(url, readOnly = True)
+        self.sessions = scoped_session(sessionmaker(bind = readEngine))
+        self.executor = BoundedExecutor(Trigger(self.map), workers,
+            queueSize)
+
+    def handle_accept(self):
+        # Accept a burst of new clients at once, up to ACCEPT_BATCH_SIZE.
+        for i in range(ACCEPT_BATCH_SIZE):
+            try:
+                pair = self.accept()
+            except socket.error as e:
+                # Out of file descriptors: leave the client in the backlog.
+                if e.errno in (errno.EMFILE, errno.ENFILE):
+                    return
+                raise
+            if pair is None:
+                return
+            JSONConnection(pair[0], self)
+
+    def closeIdleConnections(self):
+        now = time.time()
+        for dispatcher in self.map.values():
+            if isinstance(dispatcher, JSONConnection) and \
+                    dispatcher.idle(now):
+                dispatcher.close()
+
+    def serve_forever(self):
+        # Run the event loop, closing idle connections every SWEEP_INTERVAL
+        # seconds, rather than after every event of a busy loop.
+        lastSwept = time.time()
+        while True:
+            asyncore.loop(timeout = SWEEP_INTERVAL, use_poll = True,
+                map = self.map, count = 1)
+            if time.time() - lastSwept >= SWEEP_INTERVAL:
+                self.closeIdleConnections()
+                lastSwept = time.time()
+
+    def server_close(self):
+        self.executor.shutdown()
+        asyncore.close_all(self.map)
+
+
+def raiseOpenFileLimit():
+    # Allow as many open connections as the system lets this process have.
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, resource.error):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description = 'Serve the JSON API from one event loop.')
+    parser.add_argument('--port', type = int, default = 8081,
+        help = 'port to listen on (default %(default)s)')
+    parser.add_argument('--workers', type = int, default = POOL_SIZE,
+        help = 'worker threads reading the database (default %(default)s)')
+    parser.add_argument('--queue', type = int, default = DEFAULT_QUEUE_SIZE,
+        help = 'requests waiting for a worker before new ones are '
+        'refused with a 503 (default %(default)s)')
+    parser.add_argument('--backlog', type = int, default = 1024,
+        help = 'connections waiting to be accepted (default %(default)s)')
+    parser.add_argument('--idle-timeout', type = int, default = IDLE_TIMEOUT,
+        help = 'seconds before an idle keep-alive connection is closed '
+        '(default %(default)s)')
+    args = parser.parse_args()
+
+    raiseOpenFileLimit()
+    server = JSONServer(('', args.port), workers = args.workers,
+        queueSize = args.queue, backlog = args.backlog,
+        idleTimeout = args.idle_timeout)
+    print "JSON server running on port %s" % args.port
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print " ^C entered, stopping JSON server...."
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,380 +1,360 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-
-from database_setup import Restaurant, Base, MenuItem
-
-engine = create_engine('sqlite:///restaurantmenu.db')
-# Bind the engine to the metadata of the Base class so that the
-# declaratives can be accessed through a DBSession instance
-Base.metadata.bind = engine
-
-DBSession = sessionmaker(bind=engine)
-# A DBSession() instance establishes all conversations with the database
-# and represents a "staging zone" for all the objects loaded into the
-# database session object. Any change made against the objects in the
-# session won't be persisted into the database until you call
-# session.commit(). If you're not happy about the changes, you can
-# revert all of them back to the last commit by calling
-# session.rollback()
-session = DBSession()
-
-
-# Menu for UrbanBurger
-restaurant1 = Restaurant(name="Urban Burger")
-
-session.add(restaurant1)
-session.commit()
-
-menuItem2 = MenuItem(name="Veggie Burger", description="Juicy grilled veggie patty with tomato mayo and lettuce",
-                     price="$7.50", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem2)
-session.commit()
-
-
-menuItem1 = MenuItem(name="French Fries", description="with garlic and parmesan",
-                     price="$2.99", course="Appetizer", restaurant=restaurant1)
-
-session.add(menuItem1)
-session.commit()
-
-menuItem2 = MenuItem(name="Chicken Burger", description="Juicy grilled chicken patty with tomato mayo and lettuce",
-                     price="$5.50", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem2)
-session.commit()
-
-menuItem3 = MenuItem(name="Chocolate Cake", description="fresh baked and served with ice cream",
-                     price="$3.99", course="Dessert", restaurant=restaurant1)
-
-session.add(menuItem3)
-session.commit()
-
-menuItem4 = MenuItem(name="Sirloin Burger", description="Made with grade A beef",
-                     price="$7.99", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem4)
-session.commit()
-
-menuItem5 = MenuItem(name="Root Beer", description="16oz of refreshing goodness",
-                     price="$1.99", course="Beverage", restaurant=restaurant1)
-
-session.add(menuItem5)
-session.commit()
-
-menuItem6 = MenuItem(name="Iced Tea", description="with Lemon",
-                     price="$.99", course="Beverage", restaurant=restaurant1)
-
-session.add(menuItem6)
-session.commit()
-
-menuItem7 = MenuItem(name="Grilled Cheese Sandwich", description="On texas toast with American Cheese",
-                     price="$3.49", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem7)
-session.commit()
-
-menuItem8 = MenuItem(name="Veggie Burger", description="Made with freshest of ingredients and home grown spices",
-                     price="$5.99", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem8)
-session.commit()
-
-
-# Menu for Super Stir Fry
-restaurant2 = Restaurant(name="Super Stir Fry")
-
-session.add(restaurant2)
-session.commit()
-
-
-menuItem1 = MenuItem(name="Chicken Stir Fry", description="With your choice of noodles vegetables and sauces",
-                     price="$7.99", course="Entree", restaurant=restaurant2)
-
-session.add(menuItem1)
-session.commit()
-
-menuItem2 = MenuItem(
-    name="Peking Duck", description=" A famous duck dish from Beijing[1] that has been prepared since the imperial era. The meat is prized for its thin, crisp skin, with authentic versions of the dish serving mostly the skin and little meat, sliced in front of the diners by the cook", price="$25", course="Entree", restaurant=restaurant2)
-
-session.add(menuItem2)
-session.commit()
-
-menuItem3 = MenuItem(name="Spicy Tuna Roll", description="Seared rare ahi, avocado, edamame, cucumber with wasabi soy sauce ",
-                     price="15", course="Entree", restaurant=restaurant2)
-
-session.add(menuItem3)
-session.commit()
-
-menuItem4 = MenuItem(name="Nepali Momo ", description="Steamed dumplings made with vegetables, spices and meat. ",
-                     price="12", course="Entree", restaurant=restaurant2)
-
-session.add(menuItem4)
-session.commit()
-
-menuItem5 = MenuItem(name="Beef Noodle Soup", description="A Chinese noodle soup made of stewed or red braised beef, beef broth, vegetables and Chinese noodles.",
-                     price="14", course="Entree", restaurant=restaurant2)
-
-session.add(menuItem5)
-session.commit()
-
-menuItem6 = MenuItem(name="Ramen", description="a Japanese noodle soup dish. It consists of Chinese-style wheat noodles served in a meat- or (occasionally) fish-based broth, often flavored with soy sauce or miso, and uses toppings such as sliced pork, dried seaweed, kamaboko, and green onions.",
-                     price="12", course="Entree", restaurant=restaurant2)
-
-session.add(menuItem6)
-session.commit()
-
-
-# Menu for Panda Garden
-restaurant1 = Restaurant(name="Panda Garden")
-
-session.add(restaurant1)
-session.commit()
-
-
-menuItem1 = MenuItem(name="Pho", description="a Vietnamese noodle soup consisting of broth, linguine-shaped rice noodles called banh pho, a few herbs, and meat.",
-                     price="$8.99", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem1)
-session.commit()
-
-menuItem2 = MenuItem(name="Chinese Dumplings", description="a common Chinese dumpling which generally consists of minced meat and finely chopped vegetables wrapped into a piece of dough skin. The skin can be either thin and elastic or thicker.",
-                     price="$6.99", course="Appetizer", restaurant=restaurant1)
-
-session.add(menuItem2)
-session.commit()
-
-menuItem3 = MenuItem(name="Gyoza", description="The most prominent differences between Japanese-style gyoza and Chinese-style jiaozi are the rich garlic flavor, which is less noticeable in the Chinese version, the light seasoning of Japanese gyoza with salt and soy sauce, and the fact that gyoza wrappers are much thinner",
-                     price="$9.95", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem3)
-session.commit()
-
-menuItem4 = MenuItem(name="Stinky Tofu", description="Taiwanese dish, deep fried fermented tofu served with pickled cabbage.",
-                     price="$6.99", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem4)
-session.commit()
-
-menuItem2 = MenuItem(name="Veggie Burger", description="Juicy grilled veggie patty with tomato mayo and lettuce",
-                     price="$9.50", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem2)
-session.commit()
-
-
-# Menu for Thyme for that
-restaurant1 = Restaurant(name="Thyme for That Vegetarian Cuisine ")
-
-session.add(restaurant1)
-session.commit()
-
-
-menuItem1 = MenuItem(name="Tres Leches Cake", description="Rich, luscious sponge cake soaked in sweet milk and topped with vanilla bean whipped cream and strawberries.",
-                     price="$2.99", course="Dessert", restaurant=restaurant1)
-
-session.add(menuItem1)
-session.commit()
-
-menuItem2 = MenuItem(name="Mushroom risotto", description="Portabello mushrooms in a creamy risotto",
-                     price="$5.99", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem2)
-session.commit()
-
-menuItem3 = MenuItem(name="Honey Boba Shaved Snow", description="Milk snow layered with honey boba, jasmine tea jelly, grass jelly, caramel, cream, and freshly made mochi",
-                     price="$4.50", course="Dessert", restaurant=restaurant1)
-
-session.add(menuItem3)
-session.commit()
-
-menuItem4 = MenuItem(name="Cauliflower Manchurian", description="Golden fried cauliflower florets in a midly spiced soya,garlic sauce cooked with fresh cilantro, celery, chilies,ginger & green onions",
-                     price="$6.95", course="Appetizer", restaurant=restaurant1)
-
-session.add(menuItem4)
-session.commit()
-
-menuItem5 = MenuItem(name="Aloo Gobi Burrito", description="Vegan goodness. Burrito filled with rice, garbanzo beans, curry sauce, potatoes (aloo), fried cauliflower (gobi) and chutney. Nom Nom",
-                     price="$7.95", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem5)
-session.commit()
-
-menuItem2 = MenuItem(name="Veggie Burger", description="Juicy grilled veggie patty with tomato mayo and lettuce",
-                     price="$6.80", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem2)
-session.commit()
-
-
-# Menu for Tony's Bistro
-restaurant1 = Restaurant(name="Tony\'s Bistro ")
-
-session.add(restaurant1)
-session.commit()
-
-
-menuItem1 = MenuItem(name="Shellfish Tower", description="Lobster, shrimp, sea snails, crawfish, stacked into a delicious tower",
-                     price="$13.95", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem1)
-session.commit()
-
-menuItem2 = MenuItem(name="Chicken and Rice", description="Chicken... and rice",
-                     price="$4.95", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem2)
-session.commit()
-
-menuItem3 = MenuItem(name="Mom's Spaghetti", description="Spaghetti with some incredible tomato sauce made by mom",
-                     price="$6.95", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem3)
-session.commit()
-
-menuItem4 = MenuItem(name="Choc Full O\' Mint (Smitten\'s Fresh Mint Chip ice cream)",
-                     description="Milk, cream, salt, ..., Liquid nitrogen magic", price="$3.95", course="Dessert", restaurant=restaurant1)
-
-session.add(menuItem4)
-session.commit()
-
-menuItem5 = MenuItem(name="Tonkatsu Ramen", description="Noodles in a delicious pork-based broth with a soft-boiled egg",
-                     price="$7.95", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem5)
-session.commit()
-
-
-# Menu for Andala's
-restaurant1 = Restaurant(name="Andala\'s")
-
-session.add(restaurant1)
-session.commit()
-
-
-menuItem1 = MenuItem(name="Lamb Curry", description="Slow cook that thang in a pool of tomatoes, onions and alllll those tasty Indian spices. Mmmm.",
-                     price="$9.95", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem1)
-session.commit()
-
-menuItem2 = MenuItem(name="Chicken Marsala", description="Chicken cooked in Marsala wine sauce with mushrooms",
-                     price="$7.95", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem2)
-session.commit()
-
-menuItem3 = MenuItem(name="Potstickers", description="Delicious chicken and veggies encapsulated in fried dough.",
-                     price="$6.50", course="Appetizer", restaurant=restaurant1)
-
-session.add(menuItem3)
-session.commit()
-
-menuItem4 = MenuItem(name="Nigiri Sampler", description="Maguro, Sake, Hamachi, Unagi, Uni, TORO!",
-                     price="$6.75", course="Appetizer", restaurant=restaurant1)
-
-session.add(menuItem4)
-session.commit()
-
-menuItem2 = MenuItem(name="Veggie Burger", description="Juicy grilled veggie patty with tomato mayo and lettuce",
-                     price="$7.00", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem2)
-session.commit()
-
-
-# Menu for Auntie Ann's
-restaurant1 = Restaurant(name="Auntie Ann\'s Diner' ")
-
-session.add(restaurant1)
-session.commit()
-
-menuItem9 = MenuItem(name="Chicken Fried Steak", description="Fresh battered sirloin steak fried and smothered with cream gravy",
-                     price="$8.99", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem9)
-session.commit()
-
-
-menuItem1 = MenuItem(name="Boysenberry Sorbet", description="An unsettlingly huge amount of ripe berries turned into frozen (and seedless) awesomeness",
-                     price="$2.99", course="Dessert", restaurant=restaurant1)
-
-session.add(menuItem1)
-session.commit()
-
-menuItem2 = MenuItem(name="Broiled salmon", description="Salmon fillet marinated with fresh herbs and broiled hot & fast",
-                     price="$10.95", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem2)
-session.commit()
-
-menuItem3 = MenuItem(name="Morels on toast (seasonal)", description="Wild morel mushrooms fried in butter, served on herbed toast slices",
-                     price="$7.50", course="Appetizer", restaurant=restaurant1)
-
-session.add(menuItem3)
-session.commit()
-
-menuItem4 = MenuItem(name="Tandoori Chicken", description="Chicken marinated in yoghurt and seasoned with a spicy mix(chilli, tamarind among others) and slow cooked in a cylindrical clay or metal oven which gets its heat from burning charcoal.",
-                     price="$8.95", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem4)
-session.commit()
-
-menuItem2 = MenuItem(name="Veggie Burger", description="Juicy grilled veggie patty with tomato mayo and lettuce",
-                     price="$9.50", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem2)
-session.commit()
-
-menuItem10 = MenuItem(name="Spinach Ice Cream", description="vanilla ice cream made with organic spinach leaves",
-                      price="$1.99", course="Dessert", restaurant=restaurant1)
-
-session.add(menuItem10)
-session.commit()
-
-
-# Menu for Cocina Y Amor
-restaurant1 = Restaurant(name="Cocina Y Amor ")
-
-session.add(restaurant1)
-session.commit()
-
-
-menuItem1 = MenuItem(name="Super Burrito Al Pastor", description="Marinated Pork, Rice, Beans, Avocado, Cilantro, Salsa, Tortilla",
-                     price="$5.95", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem1)
-session.commit()
-
-menuItem2 = MenuItem(name="Cachapa", description="Golden brown, corn-based Venezuelan pancake; usually stuffed with queso telita or queso de mano, and possibly lechon. ",
-                     price="$7.99", course="Entree", restaurant=restaurant1)
-
-session.add(menuItem2)
-session.commit()
-
-
-restaurant1 = Restaurant(name="State Bird Provisions")
-session.add(restaurant1)
-session.commit()
-
-menuItem1 = MenuItem(name="Chantrelle Toast", description="Crispy Toast with Sesame Seeds slathered with buttery chantrelle mushrooms",
-                     price="$5.95", course="Appetizer", restaurant=restaurant1)
-
-session.add(menuItem1)
-session.commit
-
-menuItem1 = MenuItem(name="Guanciale Chawanmushi", description="Japanese egg custard served hot with spicey Italian Pork Jowl (guanciale)",
-                     price="$6.95", course="Dessert", restaurant=restaurant1)
-
-session.add(menuItem1)
-session.commit()
-
-
-menuItem1 = MenuItem(name="Lemon Curd Ice Cream Sandwich", description="Lemon Curd Ice Cream Sandwich on a chocolate macaron with cardamom meringue and cashews",
-                     price="$4.25", course="Dessert", restaurant=restaurant1)
-
-session.add(menuItem1)
-session.commit()
-
-
-print "added menu items!"
+# Populate the database with restaurants and their menus.
+#
+# Rows are written with bulk INSERTs, many rows per executemany() call and
+# one transaction per batch, instead of one session.add() and commit() per
+# row. Run with --batch-size to change the number of rows per transaction:
+#
+#   python lotsofmenus.py --batch-size 5000
+
+import argparse
+import time
+
+from sqlalchemy import func, select, or_, bindparam
+
+from database_setup import Restaurant, Base, MenuItem, CatalogVersion, \
+    DATABASE_URL, parsePriceCents, createEngine
+from queries import GLOBAL_VERSION
+
+# The number of rows, restaurants plus menu items, written per transaction
+# when no --batch-size is given.
+DEFAULT_BATCH_SIZE = 1000
+
+
+CATALOG = [
+    # Menu for Urban Burger
+    ("Urban Burger", [
+        {'name': "Veggie Burger",
+         'description': "Juicy grilled veggie patty with tomato mayo and lettuce",
+         'price': "$7.50", 'course': "Entree"},
+        {'name': "French Fries",
+         'description': "with garlic and parmesan",
+         'price': "$2.99", 'course': "Appetizer"},
+        {'name': "Chicken Burger",
+         'description': "Juicy grilled chicken patty with tomato mayo and lettuce",
+         'price': "$5.50", 'course': "Entree"},
+        {'name': "Chocolate Cake",
+         'description': "fresh baked and served with ice cream",
+         'price': "$3.99", 'course': "Dessert"},
+        {'name': "Sirloin Burger",
+         'description': "Made with grade A beef",
+         'price': "$7.99", 'course': "Entree"},
+        {'name': "Root Beer",
+         'description': "16oz of refreshing goodness",
+         'price': "$1.99", 'course': "Beverage"},
+        {'name': "Iced Tea",
+         'description': "with Lemon",
+         'price': "$.99", 'course': "Beverage"},
+        {'name': "Grilled Cheese Sandwich",
+         'description': "On texas toast with American Cheese",
+         'price': "$3.49", 'course': "Entree"},
+        {'name': "Veggie Burger",
+         'description': "Made with freshest of ingredients and home grown spices",
+         'price': "$5.99", 'course': "Entree"},
+    ]),
+
+    # Menu for Super Stir Fry
+    ("Super Stir Fry", [
+        {'name': "Chicken Stir Fry",
+         'description': "With your choice of noodles vegetables and sauces",
+         'price': "$7.99", 'course': "Entree"},
+        {'name': "Peking Duck",
+         'description': " A famous duck dish from Beijing[1] that has been prepared since the imperial era. The meat is prized for its thin, crisp skin, with authentic versions of the dish serving mostly the skin and little meat, sliced in front of the diners by the cook",
+         'price': "$25", 'course': "Entree"},
+        {'name': "Spicy Tuna Roll",
+         'description': "Seared rare ahi, avocado, edamame, cucumber with wasabi soy sauce ",
+         'price': "15", 'course': "Entree"},
+        {'name': "Nepali Momo ",
+         'description': "Steamed dumplings made with vegetables, spices and meat. ",
+         'price': "12", 'course': "Entree"},
+        {'name': "Beef Noodle Soup",
+         'description': "A Chinese noodle soup made of stewed or red braised beef, beef broth, vegetables and Chinese noodles.",
+         'price': "14", 'course': "Entree"},
+        {'name': "Ramen",
+         'description': "a Japanese noodle soup dish. It consists of Chinese-style wheat noodles served in a meat- or (occasionally) fish-based broth, often flavored with soy sauce or miso, and uses toppings such as sliced pork, dried seaweed, kamaboko, and green onions.",
+         'price': "12", 'course': "Entree"},
+    ]),
+
+    # Menu for Panda Garden
+    ("Panda Garden", [
+        {'name': "Pho",
+         'description': "a Vietnamese noodle soup consisting of broth, linguine-shaped rice noodles called banh pho, a few herbs, and meat.",
+         'price': "$8.99", 'course': "Entree"},
+        {'name': "Chinese Dumplings",
+         'description': "a common Chinese dumpling which generally consists of minced meat and finely chopped vegetables wrapped into a piece of dough skin. The skin can be either thin and elastic or thicker.",
+         'price': "$6.99", 'course': "Appetizer"},
+        {'name': "Gyoza",
+         'description': "The most prominent differences between Japanese-style gyoza and Chinese-style jiaozi are the rich garlic flavor, which is less noticeable in the Chinese version, the light seasoning of Japanese gyoza with salt and soy sauce, and the fact that gyoza wrappers are much thinner",
+         'price': "$9.95", 'course': "Entree"},
+        {'name': "Stinky Tofu",
+         'description': "Taiwanese dish, deep fried fermented tofu served with pickled cabbage.",
+         'price': "$6.99", 'course': "Entree"},
+        {'name': "Veggie Burger",
+         'description': "Juicy grilled veggie patty with tomato mayo and lettuce",
+         'price': "$9.50", 'course': "Entree"},
+    ]),
+
+    # Menu for Thyme for That Vegetarian Cuisine
+    ("Thyme for That Vegetarian Cuisine ", [
+        {'name': "Tres Leches Cake",
+         'description': "Rich, luscious sponge cake soaked in sweet milk and topped with vanilla bean whipped cream and strawberries.",
+         'price': "$2.99", 'course': "Dessert"},
+        {'name': "Mushroom risotto",
+         'description': "Portabello mushrooms in a creamy risotto",
+         'price': "$5.99", 'course': "Entree"},
+        {'name': "Honey Boba Shaved Snow",
+         'description': "Milk snow layered with honey boba, jasmine tea jelly, grass jelly, caramel, cream, and freshly made mochi",
+         'price': "$4.50", 'course': "Dessert"},
+        {'name': "Cauliflower Manchurian",
+         'description': "Golden fried cauliflower florets in a midly spiced soya,garlic sauce cooked with fresh cilantro, celery, chilies,ginger & green onions",
+         'price': "$6.95", 'course': "Appetizer"},
+        {'name': "Aloo Gobi Burrito",
+         'description': "Vegan goodness. Burrito filled with rice, garbanzo beans, curry sauce, potatoes (aloo), fried cauliflower (gobi) and chutney. Nom Nom",
+         'price': "$7.95", 'course': "Entree"},
+        {'name': "Veggie Burger",
+         'description': "Juicy grilled veggie patty with tomato mayo and lettuce",
+         'price': "$6.80", 'course': "Entree"},
+    ]),
+
+    # Menu for Tony's Bistro
+    ("Tony's Bistro ", [
+        {'name': "Shellfish Tower",
+         'description': "Lobster, shrimp, sea snails, crawfish, stacked into a delicious tower",
+         'price': "$13.95", 'course': "Entree"},
+        {'name': "Chicken and Rice",
+         'description': "Chicken... and rice",
+         'price': "$4.95", 'course': "Entree"},
+        {'name': "Mom's Spaghetti",
+         'description': "Spaghetti with some incredible tomato sauce made by mom",
+         'price': "$6.95", 'course': "Entree"},
+        {'name': "Choc Full O' Mint (Smitten's Fresh Mint Chip ice cream)",
+         'description': "Milk, cream, salt, ..., Liquid nitrogen magic",
+         'price': "$3.95", 'course': "Dessert"},
+        {'name': "Tonkatsu Ramen",
+         'description': "Noodles in a delicious pork-based broth with a soft-boiled egg",
+         'price': "$7.95", 'course': "Entree"},
+    ]),
+
+    # Menu for Andala's
+    ("Andala's", [
+        {'name': "Lamb Curry",
+         'description': "Slow cook that thang in a pool of tomatoes, onions and alllll those tasty Indian spices. Mmmm.",
+         'price': "$9.95", 'course': "Entree"},
+        {'name': "Chicken Marsala",
+         'description': "Chicken cooked in Marsala wine sauce with mushrooms",
+         'price': "$7.95", 'course': "Entree"},
+        {'name': "Potstickers",
+         'description': "Delicious chicken and veggies encapsulated in fried dough.",
+         'price': "$6.50", 'course': "Appetizer"},
+        {'name': "Nigiri Sampler",
+         'description': "Maguro, Sake, Hamachi, Unagi, Uni, TORO!",
+         'price': "$6.75", 'course': "Appetizer"},
+        {'name': "Veggie Burger",
+         'description': "Juicy grilled veggie patty with tomato mayo and lettuce",
+         'price': "$7.00", 'course': "Entree"},
+    ]),
+
+    # Menu for Auntie Ann's Diner'
+    ("Auntie Ann's Diner' ", [
+        {'name': "Chicken Fried Steak",
+         'description': "Fresh battered sirloin steak fried and smothered with cream gravy",
+         'price': "$8.99", 'course': "Entree"},
+        {'name': "Boysenberry Sorbet",
+         'description': "An unsettlingly huge amount of ripe berries turned into frozen (and seedless) awesomeness",
+         'price': "$2.99", 'course': "Dessert"},
+        {'name': "Broiled salmon",
+         'description': "Salmon fillet marinated with fresh herbs and broiled hot & fast",
+         'price': "$10.95", 'course': "Entree"},
+        {'name': "Morels on toast (seasonal)",
+         'description': "Wild morel mushrooms fried in butter, served on herbed toast slices",
+         'price': "$7.50", 'course': "Appetizer"},
+        {'name': "Tandoori Chicken",
+         'description': "Chicken marinated in yoghurt and seasoned with a spicy mix(chilli, tamarind among others) and slow cooked in a cylindrical clay or metal oven which gets its heat from burning charcoal.",
+         'price': "$8.95", 'course': "Entree"},
+        {'name': "Veggie Burger",
+         'description': "Juicy grilled veggie patty with tomato mayo and lettuce",
+         'price': "$9.50", 'course': "Entree"},
+        {'name': "Spinach Ice Cream",
+         'description': "vanilla ice cream made with organic spinach leaves",
+         'price': "$1.99", 'course': "Dessert"},
+    ]),
+
+    # Menu for Cocina Y Amor
+    ("Cocina Y Amor ", [
+        {'name': "Super Burrito Al Pastor",
+         'description': "Marinated Pork, Rice, Beans, Avocado, Cilantro, Salsa, Tortilla",
+         'price': "$5.95", 'course': "Entree"},
+        {'name': "Cachapa",
+         'description': "Golden brown, corn-based Venezuelan pancake; usually stuffed with queso telita or queso de mano, and possibly lechon. ",
+         'price': "$7.99", 'course': "Entree"},
+    ]),
+
+    # Menu for State Bird Provisions
+    ("State Bird Provisions", [
+        {'name': "Chantrelle Toast",
+         'description': "Crispy Toast with Sesame Seeds slathered with buttery chantrelle mushrooms",
+         'price': "$5.95", 'course': "Appetizer"},
+        {'name': "Guanciale Chawanmushi",
+         'description': "Japanese egg custard served hot with spicey Italian Pork Jowl (guanciale)",
+         'price': "$6.95", 'course': "Dessert"},
+        {'name': "Lemon Curd Ice Cream Sandwich",
+         'description': "Lemon Curd Ice Cream Sandwich on a chocolate macaron with cardamom meringue and cashews",
+         'price': "$4.25", 'course': "Dessert"},
+    ]),
+]
+
+
+def insertBatch(connection, restaurants, items):
+    '''
+    Write one batch of restaurant and menu item rows in a single transaction,
+    using one executemany() call per table, and count the change to the list
+    of restaurants and to each restaurant written, so that cached pages and
+    ETags are refreshed.
+
+    A restaurant's version is counted up from any left by a deleted
+    restaurant with the same id, rather than started again, since the
+    database may reuse the id of a deleted restaurant, and a client may
+    still hold an ETag for it.
+
+    Args:
+        Connection connection
+        list restaurants
+        list items
+    '''
+    with connection.begin():
+        connection.execute(Restaurant.__table__.insert(), restaurants)
+        if items:
+            connection.execute(MenuItem.__table__.insert(), items)
+
+        versions = CatalogVersion.__table__
+        ids = [GLOBAL_VERSION] + [restaurant['id'] for restaurant in
+            restaurants]
+        # Find the versions already counted with a range, rather than a
+        # parameter per id; bulkLoad() gives a batch consecutive ids.
+        existing = set(row[0] for row in connection.execute(select(
+            [versions.c.restaurant_id]).where(or_(
+            versions.c.restaurant_id == GLOBAL_VERSION,
+            versions.c.restaurant_id.between(min(ids[1:]), max(ids[1:]))))))
+        bumped = [{'bumped_id': restaurant_id} for restaurant_id in ids
+            if restaurant_id in existing]
+        if bumped:
+            connection.execute(versions.update().where(
+                versions.c.restaurant_id == bindparam('bumped_id')).values(
+                version = versions.c.version + 1), bumped)
+        added = [{'restaurant_id': restaurant_id, 'version': 1}
+            for restaurant_id in ids if restaurant_id not in existing]
+        if added:
+            connection.execute(versions.insert(), added)
+
+
+def bulkLoad(engine, catalog, batch_size=DEFAULT_BATCH_SIZE, report=None):
+    '''
+    Insert every restaurant and menu item of catalog, an iterable of
+    (restaurant name, list of menu item dictionaries) tuples, in batches of
+    about batch_size rows. The catalog is consumed lazily, so it may be a
+    generator of any size.
+
+    Primary keys are assigned here, counting up from the largest id already
+    in each table, so that menu items can refer to their restaurant without
+    reading the restaurant's id back from the database. Nothing else may
+    write to the database while the load runs.
+
+    If given, report is called after each batch with the running totals of
+    restaurants and items written. Returns the totals as a tuple.
+
+    Args:
+        Engine engine
+        iterable catalog
+        int batch_size
+        function report
+    '''
+    connection = engine.connect()
+    try:
+        nextRestaurantId = 1 + (connection.execute(
+            select([func.max(Restaurant.id)])).scalar() or 0)
+        nextItemId = 1 + (connection.execute(
+            select([func.max(MenuItem.id)])).scalar() or 0)
+
+        restaurants = []
+        items = []
+        restaurantCount = 0
+        itemCount = 0
+        for name, menu in catalog:
+            restaurants.append({'id': nextRestaurantId, 'name': name})
+            for item in menu:
+                row = dict(item)
+                row['id'] = nextItemId
+                row['restaurant_id'] = nextRestaurantId
+                # Bulk inserts bypass MenuItem.validatePrice(), so derive
+                # price_cents here.
+                row['price_cents'] = parsePriceCents(row.get('price'))
+                items.append(row)
+                nextItemId += 1
+            nextRestaurantId += 1
+
+            if len(restaurants) + len(items) >= batch_size:
+                insertBatch(connection, restaurants, items)
+                restaurantCount += len(restaurants)
+                itemCount += len(items)
+                restaurants = []
+                items = []
+                if report:
+                    report(restaurantCount, itemCount)
+
+        if restaurants:
+            insertBatch(connection, restaurants, items)
+            restaurantCount += len(restaurants)
+            itemCount += len(items)
+            if report:
+                report(restaurantCount, itemCount)
+    finally:
+        connection.close()
+
+    return restaurantCount, itemCount
+
+
+def timedLoad(engine, catalog, batch_size=DEFAULT_BATCH_SIZE):
+    '''
+    Call bulkLoad(), printing the running totals at most once a second,
+    followed by the elapsed time and rows written per second.
+
+    Args:
+        Engine engine
+        iterable catalog
+        int batch_size
+    '''
+    start = time.time()
+    lastReport = [start]
+
+    def report(restaurantCount, itemCount):
+        now = time.time()
+        if now - lastReport[0] >= 1:
+            lastReport[0] = now
+            print "%10d restaurants %12d menu items %10.2fs" % (
+                restaurantCount, itemCount, now - start)
+
+    restaurantCount, itemCount = bulkLoad(engine, catalog, batch_size,
+        report)
+    elapsed = time.time() - start
+    rows = restaurantCount + itemCount
+    print "Added %d restaurants and %d menu items in %.2fs (%d rows/s)." % (
+        restaurantCount, itemCount, elapsed, rows / elapsed if elapsed else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description = 'Populate the database with sample menus.')
+    parser.add_argument('--batch-size', type = int,
+        default = DEFAULT_BATCH_SIZE,
+        help = 'rows written per transaction (default %(default)s)')
+    args = parser.parse_args()
+
+    engine = createEngine(DATABASE_URL)
+    # Bind the engine to the metadata of the Base class so that the
+    # declaratives can be accessed through the engine.
+    Base.metadata.bind = engine
+
+    timedLoad(engine, CATALOG, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+# Request and SQL metrics for finalproject.py, served at /metrics in the
+# Prometheus text exposition format.
+#
+# Every request records its latency, response size and the number and total
+# time of the SQL statements it ran, labelled by the Flask endpoint that
+# answered it. The numbers are kept in memory by each process; with several
+# worker processes, scrape each one.
+
+import threading
+import time
+from bisect import bisect_left
+
+from flask import request
+
+
+# The upper bounds of the histogram buckets of each kind of measurement.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def formatLabels(names, values):
+    # Return the {name="value",...} part of a sample line.
+    return ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\')
+        .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values))
+
+
+def formatValue(value):
+    # Return a sample value as Prometheus writes it.
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class Counter(object):
+    '''
+    A count, or total, of something, for each combination of the values of
+    its labels.
+    '''
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        # Add amount to the count of a tuple of label values. The caller
+        # must hold the lock of the Metrics this belongs to.
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self, lines):
+        lines.append('# HELP %s %s' % (self.name, self.help))
+        lines.append('# TYPE %s counter' % self.name)
+        for labels, value in sorted(self.values.items()):
+            lines.append('%s{%s} %s' % (self.name,
+                formatLabels(self.labels, labels), formatValue(value)))
+
+
+class Histogram(object):
+    '''
+    The distribution of a measurement, counted in buckets by upper bound,
+    for each combination of the values of its labels.
+    '''
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # For each tuple of label values, a list of [count per bucket, with
+        # one more for +Inf], sum of the measurements.
+        self.values = {}
+
+    def observe(self, labels, value):
+        # Count one measurement. The caller must hold the lock of the
+        # Metrics this belongs to.
+        counts = self.values.get(labels)
+        if counts is None:
+            counts = self.values[labels] = [[0] * (len(self.buckets) + 1), 0]
+        counts[0][bisect_left(self.buckets, value)] += 1
+        counts[1] += value
+
+    def render(self, lines):
+        lines.append('# HELP %s %s' % (self.name, self.help))
+        lines.append('# TYPE %s histogram' % self.name)
+        for labels, (counts, total) in sorted(self.values.items()):
+            prefix = formatLabels(self.labels, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append('%s_bucket{%s,le="%s"} %d' % (self.name, prefix,
+                    formatValue(float(bound)), cumulative))
+            lines.append('%s_sum{%s} %s' % (self.name, prefix,
+                formatValue(total)))
+            lines.append('%s_count{%s} %d' % (self.name, prefix, cumulative))
+
+
+class Metrics(object):
+    '''
+    Records the latency, response size and SQL statements of every request
+    answered by a Flask application, by endpoint. Call instrument() once to
+    start recording and render() to get the text served at /metrics.
+
+    The latency is measured from the start of the request until its
+    response is ready to be sent, so it doesn't include the time to send a
+    streamed body. Responses whose size isn't known in advance aren't
+    counted in the response size histogram.
+    '''
+
+    def __init__(self, prefix='catalog'):
+        self.requests = Counter(prefix + '_http_requests_total',
+            'Requests answered, by endpoint, method and status code.',
+            ('endpoint', 'method', 'status'))
+        self.latency = Histogram(prefix + '_http_request_duration_seconds',
+            'Time taken to answer a request, by endpoint.', ('endpoint',),
+            LATENCY_BUCKETS)
+        self.sizes = Histogram(prefix + '_http_response_size_bytes',
+            'Size of the response body, by endpoint.', ('endpoint',),
+            SIZE_BUCKETS)
+        self.statements = Histogram(prefix + '_sql_statements_per_request',
+            'SQL statements run per request, by endpoint.', ('endpoint',),
+            STATEMENT_BUCKETS)
+        self.sqlTime = Counter(prefix + '_sql_duration_seconds_total',
+            'Total time spent running SQL statements, by endpoint.',
+            ('endpoint',))
+        self.families = [self.requests, self.latency, self.sizes,
+            self.statements, self.sqlTime]
+        # Endpoints whose requests aren't recorded, e.g., /metrics itself.
+        self.ignored = set()
+        self._lock = threading.Lock()
+        # The measurements of the request being answered by each thread.
+        self._current = threading.local()
+
+    def instrument(self, app, engines, ignore=()):
+        '''
+        Record every request answered by app, and the SQL statements run on
+        the list of engines while answering it, except for the requests
+        answered by the endpoints named in ignore.
+
+        Args:
+            Flask app
+            list engines
+            iterable ignore
+        '''
+        from sqlalchemy import event
+
+        self.ignored.update(ignore)
+        app.before_request(self._beforeRequest)
+        app.after_request(self._afterRequest)
+        app.teardown_request(self._teardownRequest)
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._beforeExecute)
+            event.listen(engine, 'after_cursor_execute', self._afterExecute)
+
+    def _beforeRequest(self):
+        current = self._current
+        current.started = time.time()
+        current.statements = 0
+        current.sqlTime = 0.0
+
+    def _beforeExecute(self, connection, cursor, statement, parameters,
+            context, executemany):
+        # Statements run outside of a request, e.g., at startup, aren't
+        # counted.
+        if getattr(self._current, 'started', None) is not None:
+            self._current.executeStarted = time.time()
+
+    def _afterExecute(self, connection, cursor, statement, parameters,
+            context, executemany):
+        current = self._current
+        if getattr(current, 'started', None) is not None:
+            current.statements += 1
+            current.sqlTime += time.time() - current.executeStarted
+
+    def _afterRequest(self, response):
+        size = None if response.is_streamed else \
+            response.calculate_content_length()
+        self._record(response.status_code, size)
+        return response
+
+    def _teardownRequest(self, exception=None):
+        # A request that raised an exception is answered with a 500 without
+        # calling _afterRequest(), so record it here.
+        if exception is not None:
+            self._record(500, None)
+
+    def _record(self, status, size):
+        # Record the measurements of the current request, once.
+        current = self._current
+        started = getattr(current, 'started', None)
+        current.started = None
+        if started is None:
+            return
+        endpoint = request.url_rule.endpoint if request.url_rule else \
+            '<unmatched>'
+        if endpoint in self.ignored:
+            return
+
+        latency = time.time() - started
+        labels = (endpoint,)
+        with self._lock:
+            self.requests.inc((endpoint, request.method, status))
+            self.latency.observe(labels, latency)
+            if size is not None:
+                self.sizes.observe(labels, size)
+            self.statements.observe(labels, current.statements)
+            self.sqlTime.inc(labels, current.sqlTime)
+
+    def render(self):
+        '''
+        Return the metrics recorded so far as text in the Prometheus
+        exposition format.
+        '''
+        lines = []
+        with self._lock:
+            for family in self.families:
+                family.render(lines)
+        lines.append('')
+        return '\n'.join(lines)
@@ -0,0 +1,156 @@
+# An in-process cache of rendered HTML pages, used by finalproject.py to
+# avoid querying the database and rendering a template on every page view.
+#
+# Each page is cached with the catalog version it was rendered from, and is
+# only served while that is still the current version, so pages changed by
+# another process, e.g., another worker or lotsofmenus.py, are not served
+# stale.
+
+import threading
+from collections import OrderedDict
+
+
+class PageCache(object):
+    '''
+    A least recently used cache of rendered pages, keyed by a tuple of:
+
+        (route, restaurant_id, anything else the page varies with)
+
+    Pages are evicted, least recently used first, once there are more than
+    max_entries of them or they add up to more than max_bytes. The pages of
+    one route, or of one route and restaurant, are dropped together by
+    invalidate(), and a page cached with a version is dropped when it is
+    looked up with another. Safe to share between threads.
+    '''
+
+    def __init__(self, max_entries=1000, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale = 0
+        # The (version, page) tuples, by key, least recently used first.
+        self._pages = OrderedDict()
+        # The keys of the cached pages, by (route, restaurant_id), so that
+        # invalidate() doesn't have to look at every page.
+        self._keysByScope = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, version=None):
+        '''
+        Return the page cached under key and mark it as the most recently
+        used, or return None if there is none. A page cached with another
+        version than the given one is out of date, so it is dropped and
+        None is returned.
+
+        Args:
+            tuple key
+            int version
+        '''
+        with self._lock:
+            entry = self._pages.pop(key, None)
+            if entry is not None and entry[0] != version:
+                self._pages[key] = entry
+                self._remove(key)
+                self.stale += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._pages[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def token(self):
+        '''
+        Return a value to pass to set() along with a page rendered after
+        calling this, so that a page rendered from data that was changed
+        while it rendered is not cached.
+        '''
+        return self.invalidations
+
+    def set(self, key, page, token=None, version=None):
+        '''
+        Cache a page of bytes, rendered from the given version of the data,
+        under key, unless something was invalidated since token was taken
+        from token().
+
+        Args:
+            tuple key
+            str page
+            int token
+            int version
+        '''
+        with self._lock:
+            if token is not None and token != self.invalidations:
+                return
+            self._remove(key)
+            self._pages[key] = (version, page)
+            self._keysByScope.setdefault(key[:2], set()).add(key)
+            self._bytes += len(page)
+            while self._pages and (len(self._pages) > self.max_entries or
+                    self._bytes > self.max_bytes):
+                self._remove(next(iter(self._pages)))
+                self.evictions += 1
+
+    def invalidate(self, route, restaurant_id=None):
+        '''
+        Drop the cached pages of a route for one restaurant, or for all of
+        them if restaurant_id is None.
+
+        Args:
+            str route
+            int restaurant_id
+        '''
+        with self._lock:
+            self.invalidations += 1
+            if restaurant_id is None:
+                scopes = [scope for scope in self._keysByScope
+                    if scope[0] == route]
+            else:
+                scopes = [(route, restaurant_id)]
+            for scope in scopes:
+                for key in list(self._keysByScope.get(scope, ())):
+                    self._remove(key)
+
+    def clear(self):
+        # Drop every cached page.
+        with self._lock:
+            self.invalidations += 1
+            self._pages.clear()
+            self._keysByScope.clear()
+            self._bytes = 0
+
+    def stats(self):
+        '''
+        Return a dictionary of the cache's counters and current size.
+        '''
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits' : self.hits,
+                'misses' : self.misses,
+                'hit_ratio' : float(self.hits) / lookups if lookups else 0.0,
+                'evictions' : self.evictions,
+                'invalidations' : self.invalidations,
+                'stale' : self.stale,
+                'entries' : len(self._pages),
+                'bytes' : self._bytes,
+                'max_entries' : self.max_entries,
+                'max_bytes' : self.max_bytes,
+            }
+
+    def _remove(self, key):
+        # Drop one page. The caller must hold the lock.
+        entry = self._pages.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry[1])
+        keys = self._keysByScope.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keysByScope[key[:2]]
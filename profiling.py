@@ -0,0 +1,248 @@
+# Profile single requests to finalproject.py on demand, and summarize the
+# profiles.
+#
+# Profiling is enabled by setting CATALOG_PROFILE_DIR to the directory the
+# profiles are written to. A request is then profiled if it has an
+# X-Profile header or a profile=1 query string parameter, and comes from one
+# of the addresses in CATALOG_PROFILE_CLIENTS (by default, this machine):
+#
+#   CATALOG_PROFILE_DIR=profiles python finalproject.py
+#   curl -H 'X-Profile: 1' http://localhost:5000/restaurant/1/
+#
+# Each profile is saved as a .prof file, readable with pstats, next to a
+# .json file of the request's route, status and timing. To list them, and to
+# break one down by where its time went, e.g., SQL, ORM or Jinja:
+#
+#   python profiling.py list --dir profiles
+#   python profiling.py show --dir profiles 20151028-101500-123456-showMenu
+
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import time
+from datetime import datetime
+
+
+# The addresses allowed to ask for a profile when CATALOG_PROFILE_CLIENTS
+# isn't set.
+DEFAULT_CLIENTS = '127.0.0.1,::1'
+
+# The categories that summarize() splits the time of a profile into, each
+# with the pattern matching the files, or built-in functions, counted in
+# it. A function counts in the first category it matches.
+CATEGORIES = [
+    ('SQL (database driver)', re.compile(r'sqlite3|psycopg2|MySQLdb')),
+    ('SQLAlchemy ORM', re.compile(r'sqlalchemy[/\\]orm')),
+    ('SQLAlchemy core', re.compile(r'sqlalchemy')),
+    ('Jinja templates', re.compile(r'jinja2|[/\\]templates[/\\]')),
+    ('Flask and Werkzeug', re.compile(r'flask|werkzeug')),
+]
+
+
+def profileName(endpoint):
+    # Return the file name, without extension, of a new request's profile.
+    return '%s-%s' % (datetime.now().strftime('%Y%m%d-%H%M%S-%f'),
+        endpoint or 'unmatched')
+
+
+class ProfilingMiddleware(object):
+    '''
+    WSGI middleware wrapping a Flask application's wsgi_app, which runs each
+    request asking for it under cProfile and saves the profile to
+    directory. See the top of this file. The whole response body is
+    produced while profiling, so streamed responses are profiled too.
+    Responses to profiled requests carry an X-Profile header naming their
+    profile.
+    '''
+
+    def __init__(self, app, directory, clients=DEFAULT_CLIENTS):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self.directory = directory
+        self.clients = set(client.strip() for client in clients.split(',')
+            if client.strip())
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def wantsProfile(self, environ):
+        # Return True if the request asks for a profile and may have one.
+        if environ.get('REMOTE_ADDR') not in self.clients:
+            return False
+        if environ.get('HTTP_X_PROFILE'):
+            return True
+        return re.search(r'(^|&)profile=1(&|$)',
+            environ.get('QUERY_STRING', '')) is not None
+
+    def __call__(self, environ, start_response):
+        if not self.wantsProfile(environ):
+            return self.wsgi_app(environ, start_response)
+
+        try:
+            endpoint = self.app.url_map.bind_to_environ(environ).match()[0]
+        except Exception:
+            endpoint = None
+        name = profileName(endpoint)
+        response = {}
+
+        def startResponse(status, headers, exc_info=None):
+            # Hold the response back until the body has been produced.
+            response['status'] = status
+            response['headers'] = headers + [('X-Profile', name)]
+            response['exc_info'] = exc_info
+
+        profile = cProfile.Profile()
+        started = time.time()
+        profile.enable()
+        try:
+            result = self.wsgi_app(environ, startResponse)
+            try:
+                body = list(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        finally:
+            profile.disable()
+        elapsed = time.time() - started
+
+        path = os.path.join(self.directory, name)
+        profile.dump_stats(path + '.prof')
+        with open(path + '.json', 'w') as f:
+            json.dump({
+                'endpoint': endpoint,
+                'method': environ.get('REQUEST_METHOD'),
+                'path': environ.get('PATH_INFO'),
+                'query_string': environ.get('QUERY_STRING'),
+                'status': response.get('status'),
+                'elapsed_ms': elapsed * 1000,
+                'bytes': sum(len(chunk) for chunk in body),
+                'started': datetime.fromtimestamp(started).isoformat(),
+            }, f, indent = 2, sort_keys = True)
+
+        start_response(response['status'], response['headers'],
+            response['exc_info'])
+        return body
+
+
+def listProfiles(directory):
+    '''
+    Return the metadata of every profile saved in directory, oldest first,
+    each with its name added.
+
+    Args:
+        str directory
+    '''
+    profiles = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.json'):
+            with open(os.path.join(directory, filename)) as f:
+                metadata = json.load(f)
+            metadata['name'] = filename[:-len('.json')]
+            profiles.append(metadata)
+    return profiles
+
+
+def summarize(stats):
+    '''
+    Return a list of (category, seconds, calls) tuples, from CATEGORIES
+    plus 'Other', splitting the total time of a pstats.Stats between them
+    by where each function's own time was spent, and a tuple of (calls,
+    cumulative seconds) of url_for().
+
+    Args:
+        Stats stats
+    '''
+    totals = dict((name, [0.0, 0]) for name, pattern in CATEGORIES)
+    totals['Other'] = [0.0, 0]
+    urlFor = (0, 0.0)
+    for (filename, line, function), (calls, primitive, own, cumulative,
+            callers) in stats.stats.items():
+        where = '%s %s' % (filename, function)
+        for name, pattern in CATEGORIES:
+            if pattern.search(where):
+                break
+        else:
+            name = 'Other'
+        totals[name][0] += own
+        totals[name][1] += calls
+        if function == 'url_for' and re.search(r'flask', filename):
+            urlFor = (calls, cumulative)
+    order = [name for name, pattern in CATEGORIES] + ['Other']
+    return [(name, totals[name][0], totals[name][1]) for name in order], \
+        urlFor
+
+
+def showProfile(directory, name, limit=20, sort='cumulative'):
+    '''
+    Print the metadata of a saved profile, its time by category, and its
+    top functions.
+
+    Args:
+        str directory
+        str name
+        int limit
+        str sort
+    '''
+    path = os.path.join(directory, name)
+    with open(path + '.json') as f:
+        metadata = json.load(f)
+    print '%(method)s %(path)s  endpoint %(endpoint)s  status %(status)s' % (
+        metadata)
+    print '%.2f ms, %d bytes, at %s' % (metadata['elapsed_ms'],
+        metadata['bytes'], metadata['started'])
+    print
+
+    stats = pstats.Stats(path + '.prof')
+    categories, (urlForCalls, urlForTime) = summarize(stats)
+    total = sum(seconds for category, seconds, calls in categories) or 1
+    print '%-24s %10s %6s %10s' % ('time spent in', 'ms', '%', 'calls')
+    for category, seconds, calls in categories:
+        print '%-24s %10.2f %5.1f%% %10d' % (category, seconds * 1000,
+            100 * seconds / total, calls)
+    print '%-24s %10.2f %6s %10d' % ('url_for(), cumulative',
+        urlForTime * 1000, '', urlForCalls)
+    print
+
+    stats.sort_stats(sort).print_stats(limit)
+
+
+def main():
+    # The options shared by every command.
+    common = argparse.ArgumentParser(add_help = False)
+    common.add_argument('--dir', default = os.environ.get(
+        'CATALOG_PROFILE_DIR', 'profiles'),
+        help = 'directory of the profiles (default: CATALOG_PROFILE_DIR or '
+        'profiles)')
+
+    parser = argparse.ArgumentParser(
+        description = 'List and summarize the profiles of requests.')
+    commands = parser.add_subparsers(dest = 'command')
+    commands.add_parser('list', parents = [common],
+        help = 'list the saved profiles')
+    show = commands.add_parser('show', parents = [common],
+        help = 'summarize one profile')
+    show.add_argument('name', help = 'name of the profile, as listed')
+    show.add_argument('--limit', type = int, default = 20,
+        help = 'number of functions to print (default %(default)s)')
+    show.add_argument('--sort', default = 'cumulative',
+        help = 'pstats sort order of the functions (default %(default)s)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        sys.exit('No profiles in %s.' % args.dir)
+
+    if args.command == 'list':
+        for metadata in listProfiles(args.dir):
+            print '%-40s %-6s %-40s %-4s %9.2f ms' % (metadata['name'],
+                metadata['method'], metadata['path'],
+                (metadata['status'] or '').split(' ')[0],
+                metadata['elapsed_ms'])
+    else:
+        showProfile(args.dir, args.name, args.limit, args.sort)
+
+
+if __name__ == '__main__':
+    main()
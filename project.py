@@ -1,18 +1,33 @@
+import os
 from flask import Flask, render_template, url_for, request, redirect, \
     flash, jsonify
 
 # Create an instance of the Flask class with the name of the running application
 # as the argument. 
 app = Flask(__name__)
+# Flask will use this key to create sessions for our users. It is set here,
+# rather than when run directly, so that WSGI servers running many worker
+# processes use it too.
+app.secret_key = os.environ.get('CATALOG_SECRET_KEY', 'ylic9[,Tah')
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 # Import the classes we created in database_setup.py
-from database_setup import Base, Restaurant, MenuItem
+from database_setup import Base, Restaurant, MenuItem, createEngine
+# Import the data access functions shared with finalproject.py.
+from queries import loadCourseMenu, bumpVersions, formatPriceCents
+# Import the bundles of CSS and JavaScript built by assets.py.
+from assets import Assets
+
+# Let templates show prices in cents as dollars, e.g., {{ cents|dollars }}.
+app.add_template_filter(formatPriceCents, 'dollars')
+
+# Let templates link to the bundles built by assets.py.
+app.add_template_global(Assets().urls, 'assetUrls')
 
 # Database connection code needs to run first:
 # Specify which database engine to communicate with and which database file.
-engine = create_engine('sqlite:///restaurantmenu.db')
+# The engine keeps a pool of connections shared by all requests.
+engine = createEngine()
 
 # Bind the engine to the metadata of the Base class so that the
 # declaratives can be accessed through a DBSession instance
@@ -20,7 +35,9 @@ Base.metadata.bind = engine
 
 # Create a sessionmaker object to establish a link of communications between
 # our code executions and the engine object created in the previous statement.
-DBSession = sessionmaker(bind = engine)
+# Wrap it in scoped_session() so that each thread, and so each request, gets
+# a session of its own.
+DBSession = scoped_session(sessionmaker(bind = engine))
 
 # A DBSession() instance establishes all conversations with the database
 # and represents a "staging zone" for all the objects loaded into the
@@ -28,8 +45,27 @@ DBSession = sessionmaker(bind = engine)
 # session won't be persisted into the database until you call
 # session.commit(). If you're not happy about the changes, you can
 # revert all of them back to the last commit by calling
-# session.rollback()
-session = DBSession()
+# session.rollback(). session stands in for the current request's
+# DBSession(), which is created on first use and removed when the request
+# ends.
+session = DBSession
+
+
+@app.teardown_appcontext
+def removeSession(exception=None):
+    # Discard the current request's database session.
+    '''
+    Called by Flask at the end of every request. Roll back whatever the
+    request left uncommitted, e.g., after a failed commit, then close its
+    session and return its connection to the pool, so that the next request
+    on this thread starts with a fresh session.
+
+    Args:
+        Exception exception
+    '''
+    if exception is not None:
+        DBSession.rollback()
+    DBSession.remove()
 
 
 @app.route('/restaurants/<int:restaurant_id>/menu/JSON')
@@ -91,16 +127,15 @@ def restaurantMenu(restaurant_id):
     Args:
         int restaurant_id
     '''
-    # Call SQLalchemy to query the Restaurant table by the restaurant_id arg.
-    restaurant = session.query(Restaurant).filter_by(id=restaurant_id).one()
-    
-    # Call SQLalchemy to query for that restaurant's menu items.
-    items = session.query(MenuItem).filter_by(restaurant_id=restaurant.id)
+    # Call SQLalchemy to load the restaurant and its menu items, grouped by
+    # course, in one query.
+    restaurant, courses = loadCourseMenu(session, restaurant_id)
 
     # Return a template (located in a dir called templates) and pass the 
-    # queries so that the escape code in the template has access to the 
-    # variables that will populate the template.
-    return render_template('menu.html', restaurant=restaurant, items=items)
+    # courses already loaded so that the escape code in the template has
+    # access to the variables that will populate the template.
+    return render_template('menu.html', restaurant=restaurant,
+        courses=courses)
 
 
 # Create a decorator from Flask.app.route() to bind newMenuItem with the URL
@@ -126,6 +161,8 @@ def newMenuItem(restaurant_id):
             restaurant_id)
         # Call SQLalchemy to stage the data to be written...
         session.add(newItem)
+        # Invalidate the ETags of this restaurant's menu.
+        bumpVersions(session, restaurant_id)
         # ... and now write the data to the DB.
         session.commit()
         # Alert the user.
@@ -171,6 +208,8 @@ def editMenuItem(restaurant_id, menu_id):
             editedItem.name = request.form['name']
         # Stage for writing to the DB.
         session.add(editedItem)
+        # Invalidate the ETags of the item's restaurant's menu.
+        bumpVersions(session, editedItem.restaurant_id)
         # Write to the DB.
         session.commit()
         # Alert the user.
@@ -210,6 +249,8 @@ def deleteMenuItem(restaurant_id, menu_id):
     if request.method == 'POST':
         # Stage for persisting to the DB.
         session.delete(deletedItem)
+        # Invalidate the ETags of the item's restaurant's menu.
+        bumpVersions(session, deletedItem.restaurant_id)
         # Delete the record from the DB.
         session.commit()
         # Alert the user.
@@ -228,12 +269,12 @@ def deleteMenuItem(restaurant_id, menu_id):
 # If this file is called directly, i.e., not called as an include, run the code 
 # through the Python interpreter.
 if __name__ == '__main__':
-    # Flash will use this key to create sessions for our users.
-    app.secret_key = 'ylic9[,Tah'
     # With debug running, the Flask web server will reload itself each time 
     # it notices a code change. It also provides a debugger in the browser.
     app.debug = True
 
-    # Run the local web server with our application.
+    # Run the local web server with our application, answering each request
+    # in a thread of its own. For more than one process, run the app under a
+    # WSGI server instead, e.g., gunicorn --workers 4 project:app
     # Listen on all public IPs - required because we're running vagrant.
-    app.run(host='0.0.0.0', port=5000)
+    app.run(host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,487 @@
+# Data access functions shared by the Flask applications.
+#
+# Each function takes the SQLalchemy session to run against as its first
+# argument, so that finalproject.py and project.py can both call them with
+# their own DBSession.
+
+import base64
+import hashlib
+import json
+import re
+import urllib
+
+from sqlalchemy import and_, or_, text, case, func
+from sqlalchemy.orm import contains_eager
+from sqlalchemy.orm.exc import NoResultFound
+# Import the classes we created in database_setup.py
+from database_setup import Restaurant, MenuItem, CatalogVersion, \
+    parsePriceCents
+
+
+# The number of restaurants returned by one page of a listing when the client
+# doesn't ask for a specific number, and the most it is allowed to ask for.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# The CatalogVersion row counting changes to the list of restaurants.
+GLOBAL_VERSION = 0
+
+# The orders a menu can be listed in, by the name clients ask for them with.
+MENU_SORTS = {
+    'id': (MenuItem.id,),
+    'price': (MenuItem.price_cents, MenuItem.id),
+}
+
+# The order of the courses of a menu. Any other course follows these, in
+# alphabetical order, with items without a course last.
+COURSES = ['Appetizer', 'Entree', 'Dessert', 'Beverage']
+
+
+def encodeCursor(restaurant):
+    '''
+    Return an opaque, URL safe string marking the position of a restaurant
+    in the listing sorted by (name, id).
+
+    Args:
+        Restaurant restaurant
+    '''
+    position = json.dumps([restaurant.name, restaurant.id])
+    return base64.urlsafe_b64encode(position.encode('utf-8')).rstrip('=')
+
+
+def decodeCursor(cursor):
+    '''
+    Return the (name, id) tuple stored in a cursor made by encodeCursor().
+    Raises ValueError if the cursor was not made by encodeCursor().
+
+    Args:
+        str cursor
+    '''
+    try:
+        # Put back the base64 padding stripped by encodeCursor().
+        padded = str(cursor) + '=' * (-len(cursor) % 4)
+        name, restaurant_id = json.loads(
+            base64.urlsafe_b64decode(padded).decode('utf-8'))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError('Malformed cursor: %r' % cursor)
+
+    # bool is a subclass of int, so check the exact type of the id.
+    if (not isinstance(name, basestring)
+            or type(restaurant_id) not in (int, long)):
+        raise ValueError('Malformed cursor: %r' % cursor)
+
+    return name, restaurant_id
+
+
+def restaurantPage(session, limit=DEFAULT_PAGE_SIZE, after=None, before=None):
+    '''
+    Return one page of restaurants sorted by name, as a tuple of:
+
+        (list of Restaurant, next cursor or None, prev cursor or None)
+
+    The page is found with a keyset (seek) condition on (name, id) rather
+    than an OFFSET, so the cost of fetching a page does not grow with the
+    number of restaurants in front of it. The condition is written as a
+    range on name plus a tie-breaker on id so that it can be answered by
+    the index on restaurant.name. Pass the next cursor back as
+    after, or the prev cursor back as before, to move through the listing.
+
+    Args:
+        session session
+        int limit
+        str after
+        str before
+    '''
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = session.query(Restaurant)
+
+    if before is not None:
+        # Walk backwards from the cursor, then put the page back in order.
+        name, restaurant_id = decodeCursor(before)
+        query = query.filter(and_(Restaurant.name <= name, or_(
+            Restaurant.name < name, Restaurant.id < restaurant_id)))
+        query = query.order_by(Restaurant.name.desc(), Restaurant.id.desc())
+    else:
+        if after is not None:
+            name, restaurant_id = decodeCursor(after)
+            query = query.filter(and_(Restaurant.name >= name, or_(
+                Restaurant.name > name, Restaurant.id > restaurant_id)))
+        query = query.order_by(Restaurant.name, Restaurant.id)
+
+    # Fetch one row more than was asked for, to learn whether there is
+    # another page beyond this one without a separate COUNT query.
+    restaurants = query.limit(limit + 1).all()
+    more = len(restaurants) > limit
+    restaurants = restaurants[:limit]
+
+    if before is not None:
+        restaurants.reverse()
+        hasNext = True
+        hasPrev = more
+    else:
+        hasNext = more
+        hasPrev = after is not None
+
+    nextCursor = None
+    prevCursor = None
+    if restaurants:
+        if hasNext:
+            nextCursor = encodeCursor(restaurants[-1])
+        if hasPrev:
+            prevCursor = encodeCursor(restaurants[0])
+
+    return restaurants, nextCursor, prevCursor
+
+
+def loadCourseMenu(session, restaurant_id):
+    '''
+    Return the Restaurant with the given id and its menu grouped by course,
+    as a tuple of:
+
+        (Restaurant, list of course dictionaries)
+
+    Each course dictionary holds the course name, its items, a list of
+    MenuItem sorted by id, and the count of its items and the lowest,
+    highest and average of their price_cents, which are None if no item has
+    a price. The courses are listed in the order of COURSES. An empty menu
+    has no courses.
+
+    Everything is read with a single SELECT: the per course statistics are
+    window function aggregates computed by the database alongside each
+    item. Raises NoResultFound if there is no such restaurant.
+
+    Args:
+        session session
+        int restaurant_id
+    '''
+    byCourse = {'partition_by': MenuItem.course}
+    courseOrder = case(dict((course, position) for position, course in
+        enumerate(COURSES)), value = MenuItem.course, else_ = len(COURSES))
+    rows = session.query(Restaurant, MenuItem,
+        func.count(MenuItem.id).over(**byCourse),
+        func.min(MenuItem.price_cents).over(**byCourse),
+        func.max(MenuItem.price_cents).over(**byCourse),
+        func.avg(MenuItem.price_cents).over(**byCourse)).outerjoin(
+        MenuItem, MenuItem.restaurant_id == Restaurant.id).filter(
+        Restaurant.id == restaurant_id).order_by(courseOrder,
+        MenuItem.course == None, MenuItem.course, MenuItem.id).all()
+    if not rows:
+        raise NoResultFound('No restaurant with id %r' % restaurant_id)
+
+    courses = []
+    for restaurant, item, count, lowest, highest, average in rows:
+        if item is None:
+            # The only row of a restaurant without a menu.
+            continue
+        if not courses or courses[-1]['course'] != item.course:
+            courses.append({
+                'course': item.course,
+                'count': count,
+                'min_price_cents': lowest,
+                'max_price_cents': highest,
+                'avg_price_cents': None if average is None else
+                    int(round(average)),
+                'items': [],
+            })
+        courses[-1]['items'].append(item)
+    return rows[0][0], courses
+
+
+def parsePriceRange(min_price=None, max_price=None):
+    '''
+    Return the (min_cents, max_cents) tuple of a price range given as two
+    optional price strings, e.g., "5" and "$12.50". Raises ValueError if
+    either is given but isn't a price.
+
+    Args:
+        str min_price
+        str max_price
+    '''
+    cents = []
+    for price in (min_price, max_price):
+        if price is None:
+            cents.append(None)
+            continue
+        cents.append(parsePriceCents(price))
+        if cents[-1] is None:
+            raise ValueError('Malformed price: %r' % price)
+    return tuple(cents)
+
+
+def formatPriceCents(cents):
+    '''
+    Return a whole number of cents as a dollar amount, e.g., "$7.50" for
+    750, or an empty string if cents is None.
+
+    Args:
+        int cents
+    '''
+    if cents is None:
+        return ''
+    return '$%d.%02d' % divmod(cents, 100)
+
+
+def priceRange(min_cents=None, max_cents=None):
+    '''
+    Return a list of the SQL conditions selecting the menu items priced from
+    min_cents to max_cents inclusive. Either end may be None for no limit.
+
+    Args:
+        int min_cents
+        int max_cents
+    '''
+    conditions = []
+    if min_cents is not None:
+        conditions.append(MenuItem.price_cents >= min_cents)
+    if max_cents is not None:
+        conditions.append(MenuItem.price_cents <= max_cents)
+    return conditions
+
+
+def loadRestaurantMenu(session, restaurant_id, min_cents=None,
+        max_cents=None, sort='id'):
+    '''
+    Return the Restaurant with the given id, with its menu_items list
+    already loaded, using a single SELECT that outer joins the Restaurant and
+    MenuItem tables. Reading restaurant.menu_items afterwards does not go
+    back to the database. Raises NoResultFound if there is no such
+    restaurant.
+
+    The menu can be narrowed to the items priced from min_cents to max_cents
+    and listed in any order of MENU_SORTS. The conditions are part of the
+    join, so a restaurant with no items in the range is still returned, with
+    an empty menu_items list. That list then holds only the items in range
+    for the rest of the session.
+
+    Args:
+        session session
+        int restaurant_id
+        int min_cents
+        int max_cents
+        str sort
+    '''
+    return session.query(Restaurant).outerjoin(MenuItem, and_(
+        MenuItem.restaurant_id == Restaurant.id,
+        *priceRange(min_cents, max_cents))).options(
+        contains_eager(Restaurant.menu_items)).filter(
+        Restaurant.id == restaurant_id).order_by(*MENU_SORTS[sort]).one()
+
+
+# The words of a search, as FTS5's unicode61 tokenizer splits them.
+SEARCH_WORD = re.compile(r'\w+', re.UNICODE)
+
+# The weights given by searchMenuItems() to matches in each column of the
+# search index, in order: the dish name, its description and its
+# restaurant's name.
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0)
+
+SEARCH_QUERY = text('''
+    SELECT menu_item.id, menu_item.name, menu_item.description,
+        menu_item.price, menu_item.price_cents, menu_item.course,
+        menu_item.restaurant_id, menu_item_fts.restaurant_name,
+        bm25(menu_item_fts, %s) AS rank
+    FROM menu_item_fts JOIN menu_item ON menu_item.id = menu_item_fts.rowid
+    WHERE menu_item_fts MATCH :match
+    ORDER BY rank, menu_item.id
+    LIMIT :limit OFFSET :offset''' % ', '.join(map(str, SEARCH_WEIGHTS)))
+
+
+def searchExpression(search):
+    '''
+    Return an FTS5 query matching the menu items containing every word of a
+    search typed by a user, the last word also matching as a prefix, e.g.,
+    '"spicy" "chick"*' for "Spicy chick". Each word is quoted, so FTS5
+    operators and punctuation in the search are matched as plain text.
+    Raises ValueError if the search has no words.
+
+    Args:
+        str search
+    '''
+    words = SEARCH_WORD.findall(search)
+    if not words:
+        raise ValueError('Empty search: %r' % search)
+    return ' '.join('"%s"' % word for word in words) + '*'
+
+
+def searchMenuItems(session, search, limit=DEFAULT_PAGE_SIZE, page=1):
+    '''
+    Return one page of the menu items of all restaurants matching a search,
+    best match first, as a tuple of:
+
+        (list of dictionaries, True if there is another page)
+
+    Each dictionary holds a menu item's columns, its restaurant's name and
+    its rank, the bm25() score of the match, for which lower is better. The
+    search is answered from the menu_item_fts index; see searchExpression()
+    for how it is matched. Raises ValueError if the search has no words.
+
+    Args:
+        session session
+        str search
+        int limit
+        int page
+    '''
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    page = max(1, page)
+    # Fetch one row more than was asked for, to learn whether there is
+    # another page.
+    rows = session.execute(SEARCH_QUERY, {'match': searchExpression(search),
+        'limit': limit + 1, 'offset': (page - 1) * limit}).fetchall()
+    return [dict(row) for row in rows[:limit]], len(rows) > limit
+
+
+def catalogVersion(session, restaurant_id=GLOBAL_VERSION):
+    '''
+    Return the number of changes made to a restaurant and its menu, or with
+    the default restaurant_id, to the list of restaurants. Only reads the
+    catalog_version table.
+
+    Args:
+        session session
+        int restaurant_id
+    '''
+    version = session.query(CatalogVersion.version).filter_by(
+        restaurant_id = restaurant_id).scalar()
+    return version or 0
+
+
+def versionETag(restaurant_id, version, args=None):
+    '''
+    Return the ETag of a JSON response about a restaurant, or with
+    GLOBAL_VERSION the list of restaurants, at a version counted by
+    catalogVersion(), e.g., 'r1-v3'. Responses to the same URL with other
+    query string arguments, e.g., another sort order or page, hold other
+    data, so if args, a MultiDict of the arguments, has any, a short digest
+    of them, sorted, is added, e.g., 'r1-v3-q5f2c8a1e'.
+
+    Args:
+        int restaurant_id
+        int version
+        MultiDict args
+    '''
+    etag = 'r%d-v%d' % (restaurant_id, version)
+    if not args:
+        return etag
+    arguments = sorted((key.encode('utf-8'), value.encode('utf-8'))
+        for key, value in args.items(multi = True))
+    return '%s-q%s' % (etag,
+        hashlib.sha1(urllib.urlencode(arguments)).hexdigest()[:8])
+
+
+def bumpVersions(session, *restaurant_ids):
+    '''
+    Count one more change to each of the given restaurants, or with
+    GLOBAL_VERSION, to the list of restaurants. Call before committing the
+    change itself, so both are written in the same transaction.
+
+    Args:
+        session session
+        int restaurant_ids
+    '''
+    for restaurant_id in set(restaurant_ids):
+        updated = session.query(CatalogVersion).filter_by(
+            restaurant_id = restaurant_id).update(
+            {CatalogVersion.version: CatalogVersion.version + 1},
+            synchronize_session = False)
+        if not updated:
+            session.add(CatalogVersion(restaurant_id = restaurant_id,
+                version = 1))
+
+
+# The columns of a menu item read and written by the bulk import and export
+# of a menu, and the most items one import may hold.
+MENU_COLUMNS = ['name', 'description', 'price', 'course']
+MAX_IMPORT_ITEMS = 5000
+
+
+def validateMenu(items):
+    '''
+    Check a menu to be imported, a list of dictionaries of MENU_COLUMNS
+    values, and return a tuple of:
+
+        (list of menu_item rows ready to insert, list of error messages)
+
+    Every item must have a name, every value must be a string (or None, for
+    all but the name) that fits its column, and no other keys are allowed.
+    The rows are only usable if there are no errors.
+
+    Args:
+        list items
+    '''
+    if not isinstance(items, list):
+        return [], ['MenuItems must be a list of menu items.']
+    if len(items) > MAX_IMPORT_ITEMS:
+        return [], ['A menu may have at most %d items, not %d.' % (
+            MAX_IMPORT_ITEMS, len(items))]
+
+    columns = MenuItem.__table__.c
+    rows = []
+    errors = []
+    for position, item in enumerate(items):
+        errorCount = len(errors)
+        if not isinstance(item, dict):
+            errors.append('Item %d is not an object.' % position)
+            continue
+        for key in sorted(set(item) - set(MENU_COLUMNS)):
+            errors.append('Item %d has an unknown field %r.' % (position, key))
+        if not item.get('name'):
+            errors.append('Item %d has no name.' % position)
+        for name in MENU_COLUMNS:
+            value = item.get(name)
+            if value is None:
+                continue
+            if not isinstance(value, basestring):
+                errors.append('Item %d: %s must be a string.' % (position,
+                    name))
+            elif len(value) > columns[name].type.length:
+                errors.append('Item %d: %s is longer than %d characters.' % (
+                    position, name, columns[name].type.length))
+        if len(errors) > errorCount:
+            continue
+        row = dict((name, item.get(name)) for name in MENU_COLUMNS)
+        # executemany() bypasses MenuItem.validatePrice(), so derive
+        # price_cents here.
+        row['price_cents'] = parsePriceCents(row['price'])
+        rows.append(row)
+    return rows, errors
+
+
+def importMenu(session, restaurant_id, rows, replace=False):
+    '''
+    Add menu items, rows returned by validateMenu(), to a restaurant's menu,
+    first deleting its existing items if replace is True. The rows are
+    written with one executemany() INSERT, in the session's transaction,
+    along with the change to the restaurant's version; the caller commits.
+    Returns the number of items deleted.
+
+    Args:
+        session session
+        int restaurant_id
+        list rows
+        bool replace
+    '''
+    deleted = 0
+    if replace:
+        deleted = session.query(MenuItem).filter_by(
+            restaurant_id = restaurant_id).delete(synchronize_session = False)
+    if rows:
+        session.execute(MenuItem.__table__.insert(), [dict(row,
+            restaurant_id = restaurant_id) for row in rows])
+    bumpVersions(session, restaurant_id)
+    return deleted
+
+
+def exportMenu(session, restaurant_id):
+    '''
+    Return a restaurant's menu items, sorted by id, as a list of
+    dictionaries of their MENU_COLUMNS, in the form taken by validateMenu().
+    Reads the columns without loading MenuItem objects.
+
+    Args:
+        session session
+        int restaurant_id
+    '''
+    columns = [getattr(MenuItem, name) for name in MENU_COLUMNS]
+    return [dict(zip(MENU_COLUMNS, row)) for row in session.query(
+        *columns).filter_by(restaurant_id = restaurant_id).order_by(
+        MenuItem.id)]
@@ -0,0 +1,165 @@
+# Detect requests that run more SQL than they should, for development and
+# tests of finalproject.py.
+#
+# Every SQL statement run while answering a request is recorded, and when
+# the request ends, or for a streamed response once it has been sent and
+# closed, its statements are checked for:
+#
+#   - the same statement run more than once with the same parameters,
+#   - the same statement run many times with different parameters, the
+#     signature of an N+1 query loop, and
+#   - more statements than the query budget declared on the view with
+#     @queryBudget(n).
+#
+# Problems are reported as QueryWarnings, or raised as QueryProblems so that
+# tests fail. Enable it by setting CATALOG_QUERY_CHECK to warn or raise; the
+# tests in tests/ run with it set to raise:
+#
+#   python -m pytest tests
+
+import threading
+import warnings
+
+from flask import current_app, request
+
+
+# The number of times one statement may run with different parameters in a
+# request before it is reported as an N+1 query loop.
+DEFAULT_REPEAT_LIMIT = 5
+
+
+class QueryWarning(UserWarning):
+    # Warns of a request that ran duplicate, repeated or too many statements.
+    pass
+
+
+class QueryProblem(AssertionError):
+    # Raised instead of a QueryWarning by a QueryDetector in raise mode.
+    pass
+
+
+def queryBudget(statements):
+    '''
+    Declare the most SQL statements a view may run to answer one request,
+    checked by QueryDetector. Apply it directly below @app.route(), e.g.:
+
+        @app.route('/restaurant/<int:restaurant_id>/')
+        @queryBudget(2)
+        def showMenu(restaurant_id):
+
+    Args:
+        int statements
+    '''
+    def decorator(view):
+        view.queryBudget = statements
+        return view
+    return decorator
+
+
+class QueryDetector(object):
+    '''
+    Records the SQL statements run on engines by each request answered by
+    a Flask application, and reports the requests whose statements look
+    wrong. See the top of this file. mode is 'warn' to report problems with
+    warnings.warn(), or 'raise' to raise them; with app.testing set, Flask
+    passes the QueryProblem on to the test.
+
+    The body of a streamed response is produced after the view returns, and
+    may run statements of its own, so its statements are checked when the
+    response is closed, which the test client does with buffered=True.
+    '''
+
+    def __init__(self, mode='warn', repeat_limit=DEFAULT_REPEAT_LIMIT):
+        if mode not in ('warn', 'raise'):
+            raise ValueError('Unknown query check mode: %r' % mode)
+        self.mode = mode
+        self.repeat_limit = repeat_limit
+        # The statements run by the request being answered by each thread.
+        self._current = threading.local()
+
+    def instrument(self, app, engines):
+        '''
+        Check every request answered by app for the statements it runs on
+        the list of engines.
+
+        Args:
+            Flask app
+            list engines
+        '''
+        from sqlalchemy import event
+
+        app.before_request(self._beforeRequest)
+        app.after_request(self._afterRequest)
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute',
+                self._recordStatement)
+
+    def _beforeRequest(self):
+        self._current.statements = []
+
+    def _recordStatement(self, connection, cursor, statement, parameters,
+            context, executemany):
+        statements = getattr(self._current, 'statements', None)
+        if statements is not None:
+            statements.append((statement, repr(parameters)))
+
+    def _afterRequest(self, response):
+        statements = getattr(self._current, 'statements', None)
+        if statements is None:
+            return response
+
+        view = current_app.view_functions.get(request.url_rule.endpoint) \
+            if request.url_rule else None
+        budget = getattr(view, 'queryBudget', None)
+        name = '%s %s' % (request.method, request.path)
+        if not response.is_streamed:
+            self._current.statements = None
+            self._report(name, statements, budget)
+            return response
+
+        # Keep recording until the body has been sent.
+        def checkStreamed():
+            if getattr(self._current, 'statements', None) is statements:
+                self._current.statements = None
+            self._report(name, statements, budget)
+        response.call_on_close(checkStreamed)
+        return response
+
+    def _report(self, name, statements, budget):
+        # Warn of, or raise, the problems with the statements of a request.
+        problems = self.check(statements, budget)
+        if problems:
+            message = '%s: %s' % (name, '; '.join(problems))
+            if self.mode == 'raise':
+                raise QueryProblem(message)
+            warnings.warn(message, QueryWarning)
+
+    def check(self, statements, budget=None):
+        '''
+        Return a list of messages describing what is wrong with the
+        statements run by one request, a list of (SQL, parameters) tuples,
+        given the most the request may run. An empty list means nothing is.
+
+        Args:
+            list statements
+            int budget
+        '''
+        problems = []
+        runs = {}
+        texts = {}
+        for statement in statements:
+            runs[statement] = runs.get(statement, 0) + 1
+            texts[statement[0]] = texts.get(statement[0], 0) + 1
+
+        for (sql, parameters), count in sorted(runs.items()):
+            if count > 1:
+                problems.append('ran %d times with the same parameters %s: '
+                    '%s' % (count, parameters, ' '.join(sql.split())))
+        for sql, count in sorted(texts.items()):
+            if count > self.repeat_limit:
+                problems.append('ran %d times, an N+1 query loop?: %s' % (
+                    count, ' '.join(sql.split())))
+        if budget is not None and len(statements) > budget:
+            problems.append('ran %d statements, over its budget of %d' % (
+                len(statements), budget))
+        return problems
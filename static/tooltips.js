@@ -0,0 +1,4 @@
+// Bootstrap tooltips must be manually initialized.
+$(function() {
+  $('[data-toggle="tooltip"]').tooltip()
+})
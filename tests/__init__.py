@@ -0,0 +1,28 @@
+# The tests of the catalog. Run them from the top directory with:
+#
+#   python -m pytest tests
+#
+# or, without pytest:
+#
+#   python -m unittest discover -s tests -t .
+#
+# They run against a temporary database filled with the menus of
+# lotsofmenus.py, with every request's SQL checked by querycheck.py in raise
+# mode. The environment is set up here, before any test module imports
+# database_setup.py, which connects to the database when imported.
+
+import atexit
+import os
+import shutil
+import tempfile
+
+DATABASE_DIR = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, DATABASE_DIR, True)
+os.environ['CATALOG_DATABASE_URL'] = 'sqlite:///' + os.path.join(
+    DATABASE_DIR, 'restaurantmenu.db')
+os.environ['CATALOG_QUERY_CHECK'] = 'raise'
+
+import database_setup
+from lotsofmenus import bulkLoad, CATALOG
+
+bulkLoad(database_setup.engine, CATALOG)
@@ -0,0 +1,109 @@
+# Test serving the bundles built by assets.py.
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from flask import Flask, request
+
+from assets import Assets, BUNDLE_CACHE_CONTROL
+
+
+CSS = 'body{color:#333}\n' * 100
+FILENAME = 'site.0123456789ab.css'
+
+
+class TestSendBundle(unittest.TestCase):
+
+    def setUp(self):
+        # Build a bundle, its gzipped copy and the manifest in a temporary
+        # directory, and serve them from a throwaway application.
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, FILENAME), 'wb') as f:
+            f.write(CSS)
+        data = StringIO()
+        with gzip.GzipFile(fileobj = data, mode = 'wb') as f:
+            f.write(CSS)
+        with open(os.path.join(self.directory, FILENAME + '.gz'), 'wb') as f:
+            f.write(data.getvalue())
+        manifest = os.path.join(self.directory, 'manifest.json')
+        with open(manifest, 'w') as f:
+            json.dump({'site.css': FILENAME}, f)
+
+        assets = Assets(manifest, self.directory)
+        app = Flask(__name__)
+
+        @app.route('/static/build/<filename>')
+        def staticBundle(filename):
+            return assets.send(filename, request.accept_encodings)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get(self, encoding=None, etag=None):
+        headers = {}
+        if encoding is not None:
+            headers['Accept-Encoding'] = encoding
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        return self.client.get('/static/build/' + FILENAME,
+            headers = headers)
+
+    def test_identity(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, CSS)
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.get_etag(), (FILENAME, False))
+
+    def test_gzip(self):
+        response = self.get('gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertEqual(gzip.GzipFile(fileobj = StringIO(
+            response.data)).read(), CSS)
+        self.assertEqual(response.get_etag(), (FILENAME, True))
+        self.assertIn('Accept-Encoding', response.vary)
+
+    def test_cache_headers(self):
+        # Not Flask's 12 hour default for static files.
+        response = self.get('gzip')
+        self.assertEqual(response.headers['Cache-Control'],
+            BUNDLE_CACHE_CONTROL)
+        self.assertGreater(response.expires.year, response.date.year)
+
+    def test_conditional_get(self):
+        for encoding in (None, 'gzip'):
+            etag = self.get(encoding).headers['ETag']
+            response = self.get(encoding, etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.data, '')
+
+    def test_conditional_get_other_encoding(self):
+        # The copies are the same bundle, so the ETag of one matches them
+        # all.
+        etag = self.get('gzip').headers['ETag']
+        self.assertEqual(self.get(None, etag).status_code, 304)
+        etag = self.get().headers['ETag']
+        self.assertEqual(self.get('gzip', etag).status_code, 304)
+
+    def test_changed(self):
+        response = self.get(None, '"site.ba9876543210.css"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing(self):
+        self.assertEqual(self.client.get(
+            '/static/build/site.ba9876543210.css').status_code, 404)
+        self.assertEqual(self.client.get(
+            '/static/build/manifest.json').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+# Test the database schema and its indexes.
+
+import os
+import unittest
+
+import database_setup
+from database_setup import Base, MenuItem, createEngine, upgradeDatabase, \
+    checkQueryPlans
+
+from tests import DATABASE_DIR
+
+
+class TestQueryPlans(unittest.TestCase):
+
+    def test_hot_queries_use_indexes(self):
+        self.assertEqual(checkQueryPlans(database_setup.engine), [])
+
+    def test_missing_index(self):
+        # Without the indexes on menu_item, the menu queries scan it.
+        engine = createEngine('sqlite:///' + os.path.join(DATABASE_DIR,
+            'noindexes.db'))
+        try:
+            Base.metadata.create_all(engine)
+            upgradeDatabase(engine)
+            for index in MenuItem.__table__.indexes:
+                index.drop(engine)
+            failures = dict(checkQueryPlans(engine))
+            for name in ('showMenu', 'restaurantMenuJSON',
+                    'restaurantMenuJSON by price', 'restaurantMenuBulkJSON'):
+                self.assertTrue([step for step in failures[name]
+                    if step.startswith('SCAN menu_item')])
+            self.assertNotIn('showRestaurants', failures)
+        finally:
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
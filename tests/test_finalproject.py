@@ -0,0 +1,84 @@
+# Test the HTTP behaviour of finalproject.py's JSON API.
+
+import unittest
+
+from werkzeug.datastructures import Headers
+from werkzeug.test import Client
+
+import finalproject
+
+
+class TestConditionalGet(unittest.TestCase):
+
+    def setUp(self):
+        finalproject.app.testing = True
+        self.client = finalproject.app.test_client()
+        # Without a response wrapper, which would add a default
+        # Content-Type, the headers are those sent to the client.
+        self.rawClient = Client(finalproject.app, None)
+
+    def rawGet(self, url, headers):
+        body, status, headers = self.rawClient.get(url, headers = headers,
+            buffered = True)
+        return int(status.split()[0]), Headers(headers), ''.join(body)
+
+    def test_not_modified(self):
+        for url in ('/restaurant/JSON', '/restaurant/1/menu/JSON',
+                '/restaurant/1/menu/courses/JSON'):
+            etag = self.client.get(url).headers['ETag']
+            for encoding in ('identity', 'gzip'):
+                for sent in (etag, 'W/' + etag):
+                    status, headers, body = self.rawGet(url, {
+                        'If-None-Match': sent, 'Accept-Encoding': encoding})
+                    self.assertEqual((status, body), (304, ''), url)
+                    self.assertEqual(headers['ETag'], etag)
+                    self.assertIn('Accept-Encoding', headers['Vary'])
+                    for name in ('Content-Type', 'Content-Length',
+                            'Content-Encoding'):
+                        self.assertNotIn(name, headers)
+
+    def test_not_modified_response(self):
+        # The response itself, as seen by after_request functions, has no
+        # entity headers either.
+        url = '/restaurant/1/menu/JSON'
+        etag = self.client.get(url).headers['ETag']
+        with finalproject.app.test_request_context(url,
+                headers = {'If-None-Match': etag}):
+            response = finalproject.app.full_dispatch_request()
+        self.assertEqual(response.status_code, 304)
+        self.assertIsNone(response.mimetype)
+        self.assertNotIn('Content-Type', response.headers)
+        self.assertNotIn('Content-Length', response.headers)
+
+    def test_other_query_string(self):
+        # The same version of other data is not a match.
+        for url, other in [
+                ('/restaurant/1/menu/JSON?sort=price',
+                    '/restaurant/1/menu/JSON?sort=id'),
+                ('/restaurant/1/menu/JSON?min_price=3',
+                    '/restaurant/1/menu/JSON?min_price=4'),
+                ('/restaurant/JSON?limit=3', '/restaurant/JSON?limit=50'),
+                ('/restaurant/JSON?limit=3', '/restaurant/JSON')]:
+            etag = self.client.get(url).headers['ETag']
+            self.assertEqual(self.client.get(url, headers = {
+                'If-None-Match': etag}).status_code, 304, url)
+            self.assertEqual(self.client.get(other, headers = {
+                'If-None-Match': etag}).status_code, 200, other)
+
+    def test_argument_order(self):
+        etag = self.client.get(
+            '/restaurant/1/menu/JSON?sort=price&min_price=3').headers['ETag']
+        self.assertEqual(self.client.get(
+            '/restaurant/1/menu/JSON?min_price=3&sort=price',
+            headers = {'If-None-Match': etag}).status_code, 304)
+
+    def test_modified(self):
+        status, headers, body = self.rawGet('/restaurant/1/menu/JSON',
+            {'If-None-Match': '"r1-v0"'})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Type'], 'application/json')
+        self.assertIn('MenuItems', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# Test the answers of the event loop JSON server.
+
+import asyncore
+import errno
+import json
+import socket
+import time
+import unittest
+
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+import database_setup
+from jsonserver import answer, JSONConnection, JSONServer, MAX_BODY_SIZE
+
+
+class TestAnswer(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = scoped_session(sessionmaker(
+            bind = database_setup.engine))
+
+    def get(self, url, etag=None):
+        path, _, queryString = url.partition('?')
+        return answer(self.sessions, path, queryString, etag)
+
+    def test_other_query_string(self):
+        for url, other in [
+                ('/restaurant/1/menu/JSON?sort=price',
+                    '/restaurant/1/menu/JSON?sort=id'),
+                ('/restaurant/JSON?limit=3', '/restaurant/JSON?limit=50')]:
+            code, headers, body = self.get(url)
+            self.assertEqual(code, 200)
+            etag = dict(headers)['ETag']
+            self.assertEqual(self.get(url, etag)[0], 304)
+            code, headers, body = self.get(other, etag)
+            self.assertEqual(code, 200, other)
+            self.assertTrue(json.loads(body))
+
+    def test_same_etag_as_finalproject(self):
+        import finalproject
+        client = finalproject.app.test_client()
+        for url in ('/restaurant/JSON?limit=3', '/restaurant/1/menu/JSON',
+                '/restaurant/1/menu/JSON?max_price=8&sort=price'):
+            self.assertEqual(dict(self.get(url)[1])['ETag'],
+                client.get(url).headers['ETag'])
+
+
+class TestRequestBodies(unittest.TestCase):
+    # Bodies are thrown away as they are read, and requests with bodies
+    # longer than MAX_BODY_SIZE are refused without reading them.
+
+    def setUp(self):
+        self.server = JSONServer(('127.0.0.1', 0),
+            str(database_setup.engine.url), workers = 1)
+
+    def tearDown(self):
+        self.server.server_close()
+
+    def exchange(self, data):
+        # Send data on a new connection and return everything received
+        # until the server closes it, running the event loop meanwhile.
+        client = socket.create_connection(self.server.socket.getsockname())
+        client.sendall(data)
+        client.setblocking(False)
+        received = []
+        deadline = time.time() + 5
+        try:
+            while time.time() < deadline:
+                asyncore.loop(timeout = 0.05, use_poll = True,
+                    map = self.server.map, count = 1)
+                self.assertTrue(all(not connection.incoming
+                    for connection in self.server.map.values()
+                    if isinstance(connection, JSONConnection) and
+                    connection.reading is not None))
+                try:
+                    chunk = client.recv(65536)
+                except socket.error as e:
+                    if e.errno == errno.EAGAIN:
+                        continue
+                    break
+                if not chunk:
+                    break
+                received.append(chunk)
+        finally:
+            client.close()
+        return ''.join(received)
+
+    def test_too_large(self):
+        received = self.exchange('POST /restaurant/JSON HTTP/1.1\r\n'
+            'Content-Length: %d\r\n\r\n' % (MAX_BODY_SIZE + 1) + 'x' * 1000)
+        self.assertTrue(received.startswith('HTTP/1.1 413 '), received)
+        self.assertIn('Connection: close', received)
+
+    def test_body_skipped(self):
+        received = self.exchange('POST /restaurant/JSON HTTP/1.1\r\n'
+            'Content-Length: %d\r\n\r\n' % MAX_BODY_SIZE +
+            'x' * MAX_BODY_SIZE +
+            'GET /nowhere HTTP/1.1\r\nConnection: close\r\n\r\n')
+        self.assertTrue(received.startswith('HTTP/1.1 405 '), received)
+        self.assertIn('HTTP/1.1 404 ', received)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# Test loading restaurants and menus in bulk.
+
+import os
+import unittest
+
+from sqlalchemy.orm import sessionmaker
+
+from database_setup import Base, Restaurant, createEngine
+from lotsofmenus import bulkLoad
+from queries import catalogVersion, GLOBAL_VERSION
+
+from tests import DATABASE_DIR
+
+
+MENU = [{'name': 'Soup', 'description': 'Hot', 'price': '$3.50',
+    'course': 'Appetizer'}]
+
+
+class TestBulkLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = createEngine('sqlite:///' + os.path.join(DATABASE_DIR,
+            'bulkload.db'))
+        Base.metadata.drop_all(self.engine)
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind = self.engine)()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def versions(self, *restaurant_ids):
+        return [catalogVersion(self.session, restaurant_id)
+            for restaurant_id in restaurant_ids]
+
+    def test_versions(self):
+        bulkLoad(self.engine, [('One', MENU), ('Two', []), ('Three', MENU)],
+            batch_size = 2)
+        self.assertEqual(self.versions(1, 2, 3), [1, 1, 1])
+        self.assertEqual(self.versions(GLOBAL_VERSION), [2])
+
+    def test_reused_id(self):
+        # The id of the deleted last restaurant is given to the next one
+        # loaded, whose ETag must not be the one the deleted had.
+        bulkLoad(self.engine, [('One', MENU), ('Two', MENU)])
+        self.session.query(Restaurant).filter_by(id = 2).delete()
+        self.session.commit()
+        bulkLoad(self.engine, [('New Two', MENU)])
+        self.assertEqual(self.session.query(Restaurant.name).filter_by(
+            id = 2).scalar(), 'New Two')
+        self.assertEqual(self.versions(1, 2, GLOBAL_VERSION), [1, 2, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
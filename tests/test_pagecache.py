@@ -0,0 +1,99 @@
+# Test the page cache, alone and as used by finalproject.py.
+
+import gzip
+import unittest
+from StringIO import StringIO
+
+from sqlalchemy.orm import sessionmaker
+
+from database_setup import Restaurant, DATABASE_URL, createEngine
+from pagecache import PageCache
+from queries import bumpVersions, GLOBAL_VERSION
+
+
+class TestPageCache(unittest.TestCase):
+
+    def test_versions(self):
+        cache = PageCache()
+        cache.set(('showMenu', 1, ''), 'page', version = 3)
+        self.assertEqual(cache.get(('showMenu', 1, ''), 3), 'page')
+        self.assertIsNone(cache.get(('showMenu', 1, ''), 4))
+        # Dropped, so not served again even for its own version.
+        self.assertIsNone(cache.get(('showMenu', 1, ''), 3))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['stale'],
+            stats['entries'], stats['bytes']), (1, 2, 1, 0, 0))
+
+    def test_invalidate(self):
+        cache = PageCache()
+        cache.set(('showMenu', 1, ''), 'one')
+        cache.set(('showMenu', 2, ''), 'two')
+        token = cache.token()
+        cache.invalidate('showMenu', 1)
+        self.assertIsNone(cache.get(('showMenu', 1, '')))
+        self.assertEqual(cache.get(('showMenu', 2, '')), 'two')
+        # Rendered before the invalidation, so not cached.
+        cache.set(('showMenu', 1, ''), 'old', token)
+        self.assertIsNone(cache.get(('showMenu', 1, '')))
+
+    def test_evictions(self):
+        cache = PageCache(max_entries = 2)
+        for restaurant_id in range(3):
+            cache.set(('showMenu', restaurant_id, ''), 'page')
+        self.assertIsNone(cache.get(('showMenu', 0, '')))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+
+class TestCachedPages(unittest.TestCase):
+
+    def setUp(self):
+        import finalproject
+        self.pageCache = finalproject.pageCache
+        self.pageCache.clear()
+        self.client = finalproject.app.test_client()
+
+    def rename(self, restaurant_id, name):
+        # Rename a restaurant as another process would, with its own
+        # connection, leaving this process's cache alone.
+        engine = createEngine(DATABASE_URL)
+        session = sessionmaker(bind = engine)()
+        try:
+            session.query(Restaurant).filter_by(id = restaurant_id).update(
+                {Restaurant.name: name})
+            bumpVersions(session, restaurant_id, GLOBAL_VERSION)
+            session.commit()
+        finally:
+            session.close()
+            engine.dispose()
+
+    def getPage(self, url, encoding):
+        # Return the page at url, as sent to a client accepting encoding.
+        response = self.client.get(url,
+            headers = {'Accept-Encoding': encoding})
+        self.assertEqual(response.status_code, 200)
+        if response.headers.get('Content-Encoding') == 'gzip':
+            return gzip.GzipFile(fileobj = StringIO(
+                response.get_data())).read()
+        return response.get_data()
+
+    def test_change_by_other_process(self):
+        urls = ('/restaurant/1/', '/restaurant/')
+        for url in urls:
+            for encoding in ('identity', 'gzip'):
+                self.getPage(url, encoding)
+                self.assertIn('Urban Burger', self.getPage(url, encoding))
+        self.assertEqual(self.pageCache.stats()['stale'], 0)
+
+        self.rename(1, 'Renamed Burger')
+        try:
+            for url in urls:
+                for encoding in ('identity', 'gzip'):
+                    self.assertIn('Renamed Burger',
+                        self.getPage(url, encoding))
+            self.assertGreater(self.pageCache.stats()['stale'], 0)
+        finally:
+            self.rename(1, 'Urban Burger')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# Test the data access functions shared by the Flask applications.
+
+import base64
+import json
+import unittest
+
+import database_setup
+from database_setup import recordStatements
+from queries import loadRestaurantMenu, loadCourseMenu, encodeCursor, \
+    decodeCursor
+
+
+class TestMenuQueries(unittest.TestCase):
+    # Each menu page must be read with exactly one SELECT, however many
+    # items or courses the menu has, and however they are then used.
+
+    def countSelects(self, function):
+        # Return the result of function(session) and the SELECTs it ran.
+        result = []
+        statements = recordStatements(database_setup.engine,
+            lambda session: result.append(function(session)))
+        return result[0], statements
+
+    def test_load_restaurant_menu(self):
+        def load(session):
+            restaurant = loadRestaurantMenu(session, 1)
+            return [(item.name, item.price, item.restaurant.name)
+                for item in restaurant.menu_items]
+        items, statements = self.countSelects(load)
+        self.assertGreater(len(items), 1)
+        self.assertEqual(len(statements), 1, statements)
+
+    def test_load_restaurant_menu_by_price(self):
+        def load(session):
+            restaurant = loadRestaurantMenu(session, 1, min_cents = 300,
+                max_cents = 800, sort = 'price')
+            return [item.price_cents for item in restaurant.menu_items]
+        prices, statements = self.countSelects(load)
+        self.assertEqual(prices, sorted(prices))
+        self.assertTrue(all(300 <= price <= 800 for price in prices))
+        self.assertEqual(len(statements), 1, statements)
+
+    def test_load_course_menu(self):
+        def load(session):
+            restaurant, courses = loadCourseMenu(session, 1)
+            return restaurant.name, [(course['course'], course['count'],
+                [item.name for item in course['items']])
+                for course in courses]
+        (name, courses), statements = self.countSelects(load)
+        self.assertGreater(len(courses), 1)
+        for course, count, items in courses:
+            self.assertEqual(count, len(items))
+        self.assertEqual(len(statements), 1, statements)
+
+    def test_empty_menu(self):
+        # A restaurant without items is still read with one SELECT.
+        session = database_setup.Session(bind = database_setup.engine)
+        try:
+            restaurant = database_setup.Restaurant(name = 'Empty Diner')
+            session.add(restaurant)
+            session.commit()
+            restaurant_id = restaurant.id
+        finally:
+            session.close()
+
+        try:
+            (restaurant, courses), statements = self.countSelects(
+                lambda session: loadCourseMenu(session, restaurant_id))
+            self.assertEqual((restaurant.name, courses), ('Empty Diner', []))
+            self.assertEqual(len(statements), 1, statements)
+            menu, statements = self.countSelects(lambda session:
+                loadRestaurantMenu(session, restaurant_id).menu_items)
+            self.assertEqual((menu, len(statements)), ([], 1))
+        finally:
+            database_setup.engine.execute(
+                database_setup.Restaurant.__table__.delete().where(
+                database_setup.Restaurant.id == restaurant_id))
+
+
+class TestCursor(unittest.TestCase):
+    # A cursor comes from the query string, so anything that is not a
+    # (name, id) pair made by encodeCursor() must raise ValueError.
+
+    def cursor(self, position):
+        # Encode position the same way encodeCursor() does.
+        return base64.urlsafe_b64encode(json.dumps(position)).rstrip('=')
+
+    def test_round_trip(self):
+        restaurant = database_setup.Restaurant(id = 7, name = u'Caf\xe9')
+        self.assertEqual(decodeCursor(encodeCursor(restaurant)),
+            (u'Caf\xe9', 7))
+
+    def test_malformed(self):
+        for cursor in ['', 'not base64!', self.cursor('name'),
+                self.cursor(['a', True]), self.cursor([[1], 1]),
+                self.cursor(['a', 1.5]), self.cursor(['a', '1']),
+                self.cursor([None, 1]), self.cursor(['a', 1, 2])]:
+            self.assertRaises(ValueError, decodeCursor, cursor)
+
+
+if __name__ == '__main__':
+    unittest.main()
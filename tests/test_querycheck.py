@@ -0,0 +1,143 @@
+# Test the detection of requests that run too many SQL statements.
+
+import json
+import unittest
+
+from flask import Flask, Response, jsonify, stream_with_context
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+import database_setup
+from database_setup import Restaurant
+from querycheck import QueryDetector, QueryProblem, queryBudget
+from queries import loadRestaurantMenu
+
+
+def createApp():
+    # Return a throwaway application with views that read menus well and
+    # badly, checked in raise mode.
+    app = Flask(__name__)
+    app.testing = True
+    session = scoped_session(sessionmaker(bind = database_setup.engine))
+    QueryDetector('raise').instrument(app, [database_setup.engine])
+
+    @app.teardown_request
+    def removeSession(exception=None):
+        session.remove()
+
+    @app.route('/menu/<int:restaurant_id>/')
+    @queryBudget(1)
+    def menu(restaurant_id):
+        restaurant = loadRestaurantMenu(session, restaurant_id)
+        return jsonify(MenuItems=[item.name for item in
+            restaurant.menu_items])
+
+    @app.route('/menus/')
+    def menus():
+        # Loads the menu of each restaurant with a query of its own.
+        return jsonify(Menus=[[item.name for item in restaurant.menu_items]
+            for restaurant in session.query(Restaurant)])
+
+    @app.route('/menus/stream/')
+    def streamMenus():
+        # The same N+1 query loop, run while the response is sent.
+        def generate():
+            for restaurant in session.query(Restaurant).all():
+                yield json.dumps([item.name for item in
+                    restaurant.menu_items]) + '\n'
+        return Response(stream_with_context(generate()),
+            mimetype = 'text/plain')
+
+    @app.route('/restaurants/stream/')
+    @queryBudget(1)
+    def streamRestaurants():
+        def generate():
+            for restaurant in session.query(Restaurant).all():
+                yield restaurant.name + '\n'
+        return Response(stream_with_context(generate()),
+            mimetype = 'text/plain')
+
+    @app.route('/restaurants/twice/')
+    @queryBudget(1)
+    def restaurantsTwice():
+        # Within the budget until the response is sent.
+        def generate():
+            for restaurant in session.query(Restaurant).all():
+                yield restaurant.name + '\n'
+        session.query(Restaurant.id).first()
+        return Response(stream_with_context(generate()),
+            mimetype = 'text/plain')
+
+    return app
+
+
+class TestQueryDetector(unittest.TestCase):
+
+    def setUp(self):
+        self.client = createApp().test_client()
+
+    def get(self, url):
+        # Read and close the whole response, so streamed ones are checked.
+        return self.client.get(url, buffered = True)
+
+    def test_one_query(self):
+        response = self.get('/menu/1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.data)['MenuItems'])
+
+    def test_n_plus_one(self):
+        with self.assertRaises(QueryProblem) as raised:
+            self.get('/menus/')
+        self.assertIn('N+1 query loop', str(raised.exception))
+
+    def test_streamed_n_plus_one(self):
+        with self.assertRaises(QueryProblem) as raised:
+            self.get('/menus/stream/')
+        self.assertIn('GET /menus/stream/', str(raised.exception))
+        self.assertIn('N+1 query loop', str(raised.exception))
+
+    def test_streamed_within_budget(self):
+        response = self.get('/restaurants/stream/')
+        self.assertIn('Urban Burger', response.data)
+
+    def test_streamed_over_budget(self):
+        with self.assertRaises(QueryProblem) as raised:
+            self.get('/restaurants/twice/')
+        self.assertIn('over its budget of 1', str(raised.exception))
+
+
+class TestFinalProjectQueries(unittest.TestCase):
+    # The pages and JSON API of finalproject.py, run in raise mode, stay
+    # within their budgets and run no N+1 query loops.
+
+    URLS = [
+        '/',
+        '/restaurant/?limit=2',
+        '/restaurant/1/',
+        '/restaurant/JSON',
+        '/restaurant/1/menu/JSON',
+        '/restaurant/1/menu/JSON?stream=1',
+        '/restaurant/1/menu/JSON?sort=price&min_price=3&max_price=8',
+        '/restaurant/1/menu/courses/JSON',
+        '/restaurant/1/menu/1/JSON',
+        '/restaurant/1/menu/bulk/JSON',
+        '/search/JSON?q=burger',
+        '/restaurant/1/new/',
+        '/restaurant/1/1/edit/',
+    ]
+
+    def setUp(self):
+        import finalproject
+        # Pass a QueryProblem on to the test rather than answering 500.
+        finalproject.app.testing = True
+        self.client = finalproject.app.test_client()
+
+    def test_views(self):
+        for url in self.URLS:
+            for encoding in ('identity', 'gzip'):
+                response = self.client.get(url, buffered = True,
+                    headers = {'Accept-Encoding': encoding})
+                self.assertIn(response.status_code, (200, 501), url)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# Test the route table and worker threads of webserver.py.
+
+import httplib
+import socket
+import threading
+import time
+import unittest
+
+import webserver
+from webserver import compileRoutes, matchRoute, ThreadPoolHTTPServer, \
+    webServerHandler
+
+
+class TestRoutes(unittest.TestCase):
+
+    def test_match(self):
+        for path, handler, arguments in [
+                ('/restaurants', 'listRestaurants', {}),
+                ('/restaurants/?limit=5', 'listRestaurants', {}),
+                ('/restaurants/new', 'newRestaurantForm', {}),
+                ('/restaurants/12/edit', 'editRestaurantForm',
+                    {'restaurant_id': 12}),
+                ('/restaurants/12/delete/?x=1', 'deleteRestaurantForm',
+                    {'restaurant_id': 12})]:
+            handlers, ids = matchRoute(path)
+            self.assertEqual((handlers['GET'], ids), (handler, arguments))
+
+    def test_no_match(self):
+        for path in ('/', '/restaurants//edit', '/restaurants/1a/edit',
+                '/restaurants2/1/edit', '/restaurants/1/edit2',
+                '/restaurants/12', '/restaurants1', '/no/such/page'):
+            self.assertIsNone(matchRoute(path), path)
+
+    def test_arguments(self):
+        routes = compileRoutes([('/a/<int:x>/b/<int:y>', 'ab')])
+        saved, webserver.ROUTE_SHAPES = webserver.ROUTE_SHAPES, routes
+        try:
+            self.assertEqual(matchRoute('/a/12/b/3/'),
+                ('ab', {'x': 12, 'y': 3}))
+            self.assertIsNone(matchRoute('/a/1/b2/3'))
+            self.assertIsNone(matchRoute('/a/1/b/'))
+        finally:
+            webserver.ROUTE_SHAPES = saved
+
+    def test_digits_in_pattern(self):
+        with self.assertRaises(ValueError):
+            compileRoutes([('/v2/restaurants', {})])
+
+
+class TestKeepAlive(unittest.TestCase):
+    # Idle keep-alive clients must not hold every worker thread while a new
+    # client waits.
+
+    workers = 2
+
+    def setUp(self):
+        self.server = ThreadPoolHTTPServer(('127.0.0.1', 0), webServerHandler,
+            workers = self.workers)
+        self.address = self.server.server_address
+        thread = threading.Thread(target = self.server.serve_forever,
+            kwargs = {'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_idle_clients(self):
+        # One more idle client than there are workers, each of which has
+        # sent a request and then kept its connection open.
+        for i in range(self.workers + 1):
+            client = socket.create_connection(self.address)
+            client.sendall('GET /restaurants/new HTTP/1.1\r\n'
+                'Host: localhost\r\n\r\n')
+            self.clients.append(client)
+
+        start = time.time()
+        connection = httplib.HTTPConnection(*self.address, timeout = 10)
+        try:
+            connection.request('GET', '/restaurants/new')
+            response = connection.getresponse()
+            response.read()
+        finally:
+            connection.close()
+        self.assertEqual(response.status, 200)
+        self.assertLess(time.time() - start, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
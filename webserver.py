@@ -25,19 +25,31 @@
 from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 # https://docs.python.org/2/library/cgi.html
 import cgi
+# Command line options, and the worker threads of ThreadPoolHTTPServer.
+import argparse
+import Queue
+import re
+import string
+import threading
+import timeit
+from cStringIO import StringIO
 # Database ORM and engine:
 from sqlalchemy import Column, ForeignKey, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 # http://docs.sqlalchemy.org/en/latest/orm/internals.html
-from sqlalchemy.orm import relationship, sessionmaker
-from sqlalchemy import create_engine, desc
+from sqlalchemy.orm import relationship, scoped_session, sessionmaker
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy import desc
 # From our existing database:
-from database_setup import Base, Restaurant, MenuItem
+from database_setup import Base, Restaurant, MenuItem, createEngine
+# Keep the ETags served by finalproject.py in step with our changes.
+from queries import bumpVersions, GLOBAL_VERSION
 
 
 # Database connection code needs to run first:
 # Specify which database engine to communicate with and which database file.
-engine = create_engine('sqlite:///restaurantmenu.db')
+# The engine keeps a pool of connections shared by all requests.
+engine = createEngine()
 
 # Bind the engine to the metadata of the Base class so that the
 # declaratives can be accessed through a DBSession instance
@@ -45,7 +57,9 @@ Base.metadata.bind = engine
 
 # Create a sessionmaker object to establish a link of communications between
 # our code executions and the engine object created in the previous statement.
-DBSession = sessionmaker(bind = engine)
+# Wrap it in scoped_session() so that each thread, and so each request, gets
+# a session of its own.
+DBSession = scoped_session(sessionmaker(bind = engine))
 
 # A DBSession() instance establishes all conversations with the database
 # and represents a "staging zone" for all the objects loaded into the
@@ -53,280 +67,603 @@ DBSession = sessionmaker(bind = engine)
 # session won't be persisted into the database until you call
 # session.commit(). If you're not happy about the changes, you can
 # revert all of them back to the last commit by calling
-# session.rollback()
-session = DBSession()
+# session.rollback(). session stands in for the current request's
+# DBSession(), which is removed when the request ends; see
+# webServerHandler.handle_one_request().
+session = DBSession
+
+# The number of restaurants fetched from the database per round trip while
+# the list of restaurants is streamed to the client.
+RESTAURANT_BATCH_SIZE = 500
+
+# The number of bytes of HTML gathered before they are sent as one chunk.
+CHUNK_SIZE = 16384
+
+
+class ChunkedWriter(object):
+    '''
+    Buffers the HTML of a page and sends it to the client in chunks of about
+    CHUNK_SIZE bytes as it is written, using HTTP/1.1 chunked transfer
+    encoding, so that the page needn't be held in memory or measured before
+    its first bytes are sent. For HTTP/1.0 clients, which don't understand
+    chunked encoding, the bytes are sent as they are and the end of the page
+    is marked by closing the connection.
+    '''
+
+    def __init__(self, wfile, chunked=True, size=CHUNK_SIZE):
+        self.wfile = wfile
+        self.chunked = chunked
+        self.size = size
+        self.buffer = []
+        self.buffered = 0
+
+    def write(self, text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.size:
+            self.flush()
+
+    def flush(self):
+        # Send what has been written so far as one chunk.
+        if not self.buffered:
+            return
+        data = ''.join(self.buffer)
+        if self.chunked:
+            data = '%x\r\n%s\r\n' % (len(data), data)
+        self.wfile.write(data)
+        self.buffer = []
+        self.buffered = 0
+
+    def close(self):
+        # Send the rest of the page, and the empty chunk that ends it.
+        self.flush()
+        if self.chunked:
+            self.wfile.write('0\r\n\r\n')
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    '''
+    An HTTPServer that answers many clients at once, using a fixed number of
+    worker threads. The main thread accepts connections and queues them for
+    the workers; once every worker is busy and the queue is full, new
+    connections wait in the listening socket's accept backlog.
+    '''
+
+    def __init__(self, server_address, RequestHandlerClass, workers=16,
+            backlog=128):
+        # The size of the accept backlog, passed to listen() by
+        # HTTPServer.__init__().
+        self.request_queue_size = backlog
+        HTTPServer.__init__(self, server_address, RequestHandlerClass)
+        self.connections = Queue.Queue(workers)
+        self.workers = []
+        for i in range(workers):
+            worker = threading.Thread(target = self.work)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def process_request(self, request, client_address):
+        # Called by the main thread for each accepted connection.
+        self.connections.put((request, client_address))
+
+    def work(self):
+        # Answer queued connections until server_close() queues a None.
+        while True:
+            connection = self.connections.get()
+            if connection is None:
+                return
+            request, client_address = connection
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        for worker in self.workers:
+            self.connections.put(None)
 
 
 class webServerHandler(BaseHTTPRequestHandler):
 
-    def do_GET(self):
+    # Speak HTTP/1.1, so that clients can send many requests over one
+    # connection. Every response must then carry a Content-Length header.
+    protocol_version = 'HTTP/1.1'
+
+    # Close connections left idle for this many seconds. A worker waiting
+    # for the next request of a keep-alive client answers nobody else, so
+    # keep the wait short.
+    timeout = 2
+
+    def end_headers(self):
+        # While other connections wait for a worker, close this one after
+        # its response rather than wait for its next request.
+        connections = getattr(self.server, 'connections', None)
+        if not self.close_connection and connections is not None and \
+                not connections.empty():
+            self.send_header('Connection', 'close')
+        BaseHTTPRequestHandler.end_headers(self)
+
+    def sendPage(self, output, code=200):
+        # Send a complete HTML response, with its Content-Length.
+        if isinstance(output, unicode):
+            output = output.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(output)))
+        self.end_headers()
+        self.wfile.write(output)
+
+    def sendRedirect(self, location):
+        # Send a redirect, with an empty body, to another page.
+        self.send_response(301)
+        self.send_header('Content-type', 'text/html')
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def readForm(self):
+        # Read the whole request body, so that the next request on the
+        # connection starts at the right place, and return the form fields
+        # in it as a dictionary of lists of values.
+        length = int(self.headers.getheader('content-length') or 0)
+        body = self.rfile.read(length)
+        ctype, pdict = cgi.parse_header(
+            self.headers.getheader('content-type') or '')
+        if ctype == 'multipart/form-data':
+            return cgi.parse_multipart(StringIO(body), pdict)
+        return cgi.parse_qs(body)
+
+    def handle_one_request(self):
+        # Answer one request, then discard its database session, rolling back
+        # anything it left uncommitted, so the next request starts afresh.
         try:
-            # From the BaseHTTPServer.BaseHTTPRequestHandler class, path is an
-            # instance variable containing the request path.
-            #
-            # Inherited from the sqlalchemy.sql.operators.ColumnOperators class,
-            # the endswith() method, in a column context, produces the SQL 
-            # clause LIKE '%whatever>'.
-            if self.path.endswith("/restaurants"):
-                # Call the method that uses SQLalchemy to do the query.
-                restaurant_list = queryAllRestaurants()
-
-                # Answer the HTTP GET with HTTP headers.
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-
-                # Finish answering the HTTP GET with HTML.
-                output = ""
-                output += "<html><body>"
-
-                # Objective 3 Step 1 - Create a Link to create a new menu item
-                output += "<a href = '/restaurants/new' > Make a New Restaurant Here </a></br></br>"
-                output += "<h4><ul>"
-
-                # Iterate through the object. Output unordered HTML list of names
-                for restaurant in restaurant_list:
-                    output += "<li>"
-                    output += restaurant.name
-                    output += "&nbsp;&nbsp;"
-                    output += "<small>"
-                    output += "<a href='/restaurants/%s/edit'>Edit</a>" % restaurant.id
-                    output += "&nbsp;&nbsp;"
-                    output += "<a href='/restaurants/%s/delete'>Delete</a>" % restaurant.id
-                    output += "</small>"
-                    output += "</li>"
-                output += "</ul></h4>"
-                output += "</body></html>"
-
-                # From the BaseHTTPServer.BaseHTTPRequestHandler() class, wfile
-                # is an instance variable that contains the output stream for 
-                # writing a response back to the client. Proper adherence to the
-                # HTTP protocol must be used when writing to this stream.
-                #
-                # We're calling the write() file object method to write a string
-                # to the wfile file. There is no return value. Due to buffering,
-                # the string may not actually show up in the file until the 
-                # flush() or close() method is called. See
-                # https://docs.python.org/2/library/stdtypes.html#file-objects
-                self.wfile.write(output)
-                return
+            BaseHTTPRequestHandler.handle_one_request(self)
+        finally:
+            DBSession.remove()
+
+    def dispatch(self, method):
+        # Find the handler for this request's method and path in the route
+        # table, and call it with the ids parsed from the path.
+        route = matchRoute(self.path)
+        if route is None:
+            # No page matched the path. Send the error with Connection:
+            # close, since it has no Content-Length.
+            self.send_error(404, 'File Not Found: %s' % self.path)
+            return
+        handlers, arguments = route
 
-            # Create a handler for the Edit page.
-            if self.path.endswith("/edit"):
-                # Grab the id number of the link they clicked. It is the third
-                # element of an indexed array created from the path.
-                restaurantIDPath = self.path.split("/")[2]
-
-                # Use SQLalchemy to query the id column of the Restaurant table
-                # and set a variable to that value.
-                myRestaurantQuery = session.query(Restaurant).filter_by(id = restaurantIDPath).one()
-                # If the query returned a value
-                if myRestaurantQuery != [] :
-                    # Send the response headers and HTML.
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/html')
-                    self.end_headers()
-                    output = "<html><body>"
-                    output += "<h2>"
-                    output += myRestaurantQuery.name
-                    output += "</h2>"
-                    # Create a POST url link containing the restaurant id.
-                    # We define a do_POST handler for it below.
-                    output += "<form method='POST' enctype='multipart/form-data' action = '/restaurants/%s/edit' >" % restaurantIDPath
-
-                    # newRestaurantName will contain the user input. The HTML
-                    # placholder attribute is a short hint that is displayed in 
-                    # the input field before the user enters a value. Set it to
-                    # the current name of the restaurant.
-                    output += "<input name = 'newRestaurantName' type='text' placeholder = '%s' >" % myRestaurantQuery.name
-                    output += "<input type = 'submit' value = 'Rename'>"
-                    output += "</form>"
-                    output += "</body></html>"
-
-                    # Send it all to the client
-                    self.wfile.write(output)
-
-            # A confirmation page for deletions
-            if self.path.endswith("/delete"):
-                # Grab the restaurant ID from the URL they clicked.
-                restaurantIDPath = self.path.split("/")[2]
-
-                # Use SQLalchemy to query for that restaurant ID.
-                myRestaurantQuery = session.query(Restaurant).filter_by(id = restaurantIDPath).one()
-
-                # If the query returned data, send HTTP headers and HTML.
-                if myRestaurantQuery:
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/html')
-                    self.end_headers()
-                    output = ""
-                    output += "<html><body>"
-                    # Output the restaurant name we retrieved.
-                    output += "<h1>Are you sure you want to delete %s?" % myRestaurantQuery.name
-                    # Make the form POST URL contain the ID in the path.
-                    output += "<form method='POST' enctype = 'multipart/form-data' action = '/restaurants/%s/delete'>" % restaurantIDPath
-                    output += "<input type = 'submit' value = 'Delete'>"
-                    output += "</form>"
-                    output += "</body></html>"
-                    # Output the headers and HTML to the client.
-                    self.wfile.write(output)
-
-
-            # Objective 3 Step 2 - Create /restarants/new page
-            # Create a page for adding new restaurants to the database.
-            # path.endswith() is explained in previous comments.
-            if self.path.endswith("/restaurants/new"):
-                # See the previous if() block for additional relevant comments.
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                output = ""
-                output += "<html><body>"
-                output += "<h2>Make a New Restaurant</h2>"
-
-                # Our do_GET handler for /restaurants/new/ needs to send HTML 
-                # for a link to a POST at the same address, which will be 
-                # handled in do_POST, below.
-                output += "<form method = 'POST' enctype='multipart/form-data'  action = '/restaurants/new'>"
-
-                # newRestaurantName contains the user input our POST will need.
-                output += "<input name = 'newRestaurantName' type = 'text' placeholder = 'New Restaurant Name' > "
-                output += "<input type='submit' value='Create'>"
-                output += "</form></body></html>"
-                self.wfile.write(output)
-                return
+        if method not in handlers:
+            self.sendMethodNotAllowed(sorted(handlers))
+            return
+
+        try:
+            getattr(self, handlers[method])(**arguments)
 
         # IOError is an exception type external to Python, from the 
         # EnvironmentError class. Raised when an I/O operation (such as a print 
         # statement, the built-in open() function or a method of a file object) 
         # fails for an I/O-related reason, e.g., "file not found" or "disk full".
         # https://docs.python.org/2/library/exceptions.html#exceptions.IOError.
-        except IOError:
+        # NoResultFound is raised by SQLalchemy's one() when there is no
+        # restaurant with the id in the path.
+        except (IOError, NoResultFound):
             # From the BaseHTTPRequestHandler class, the send_error() method
             # sends and logs a complete error reply to the client. The HTTP 
             # error code is mandatory; the message is optional.
             self.send_error(404, 'File Not Found: %s' % self.path)
+        except Exception:
+            # Answer rather than leave a keep-alive client waiting. The
+            # request's session is rolled back by handle_one_request().
+            self.send_error(500)
+
+    def sendMethodNotAllowed(self, allowed):
+        # Tell the client which methods the path does answer. Close the
+        # connection, since the request's body, if any, was not read.
+        output = "<html><body>Method Not Allowed</body></html>"
+        self.send_response(405)
+        self.send_header('Allow', ', '.join(allowed))
+        self.send_header('Connection', 'close')
+        self.send_header('Content-type', 'text/html')
+        self.send_header('Content-Length', str(len(output)))
+        self.end_headers()
+        self.wfile.write(output)
+
+    def do_GET(self):
+        # From the BaseHTTPServer.BaseHTTPRequestHandler class, path is an
+        # instance variable containing the request path. See ROUTES.
+        self.dispatch('GET')
 
     # Objective 3 Step 3- Make POST method
     def do_POST(self):
+        self.dispatch('POST')
+
+    # Answer the other methods with a 405 and the methods the path does
+    # answer, rather than BaseHTTPRequestHandler's 501.
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def do_OPTIONS(self):
+        self.dispatch('OPTIONS')
+
+    def listRestaurants(self):
+        # Answer GETs to /restaurants with a list of all restaurants.
+        # Send the HTTP headers first. The length of the page isn't known
+        # until it has all been written, so send it in chunks instead; see
+        # ChunkedWriter.
+        chunked = self.request_version != 'HTTP/1.0'
+        self.send_response(200)
+        self.send_header('Content-type', 'text/html; charset=utf-8')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+
+        # From the BaseHTTPServer.BaseHTTPRequestHandler() class, wfile
+        # is an instance variable that contains the output stream for 
+        # writing a response back to the client. Proper adherence to the
+        # HTTP protocol must be used when writing to this stream.
+        output = ChunkedWriter(self.wfile, chunked)
+
+        # Answer the HTTP GET with HTML.
+        output.write("<html><body>")
+
+        # Objective 3 Step 1 - Create a Link to create a new menu item
+        output.write("<a href = '/restaurants/new' > Make a New Restaurant Here </a></br></br>")
+        output.write("<h4><ul>")
+
         try:
-            # Handle POSTS to the restaurants/delete URL.
-            if self.path.endswith("/delete"):
-                # Grad the id from the inbound URL.
-                restaurantIDPath = self.path.split("/")[2]
-
-                # SQLalchemy query to grab that restaurant's ID from the DB.
-                myRestaurantQuery = session.query(Restaurant).filter_by(id = restaurantIDPath).one()
-
-                # If the query returned data, output HTTP redirect to home page. 
-                if myRestaurantQuery:
-                    # SQLalchemy query to delete the restaurant by ID.
-                    session.delete(myRestaurantQuery)
-                    # Write to the database.
-                    session.commit()
-                    self.send_response(301)
-                    self.send_header('Content-type', 'text/html')
-                    self.send_header('Location', '/restaurants')
-                    self.end_headers()
-
-            # Handle POSTs to the restaurants/new URL.
-            if self.path.endswith("/restaurants/new"):
-                # cgi.parse_header() Parse a MIME header (such as Content-Type) 
-                # into a main value and a dictionary of parameters.
-                # Here ctype means Content-Type, not to be confused with ctypes,
-                # and pdict is a dictionary of parameters.
-                ctype, pdict = cgi.parse_header(
-                    # The headers object is an instance variable of the 
-                    # BaseHTTPRequestHandler class.
-                    # The getheaders() method seems to come from the 
-                    # httplib.HTTPResponse class. If so, I can't find how 
-                    # it is inherited. 
-                    # https://docs.python.org/2/library/httplib.html
-                    self.headers.getheader('content-type'))
-
-                # If the content-type header is multipart/form-data,
-                if ctype == 'multipart/form-data':
-                    # The arguments to cgi.parse_multipart(): rfile is the input
-                    # file; pdict is a dictionary containing other parameters in
-                    # the Content-Type header.
-                    #
-                    # The fields object will be a dictionary. The keys are the 
-                    # field names. Each value is a list of values for that field.
-                    fields = cgi.parse_multipart(self.rfile, pdict)
-
-                    # Grab the user input from the HTML form. Call the built-in
-                    # dictionary function get(). It will return the value for 
-                    # the 'newRestaurantName' key if it is in the dictionary.
-                    # messagecontent will be a list containing one item.
-                    messagecontent = fields.get('newRestaurantName')
-
-                    # Create new Restaurant Object w/ SQLalchemy
-                    # Set name to the value of the first/only item in the list.
-                    newRestaurant = Restaurant(name=messagecontent[0])
-                    
-                    # Stage the new object.
-                    session.add(newRestaurant)
-                    # Write it to the restaurantmenu.db database, as defined in 
-                    # the database_setup.Restaurant class. Specifically, create
-                    # a new row in the Restaurant table, writing the value of 
-                    # messagecontent[0] to the name column.
-                    session.commit()
-
-                    # Send the response headers, redirecting the client back to
-                    # the page listing all restaurants.
-                    self.send_response(301)
-                    self.send_header('Content-type', 'text/html')
-                    self.send_header('Location', '/restaurants')
-                    self.end_headers()
-
-            # Create a handler for POSTs to /restaurants/edit.
-            # Similar code is commented above.
-            if self.path.endswith("/edit"):
-                ctype, pdict = cgi.parse_header(self.headers.getheader('content-type'))
-                if ctype == 'multipart/form-data':
-                    fields = cgi.parse_multipart(self.rfile, pdict)
-                messagecontent = fields.get('newRestaurantName')
-                restaurantIDPath = self.path.split("/")[2]
-
-                myRestaurantQuery = session.query(Restaurant).filter_by(id = restaurantIDPath).one()
-
-                if myRestaurantQuery != [] :
-                    myRestaurantQuery.name = messagecontent[0]
-                    # SQLalchemy query to INSERT newRestaurantName into DB.
-                    session.add(myRestaurantQuery)
-                    # Write to the database.
-                    session.commit()
-                    self.send_response(301)
-                    self.send_header('Content-type', 'text/html')
-                    self.send_header('Location', '/restaurants')
-                    self.end_headers()
-
-        except:
-            pass
+            # Call the method that uses SQLalchemy to do the query, and
+            # iterate through the rows as they arrive from the database.
+            # Output unordered HTML list of names
+            for restaurant in queryAllRestaurants():
+                output.write("<li>%s&nbsp;&nbsp;<small>"
+                    "<a href='/restaurants/%s/edit'>Edit</a>&nbsp;&nbsp;"
+                    "<a href='/restaurants/%s/delete'>Delete</a>"
+                    "</small></li>" % (restaurant.name, restaurant.id,
+                    restaurant.id))
+        except Exception:
+            # The status line has already been sent, so the error can't be;
+            # drop the connection so the client knows the page is cut short.
+            self.log_error('Failed while streaming %s', self.path)
+            self.close_connection = 1
+            return
+
+        output.write("</ul></h4>")
+        output.write("</body></html>")
+        output.close()
+
+    def editRestaurantForm(self, restaurant_id):
+        # Answer GETs to /restaurants/<id>/edit with a form to rename the
+        # restaurant.
+        # Use SQLalchemy to query the id column of the Restaurant table
+        # and set a variable to that value.
+        myRestaurantQuery = session.query(Restaurant).filter_by(id = restaurant_id).one()
+
+        # Build the HTML.
+        output = "<html><body>"
+        output += "<h2>"
+        output += myRestaurantQuery.name
+        output += "</h2>"
+        # Create a POST url link containing the restaurant id.
+        # We define a POST handler for it below.
+        output += "<form method='POST' enctype='multipart/form-data' action = '/restaurants/%s/edit' >" % restaurant_id
+
+        # newRestaurantName will contain the user input. The HTML
+        # placholder attribute is a short hint that is displayed in 
+        # the input field before the user enters a value. Set it to
+        # the current name of the restaurant.
+        output += "<input name = 'newRestaurantName' type='text' placeholder = '%s' >" % myRestaurantQuery.name
+        output += "<input type = 'submit' value = 'Rename'>"
+        output += "</form>"
+        output += "</body></html>"
+
+        # Send it all to the client
+        self.sendPage(output)
+
+    def deleteRestaurantForm(self, restaurant_id):
+        # A confirmation page for deletions.
+        # Use SQLalchemy to query for that restaurant ID.
+        myRestaurantQuery = session.query(Restaurant).filter_by(id = restaurant_id).one()
+
+        output = ""
+        output += "<html><body>"
+        # Output the restaurant name we retrieved.
+        output += "<h1>Are you sure you want to delete %s?" % myRestaurantQuery.name
+        # Make the form POST URL contain the ID in the path.
+        output += "<form method='POST' enctype = 'multipart/form-data' action = '/restaurants/%s/delete'>" % restaurant_id
+        output += "<input type = 'submit' value = 'Delete'>"
+        output += "</form>"
+        output += "</body></html>"
+        # Output the headers and HTML to the client.
+        self.sendPage(output)
+
+    def newRestaurantForm(self):
+        # Objective 3 Step 2 - Create /restarants/new page
+        # Create a page for adding new restaurants to the database.
+        output = ""
+        output += "<html><body>"
+        output += "<h2>Make a New Restaurant</h2>"
+
+        # Our GET handler for /restaurants/new/ needs to send HTML 
+        # for a link to a POST at the same address, which will be 
+        # handled in createRestaurant(), below.
+        output += "<form method = 'POST' enctype='multipart/form-data'  action = '/restaurants/new'>"
+
+        # newRestaurantName contains the user input our POST will need.
+        output += "<input name = 'newRestaurantName' type = 'text' placeholder = 'New Restaurant Name' > "
+        output += "<input type='submit' value='Create'>"
+        output += "</form></body></html>"
+        self.sendPage(output)
+
+    def deleteRestaurant(self, restaurant_id):
+        # Handle POSTS to the restaurants/delete URL.
+        # Read the whole body, although a deletion needs nothing from it.
+        self.readForm()
+
+        # SQLalchemy query to grab that restaurant's ID from the DB.
+        myRestaurantQuery = session.query(Restaurant).filter_by(id = restaurant_id).one()
+
+        # SQLalchemy query to delete the restaurant by ID.
+        session.delete(myRestaurantQuery)
+        bumpVersions(session, myRestaurantQuery.id, GLOBAL_VERSION)
+        # Write to the database.
+        session.commit()
+        # Output HTTP redirect to home page.
+        self.sendRedirect('/restaurants')
+
+    def createRestaurant(self):
+        # Handle POSTs to the restaurants/new URL.
+        # The fields object will be a dictionary. The keys are the field
+        # names. Each value is a list of values for that field. See
+        # readForm().
+        fields = self.readForm()
+
+        # Grab the user input from the HTML form. Call the built-in
+        # dictionary function get(). It will return the value for 
+        # the 'newRestaurantName' key if it is in the dictionary.
+        # messagecontent will be a list containing one item.
+        messagecontent = fields.get('newRestaurantName')
+        if not messagecontent:
+            self.send_error(400, 'Missing newRestaurantName')
+            return
+
+        # Create new Restaurant Object w/ SQLalchemy
+        # Set name to the value of the first/only item in the list.
+        newRestaurant = Restaurant(name=messagecontent[0])
+
+        # Stage the new object.
+        session.add(newRestaurant)
+        session.flush()
+        bumpVersions(session, newRestaurant.id, GLOBAL_VERSION)
+        # Write it to the restaurantmenu.db database, as defined in 
+        # the database_setup.Restaurant class. Specifically, create
+        # a new row in the Restaurant table, writing the value of 
+        # messagecontent[0] to the name column.
+        session.commit()
+
+        # Send the response headers, redirecting the client back to
+        # the page listing all restaurants.
+        self.sendRedirect('/restaurants')
+
+    def renameRestaurant(self, restaurant_id):
+        # Handle POSTs to /restaurants/<id>/edit.
+        # Similar code is commented above.
+        fields = self.readForm()
+        messagecontent = fields.get('newRestaurantName')
+        if not messagecontent:
+            self.send_error(400, 'Missing newRestaurantName')
+            return
+
+        myRestaurantQuery = session.query(Restaurant).filter_by(id = restaurant_id).one()
+
+        myRestaurantQuery.name = messagecontent[0]
+        # SQLalchemy query to INSERT newRestaurantName into DB.
+        session.add(myRestaurantQuery)
+        bumpVersions(session, myRestaurantQuery.id, GLOBAL_VERSION)
+        # Write to the database.
+        session.commit()
+        self.sendRedirect('/restaurants')
+
+
+# The route table: each path pattern, with the webServerHandler method that
+# answers each HTTP method at that path. <int:name> in a pattern matches a
+# number in the path, passed to the handler as the keyword argument name.
+# A trailing slash in the path is ignored. Digits may only appear in a
+# pattern as part of an <int:name>.
+ROUTES = [
+    ('/restaurants', {'GET': 'listRestaurants'}),
+    ('/restaurants/new', {'GET': 'newRestaurantForm',
+        'POST': 'createRestaurant'}),
+    ('/restaurants/<int:restaurant_id>/edit', {'GET': 'editRestaurantForm',
+        'POST': 'renameRestaurant'}),
+    ('/restaurants/<int:restaurant_id>/delete', {
+        'GET': 'deleteRestaurantForm', 'POST': 'deleteRestaurant'}),
+]
+
+
+def compileRoutes(routes):
+    '''
+    Compile the route table into a dictionary keyed by the shape of each
+    route's paths, the path with every digit removed, so that a path is
+    matched with one dictionary lookup however many routes there are. Each
+    shape, with and without a trailing slash, maps to (handlers,
+    [(argument name, offset of its number in the shape)]). Raises
+    ValueError if a pattern has digits outside an <int:name>.
+
+    Args:
+        list routes
+    '''
+    shapes = {}
+    for pattern, handlers in routes:
+        arguments = []
+        shape = ''
+        for part in re.split(r'(<int:\w+>)', pattern):
+            if part.startswith('<int:'):
+                arguments.append((part[5:-1], len(shape)))
+            elif part.translate(None, string.digits) != part:
+                raise ValueError('Digits outside <int:name> in %r' % pattern)
+            else:
+                shape += part
+        shapes[shape] = shapes[shape + '/'] = (handlers, arguments)
+    return shapes
+
+
+ROUTE_SHAPES = compileRoutes(ROUTES)
+
+
+def matchRoute(path, digits=string.digits):
+    '''
+    Return (handlers, arguments) for the route matching path, where
+    handlers maps HTTP methods to webServerHandler method names and
+    arguments holds the integer ids parsed from the path, or return None if
+    no route matches.
+
+    Args:
+        str path
+    '''
+    # Ignore the query string, if any.
+    if '?' in path:
+        path = path[:path.index('?')]
+    shape = path.translate(None, digits)
+    route = ROUTE_SHAPES.get(shape)
+    if route is None:
+        return None
+    handlers, arguments = route
+
+    # Read each number from where the shape puts it, moved along by the
+    # digits of the numbers before it. The path only matches if those are
+    # all the digits it has, e.g., not /restaurants2/1/edit.
+    ids = {}
+    found = 0
+    for name, offset in arguments:
+        start = offset + found
+        end = path.find('/', start)
+        if end < 0:
+            end = len(path)
+        number = path[start:end]
+        if not number.isdigit():
+            return None
+        found += end - start
+        ids[name] = int(number)
+    if found != len(path) - len(shape):
+        return None
+    return handlers, ids
+
+
+def matchRouteChain(method, path):
+    '''
+    Return the webServerHandler method name chosen by the chain of
+    path.endswith() tests that this server used before the route table, and
+    the restaurant id taken from the path as it did, for comparison in
+    benchmarkRouter().
+
+    Args:
+        str method
+        str path
+    '''
+    if method == 'GET':
+        if path.endswith("/restaurants"):
+            return 'listRestaurants', None
+        if path.endswith("/edit"):
+            return 'editRestaurantForm', path.split("/")[2]
+        if path.endswith("/delete"):
+            return 'deleteRestaurantForm', path.split("/")[2]
+        if path.endswith("/restaurants/new"):
+            return 'newRestaurantForm', None
+    else:
+        handler = None
+        if path.endswith("/delete"):
+            handler = 'deleteRestaurant', path.split("/")[2]
+        if path.endswith("/restaurants/new"):
+            handler = 'createRestaurant', None
+        if path.endswith("/edit"):
+            handler = 'renameRestaurant', path.split("/")[2]
+        return handler
+    return None
+
+
+def benchmarkRouter(rounds=100000):
+    # Time the route table against the old chain of endswith() tests.
+    requests = [('GET', '/restaurants'), ('GET', '/restaurants/new'),
+        ('GET', '/restaurants/12/edit'), ('GET', '/restaurants/12/delete'),
+        ('POST', '/restaurants/new'), ('POST', '/restaurants/12/edit'),
+        ('POST', '/restaurants/12/delete'), ('GET', '/no/such/page')]
+
+    def table():
+        for method, path in requests:
+            route = matchRoute(path)
+            if route is not None:
+                route[0].get(method)
+
+    def chain():
+        for method, path in requests:
+            matchRouteChain(method, path)
+
+    for name, function in [('route table', table), ('endswith chain', chain)]:
+        seconds = min(timeit.repeat(function, number = rounds, repeat = 3))
+        print "%-15s %.3f us per request" % (name,
+            seconds * 1e6 / (rounds * len(requests)))
 
 
 # Objective 1
 def queryAllRestaurants():
     """
     Query the Restaurant table and return an object containing the restaurant
-    names sorted alphabetically.
+    names sorted alphabetically. Iterating over it fetches the rows from the
+    database RESTAURANT_BATCH_SIZE at a time.
     """
-    # Create an object containing a list of all rows in the Restaurant table,
-    # and sort by name.
-    restaurants = session.query(Restaurant).order_by(Restaurant.name).all()
+    # Create an object yielding all rows in the Restaurant table, sorted by
+    # name, a batch at a time.
+    restaurants = session.query(Restaurant).order_by(
+        Restaurant.name).yield_per(RESTAURANT_BATCH_SIZE)
 
     return restaurants
 
 
 def main():
+    parser = argparse.ArgumentParser(
+        description = 'Serve the restaurant pages without Flask.')
+    parser.add_argument('--port', type = int, default = 8080,
+        help = 'port to listen on (default %(default)s)')
+    parser.add_argument('--workers', type = int, default = 16,
+        help = 'worker threads answering requests; 0 answers one request '
+        'at a time (default %(default)s)')
+    parser.add_argument('--backlog', type = int, default = 128,
+        help = 'connections waiting to be accepted (default %(default)s)')
+    parser.add_argument('--bench-router', action = 'store_true',
+        help = 'time the route table against the old endswith() chain and '
+        'exit')
+    args = parser.parse_args()
+
+    if args.bench_router:
+        benchmarkRouter()
+        return
+
     try:
-        port = 8080
-        server = HTTPServer(('', port), webServerHandler)
+        port = args.port
+        if args.workers > 0:
+            server = ThreadPoolHTTPServer(('', port), webServerHandler,
+                workers = args.workers, backlog = args.backlog)
+        else:
+            server = HTTPServer(('', port), webServerHandler)
         print "Web Server running on port %s" % port
         server.serve_forever()
     except KeyboardInterrupt:
         print " ^C entered, stopping web server...."
-        server.socket.close()
+        server.server_close()
 
 if __name__ == '__main__':
     main()